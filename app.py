@@ -1,32 +1,136 @@
-from flask import Flask, request, jsonify
+import logging
+import threading
+import time
+from flask import Flask, request, jsonify, g, Response
 from flask_cors import CORS
-from main import predict_main
+from main import predict_main, predict_batch
+from modules.predicting._model_registry import get_registry
+from modules.predicting._single_flight import SingleFlightTimeout, get_prediction_flights
+from modules.predicting._stage_timer import StageTimer
+from modules.monitoring._metrics import REQUESTS, REQUEST_ERRORS, REQUEST_SECONDS, render_metrics
+from modules.storage._race_file_index import get_race_file_index
 app = Flask(__name__)
 CORS(app)
 
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+# model/ 配下の成果物を起動時に一度だけ読み込んでおく
+get_registry().preload()
+# 出馬表ファイルのインデックスを作っておく
+get_race_file_index().refresh()
+
+# 試しに1レースを予測し終えたら準備完了とする（/ready）
+_ready = threading.Event()
+
+def warm_up():
+    """ 出馬表データの1レースを予測して、初回の予測にかかる準備を済ませる """
+    start = time.perf_counter()
+    races = get_race_file_index().races()
+    if races:
+        race_file = races[-1]
+        try:
+            predict_main(race_file.date, race_file.race_number, race_file.ground)
+        except Exception:
+            logger.exception("試しの予測に失敗しました")
+            return False
+    _ready.set()
+    logger.info("準備完了（%.0fms）", (time.perf_counter() - start) * 1000)
+    return True
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    # リクエストヘッダーに X-Timing: 1 がある場合は、区間ごとの処理時間を Server-Timing ヘッダーで返す
+    if request.headers.get("X-Timing") == "1":
+        g.stage_timer = StageTimer()
+        g.stage_timer_context = g.stage_timer.activate()
+        g.stage_timer_context.__enter__()
+
+@app.after_request
+def record_request(response):
+    route = request.url_rule.rule if request.url_rule else "unknown"
+    elapsed = time.perf_counter() - g.request_start
+    REQUESTS.inc(route=route, status=response.status_code)
+    REQUEST_SECONDS.observe(elapsed, route=route)
+    if response.status_code >= 400:
+        REQUEST_ERRORS.inc(route=route)
+    timer = g.get("stage_timer")
+    if timer is not None:
+        response.headers["Server-Timing"] = ", ".join(
+            part for part in [timer.server_timing(), f"total;dur={elapsed * 1000:.2f}"] if part)
+    return response
+
+@app.teardown_request
+def stop_request_timer(exc):
+    context = g.pop("stage_timer_context", None)
+    if context is not None:
+        context.__exit__(None, None, None)
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    # 試しの予測が終わるまでは 503 を返す（ロードバランサーの振り分け判定用）
+    if _ready.is_set():
+        return jsonify({"status": "ready"})
+    return jsonify({"status": "starting"}), 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    # Prometheus のテキスト形式
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
 @app.route('/process', methods=['POST'])
 def predict():
     try:
         # JSON形式のデータを受け取る
         data = request.get_json()
-        print("Received data:", data)  # 受け取ったデータをログに表示
 
         # 必要なデータを抽出
         input_date = data.get('input_date')
         input_race_number = data.get('input_race_number')
         input_ground = data.get('input_ground')
+        logger.info("予測: date=%s race=%s ground=%s", input_date, input_race_number, input_ground)
 
-        # main関数を直接呼び出す
-        results = predict_main(input_date, input_race_number, input_ground)
-        print("main処理完了")
+        # 同じレースの予測が実行中なら、その結果を待って受け取る（発走前に同じレースへのリクエストが集中するため）
+        key = (str(input_date), str(input_race_number), str(input_ground))
+        results, shared = get_prediction_flights().do(
+            key, lambda: predict_main(input_date, input_race_number, input_ground))
+        if shared:
+            logger.info("実行中の予測結果を共有しました: date=%s race=%s ground=%s", *key)
 
         # DataFrameを辞書に変換
         result = results.to_dict(orient='records')
         # 結果をJSONとして返す
         return jsonify(result)
 
+    except SingleFlightTimeout as e:
+        logger.warning("%s", e)
+        return jsonify({"error": str(e)}), 504
+
+    except Exception as e:
+        logger.exception("予測に失敗しました")
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/process_batch', methods=['POST'])
+def predict_all():
+    try:
+        # 開催日と競馬場（省略時は全競馬場）を受け取る
+        data = request.get_json()
+
+        input_date = data.get('input_date')
+        input_grounds = data.get('input_grounds')
+        logger.info("一括予測: date=%s grounds=%s", input_date, input_grounds)
+
+        results = predict_batch(input_date, input_grounds)
+
+        # race_id ごとの結果をJSONとして返す
+        return jsonify({race_id: df.to_dict(orient='records') for race_id, df in results.items()})
+
     except Exception as e:
+        logger.exception("予測に失敗しました")
         return jsonify({"error": str(e)}), 400
 
 if __name__ == '__main__':
+    # 開発用サーバー（本番は gunicorn -c gunicorn.conf.py wsgi:app）
+    warm_up()
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,176 @@
+import argparse
+import contextlib
+import io
+import json
+import platform
+import subprocess
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# main の読み込み時間も計測する
+_import_start = time.perf_counter()
+from main import predict_main, predict_batch
+from incremental_scoring import get_incremental_scorer
+from modules.predicting._result_cache import get_result_cache
+from modules.predicting._stage_timer import StageTimer, summarize
+from modules.storage._race_file_index import get_race_file_index
+_import_seconds = time.perf_counter() - _import_start
+
+# predict_main の中の区間（実行順）
+STAGES = ["resolve", "load", "result_cache", "common_features", "time_features", "predict_time",
+          "ranking_features", "predict_ranking"]
+
+
+def _peak_rss_mb():
+    """ プロセスの最大常駐メモリ（MB）。取得できない環境では None """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KB、macOS はバイト単位
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _quiet(verbose):
+    """ 予測処理の print を捨てる（計測の対象には含まれる） """
+    return contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+
+
+def _timed_predict(race_file, timer, verbose):
+    start = time.perf_counter()
+    with timer.activate(), _quiet(verbose):
+        predict_main(race_file.date, race_file.race_number, race_file.ground)
+    return time.perf_counter() - start
+
+
+def run_benchmark(races, use_cache=False, batch=True, verbose=False):
+    if not use_cache:
+        # 結果のキャッシュと、前回の特徴量を使い回す差分予測を無効にして、毎回前処理と予測を行う
+        get_result_cache().max_entries = 0
+        get_incremental_scorer().max_races = 0
+        get_incremental_scorer().clear()
+
+    # 1回目（モデルなどの読み込みを含む）
+    cold_timer = StageTimer()
+    cold_seconds = _timed_predict(races[0], cold_timer, verbose)
+
+    # 2回目以降（全レース）
+    warm_timer = StageTimer()
+    latencies = []
+    start = time.perf_counter()
+    for race_file in races:
+        latencies.append(_timed_predict(race_file, warm_timer, verbose))
+    warm_seconds = time.perf_counter() - start
+
+    stages = warm_timer.summary()
+    result = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "races": len(races),
+        "use_cache": use_cache,
+        "import_ms": _import_seconds * 1000,
+        "cold": {"latency_ms": cold_seconds * 1000,
+                 "stages": {name: stats["total_ms"] for name, stats in cold_timer.summary().items()}},
+        "warm": {"latency": summarize(latencies),
+                 "stages": {name: stages[name] for name in STAGES if name in stages},
+                 "throughput_races_per_s": len(races) / warm_seconds},
+    }
+
+    if batch:
+        # 開催日ごとにまとめて予測した場合
+        dates = sorted({race_file.date for race_file in races})
+        batch_latencies = []
+        start = time.perf_counter()
+        for date in dates:
+            t = time.perf_counter()
+            with _quiet(verbose):
+                predict_batch(date)
+            batch_latencies.append(time.perf_counter() - t)
+        batch_seconds = time.perf_counter() - start
+        batch_races = sum(len(get_race_file_index().races(date)) for date in dates)
+        result["batch"] = {"dates": len(dates), "races": batch_races, "latency": summarize(batch_latencies),
+                           "throughput_races_per_s": batch_races / batch_seconds}
+
+    result["peak_rss_mb"] = _peak_rss_mb()
+    return result
+
+
+def compare(current, baseline):
+    """ 以前の結果と比べた差を表示する """
+    def line(label, new, old):
+        if new is None or old is None:
+            return
+        change = (new - old) / old * 100 if old else 0.0
+        print(f"  {label:<28} {old:>10.2f} -> {new:>10.2f} ({change:+.1f}%)")
+
+    print(f"比較: {baseline.get('commit')} -> {current.get('commit')}")
+    line("warm mean (ms)", current["warm"]["latency"]["mean_ms"], baseline["warm"]["latency"]["mean_ms"])
+    line("warm p95 (ms)", current["warm"]["latency"]["p95_ms"], baseline["warm"]["latency"]["p95_ms"])
+    line("cold (ms)", current["cold"]["latency_ms"], baseline["cold"]["latency_ms"])
+    line("throughput (races/s)", current["warm"]["throughput_races_per_s"],
+         baseline["warm"]["throughput_races_per_s"])
+    for name in STAGES:
+        new, old = current["warm"]["stages"].get(name), baseline["warm"]["stages"].get(name)
+        if new and old:
+            line(f"{name} mean (ms)", new["mean_ms"], old["mean_ms"])
+    if "batch" in current and "batch" in baseline:
+        line("batch (races/s)", current["batch"]["throughput_races_per_s"],
+             baseline["batch"]["throughput_races_per_s"])
+    line("peak rss (MB)", current.get("peak_rss_mb"), baseline.get("peak_rss_mb"))
+
+
+def print_summary(result):
+    warm = result["warm"]
+    print(f"{result['races']}レース  import {result['import_ms']:.0f}ms  cold {result['cold']['latency_ms']:.0f}ms  "
+          f"warm mean {warm['latency']['mean_ms']:.1f}ms p95 {warm['latency']['p95_ms']:.1f}ms  "
+          f"{warm['throughput_races_per_s']:.1f} races/s")
+    for name, stats in warm["stages"].items():
+        print(f"  {name:<18} mean {stats['mean_ms']:8.2f}ms  p95 {stats['p95_ms']:8.2f}ms  total {stats['total_ms']:9.0f}ms")
+    if "batch" in result:
+        batch = result["batch"]
+        print(f"  batch: {batch['dates']}日 {batch['races']}レース  {batch['throughput_races_per_s']:.1f} races/s")
+    if result["peak_rss_mb"] is not None:
+        print(f"  peak rss {result['peak_rss_mb']:.0f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="出馬表データの全レースで predict_main を実行し、区間ごとの時間を計測する")
+    parser.add_argument("--output", default="benchmark_result.json", help="結果を書き出すJSONファイル")
+    parser.add_argument("--compare", help="比較する以前の結果（JSONファイル）")
+    parser.add_argument("--limit", type=int, help="計測するレース数の上限")
+    parser.add_argument("--every", type=int, default=1, help="n レースごとに1レースを計測する")
+    parser.add_argument("--use-cache", action="store_true", help="予測結果のキャッシュと差分予測を有効にしたまま計測する")
+    parser.add_argument("--no-batch", action="store_true", help="開催日ごとのまとめた予測を計測しない")
+    parser.add_argument("--verbose", action="store_true", help="予測処理の出力を表示する")
+    args = parser.parse_args()
+
+    races = get_race_file_index().races()[::args.every][:args.limit]
+    if not races:
+        print("出馬表データがありません")
+        return
+
+    result = run_benchmark(races, use_cache=args.use_cache, batch=not args.no_batch, verbose=args.verbose)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=4)
+    print_summary(result)
+    print(f"結果を {args.output} に保存しました")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(result, json.load(f))
+
+if __name__ == "__main__":
+    main()
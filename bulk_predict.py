@@ -0,0 +1,171 @@
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import time
+from itertools import groupby
+
+import numpy as np
+import pandas as pd
+
+from main import predict_race_cards
+from modules.constants._race_ground_from_name_to_id import convert_ground_to_id
+from modules.predicting._model_registry import get_registry
+from modules.storage._columnar_file import ColumnarWriter, STRING
+from modules.storage._race_card_store import load_race_card
+from modules.storage._race_file_index import RACE_CARD_DIR, RaceFileIndex
+
+DEFAULT_OUTPUT = "bulk_predictions.kcol"
+
+# 出力ファイルの列（1行が1頭）
+OUTPUT_SCHEMA = [
+    ("race_id", STRING),
+    ("日付", STRING),
+    ("場名", STRING),
+    ("レース番号", "int16"),
+    ("レース名", STRING),
+    ("馬番", "int16"),
+    ("馬", STRING),
+    ("人気", "float64"),
+    ("オッズ", "float64"),
+    ("予測走破時間", "float32"),
+    ("予想複勝確率", "float32"),
+]
+
+
+def select_races(root=RACE_CARD_DIR, date_from=None, date_to=None, grounds=None):
+    """ 出馬表データ配下のレースのうち、開催日の範囲（YYYYMMDD、両端を含む）と競馬場で絞り込んだものを返す """
+    ground_ids = None if not grounds else [convert_ground_to_id(ground) for ground in grounds]
+    return [race_file for race_file in RaceFileIndex(root).races(ground_ids=ground_ids)
+            if (date_from is None or race_file.date >= date_from) and (date_to is None or race_file.date <= date_to)]
+
+
+def _chunks(race_files, size):
+    """ 開催日・競馬場ごと（列指向ストアの1ファイル分）にまとめ、size レースずつに分ける """
+    chunks = []
+    for _, group in groupby(race_files, key=lambda race_file: (race_file.date, race_file.ground)):
+        group = list(group)
+        chunks += [group[i:i + size] for i in range(0, len(group), size)]
+    return chunks
+
+
+def _init_worker():
+    # ワーカーごとに一度だけ成果物を読み込む（fork の場合は親プロセスで読み込んだものを引き継ぐ）
+    get_registry().auto_reload = False
+    get_registry().preload()
+
+
+def _score(race_files):
+    cards = [load_race_card(race_file) for race_file in race_files]
+    input_data = pd.concat(cards, ignore_index=True)
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = predict_race_cards(input_data)
+    sizes = [len(card) for card in cards]
+    return pd.DataFrame({
+        "race_id": input_data["race_id"].astype(str).to_numpy(),
+        "日付": np.repeat([race_file.date for race_file in race_files], sizes),
+        "場名": np.repeat([race_file.ground for race_file in race_files], sizes),
+        "レース番号": np.repeat([race_file.race_number for race_file in race_files], sizes),
+        "レース名": input_data["レース名"].to_numpy(),
+        "馬番": input_data["馬番"].to_numpy(),
+        "馬": input_data["馬"].to_numpy(),
+        "人気": input_data["人気"].to_numpy(),
+        "オッズ": input_data["オッズ"].to_numpy(),
+        "予測走破時間": input_data["走破時間"].to_numpy(),
+        "予想複勝確率": results["予想複勝確率"].to_numpy(),
+    })
+
+
+def score_chunk(race_files):
+    """
+    レースをまとめて予測し、(1頭1行のDataFrame, [(パス, エラー)]) を返す。
+    まとめて予測できない場合は1レースずつ予測し、予測できないレースは飛ばす。
+    """
+    try:
+        return _score(race_files), []
+    except Exception:
+        if len(race_files) == 1:
+            raise
+    frames, failed = [], []
+    for race_file in race_files:
+        try:
+            frames.append(_score([race_file]))
+        except Exception as e:
+            failed.append((race_file.path, f"{type(e).__name__}: {e}"))
+    frame = pd.concat(frames, ignore_index=True) if frames else None
+    return frame, failed
+
+
+def _score_chunk_safely(race_files):
+    try:
+        return score_chunk(race_files)
+    except Exception as e:
+        return None, [(race_files[0].path, f"{type(e).__name__}: {e}")]
+
+
+def bulk_predict(race_files, output, workers=None, chunk_size=12, progress=True):
+    """
+    race_files をプロセスプールで予測し、結果を1つの列指向ファイル（output）に書き出す。
+    予測が終わったまとまりから順に行グループとして追記するので、全結果をメモリに溜めない。
+    出力の行の順は race_files の順（ワーカー数によらず同じファイルになる）。
+    戻り値: (予測したレース数, 予測した頭数, [(パス, エラー)])
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = _chunks(race_files, chunk_size)
+    # fork の場合はワーカーが引き継げるよう、先に親プロセスで読み込んでおく（出力に残す指紋にも使う）
+    _init_worker()
+    fingerprint = get_registry().fingerprint()
+
+    races = rows = 0
+    failed = []
+    start = time.perf_counter()
+    writer = ColumnarWriter(output, OUTPUT_SCHEMA)
+    try:
+        with contextlib.ExitStack() as stack:
+            if workers > 1 and len(chunks) > 1:
+                pool = stack.enter_context(multiprocessing.Pool(min(workers, len(chunks)), initializer=_init_worker))
+                scored = pool.imap(_score_chunk_safely, chunks)
+            else:
+                scored = map(_score_chunk_safely, chunks)
+            for i, (chunk, (frame, chunk_failed)) in enumerate(zip(chunks, scored), 1):
+                failed += chunk_failed
+                if frame is not None and len(frame):
+                    writer.write(frame, metadata={"date": chunk[0].date, "ground": chunk[0].ground})
+                    races += frame["race_id"].nunique()
+                    rows += len(frame)
+                if progress and (i % 20 == 0 or i == len(chunks)):
+                    elapsed = time.perf_counter() - start
+                    print(f"{i}/{len(chunks)} ({races}レース, {races / max(elapsed, 1e-9):.1f}レース/秒)")
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close(metadata={"model_fingerprint": fingerprint, "races": races, "rows": rows,
+                           "failed": [path for path, _ in failed]})
+    return races, rows, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="出馬表データのレースをまとめて予測し、1つの列指向ファイルに書き出す")
+    parser.add_argument("--src", default=RACE_CARD_DIR, help="出馬表JSONのフォルダ")
+    parser.add_argument("--from", dest="date_from", help="この開催日から（YYYYMMDD）")
+    parser.add_argument("--to", dest="date_to", help="この開催日まで（YYYYMMDD）")
+    parser.add_argument("--grounds", nargs="*", help="競馬場（例: 東京 京都）")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="プロセス数（既定はCPUのコア数）")
+    parser.add_argument("--chunk-size", type=int, default=12, help="1回にまとめて予測するレース数")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="出力ファイル（.kcol）")
+    args = parser.parse_args()
+
+    race_files = select_races(args.src, args.date_from, args.date_to, args.grounds)
+    if not race_files:
+        print("No matching file found.")
+        return
+
+    start = time.time()
+    races, rows, failed = bulk_predict(race_files, args.output, args.workers, args.chunk_size)
+    print(f"{races}レース（{rows}頭）を予測して {args.output} に書き出しました（{time.time() - start:.1f}秒）")
+    for path, reason in failed:
+        print(f"スキップ: {path} ({reason})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+import argparse
+import time
+from modules.storage._race_file_index import RACE_CARD_DIR
+from modules.storage._race_card_store import RACE_CARD_STORE_DIR, convert_race_cards
+
+def main():
+    parser = argparse.ArgumentParser(description="出馬表データのJSONを開催日・競馬場ごとの列指向ファイルに変換する")
+    parser.add_argument("--src", default=RACE_CARD_DIR, help="出馬表JSONのフォルダ")
+    parser.add_argument("--dst", default=RACE_CARD_STORE_DIR, help="変換後のファイルを置くフォルダ")
+    args = parser.parse_args()
+
+    start = time.time()
+    converted, skipped = convert_race_cards(args.src, args.dst)
+    print(f"{converted}レースを変換しました（{time.time() - start:.1f}秒）")
+    for path, reason in skipped:
+        print(f"スキップ: {path} ({reason})")
+
+if __name__ == "__main__":
+    main()
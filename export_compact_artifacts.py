@@ -0,0 +1,21 @@
+import argparse
+import os
+import time
+from modules.predicting._model_registry import MODEL_DIR, COMPACT_DIR, LOADERS
+from modules.predicting._compact_artifacts import export_compact_artifacts
+
+def main():
+    parser = argparse.ArgumentParser(description="エンコーダー・スケーラー・成績JSONを、起動時にすぐ読み込める変換済みファイルに書き出す")
+    parser.add_argument("--model-dir", default=MODEL_DIR, help="成果物のフォルダ")
+    parser.add_argument("--dst", default=None, help="変換後のファイルを置くフォルダ（既定は <model-dir>/compact）")
+    args = parser.parse_args()
+
+    start = time.time()
+    dst = args.dst or os.path.join(args.model_dir, COMPACT_DIR)
+    exported, skipped = export_compact_artifacts(args.model_dir, dst, LOADERS)
+    print(f"{len(exported)}ファイルを {dst} に変換しました（{time.time() - start:.1f}秒）")
+    for path in skipped:
+        print(f"変換しない: {path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+from collections import namedtuple
+
+import pandas as pd
+
+from preprocessing1 import RaceDataPreprocessor1
+from preprocessing2 import RaceDataPreprocessor2
+from predict_time import predict_time
+from predict_ranking import predict_ranking_proba
+from modules.predicting._stage_timer import stage
+
+# RaceFeaturePipeline.score の途中結果（オッズなどの変化分だけ計算し直すときに使う）
+RaceScores = namedtuple("RaceScores", ["common", "time_features", "predicted_time", "ranking_features", "ranking"])
+
+class RaceFeaturePipeline:
+    """
+    予測時の特徴量作成。
+    走破時間モデルと着順モデルで共通の処理（列の整形・馬と騎手の過去成績の付与）は1回だけ行い、
+    その結果から各モデル用のエンコーディング・スケーリングに分岐する。
+    """
+
+    def __init__(self):
+        self.preprocessor1 = RaceDataPreprocessor1(is_train=False)
+        self.preprocessor2 = RaceDataPreprocessor2(is_train=False)
+
+    def common_features(self, input_data):
+        """ 両モデル共通の特徴量 """
+        return self.preprocessor1.transform_common(input_data)
+
+    def time_features(self, common):
+        """ 走破時間モデル用の特徴量（RaceDataPreprocessor1.transform と同じ結果） """
+        return self.preprocessor1.transform_model(common.copy())
+
+    def ranking_features(self, common, predicted_time):
+        """ 着順モデル用の特徴量（予測した走破時間を加えて RaceDataPreprocessor2.transform と同じ結果） """
+        df = common.copy()
+        df["走破時間"] = predicted_time
+        return self.preprocessor2.transform_model(df)
+
+    def score(self, input_data):
+        """ 特徴量の作成から2つのモデルの予測まで行い、途中結果とともに返す """
+        with stage("common_features"):
+            common = self.common_features(input_data)
+        with stage("time_features"):
+            # race_id はモデルの特徴量ではないので削除
+            time_features = self.time_features(common).drop(columns=["race_id"])
+        # 走破時間の予測（着順モデルの特徴量に使う）
+        with stage("predict_time"):
+            predicted_time = predict_time(time_features)
+        with stage("ranking_features"):
+            ranking_features = self.ranking_features(common, predicted_time)
+        # 着順の予測（走破時間のデータを含めて実施）
+        with stage("predict_ranking"):
+            ranking = predict_ranking_proba(input_data, ranking_features)
+        return RaceScores(common, time_features, predicted_time, ranking_features, ranking)
+
+def _to_card_text(series):
+    """
+    数値で読み込んだ値を出馬表JSONと同じ文字列表記に戻す。
+    欠損値（取消馬の人気など）は None になり、APIの出力では NaN ではなく null になる。
+    """
+    return series.map(lambda x: x if isinstance(x, str) else None if pd.isna(x) else str(int(x)))
+
+def race_card_results(input_data, ranking):
+    """ APIで返す予測結果（馬・馬番・人気・複勝確率・レース名） """
+    return pd.DataFrame({
+    # "race_id": input_data["race_id"] ,
+    "馬": input_data["馬"],        # 馬の名前
+    "馬番": _to_card_text(input_data["馬番"]),     # 馬番
+    "人気": _to_card_text(input_data["人気"]),     # 人気
+    "予想複勝確率": ranking["normalized_pred_proba"],  # 複勝確率
+    "レース名":input_data["レース名"]
+    })
@@ -0,0 +1,66 @@
+import gc
+import os
+import signal
+import threading
+import time
+
+# 環境変数で設定する（例: KEIBA_WORKERS=8 KEIBA_THREADS=4 gunicorn -c gunicorn.conf.py wsgi:app）
+bind = os.environ.get("KEIBA_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("KEIBA_WORKERS", os.cpu_count() or 1))
+threads = int(os.environ.get("KEIBA_THREADS", "4"))
+timeout = int(os.environ.get("KEIBA_TIMEOUT", "60"))
+graceful_timeout = int(os.environ.get("KEIBA_GRACEFUL_TIMEOUT", "30"))
+# model/ の変更を確認する間隔（秒）。0 の場合は確認しない
+artifact_check_interval = float(os.environ.get("KEIBA_ARTIFACT_CHECK_INTERVAL", "10"))
+
+# ワーカーを起動する前に親プロセスでアプリ（とmodel/配下の成果物）を読み込み、ワーカー間で共有する
+preload_app = True
+worker_class = "gthread"
+
+# ワーカーごとにOpenMPのスレッドを多数起動すると、ワーカー数 × コア数のスレッドが奪い合うため抑える
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+
+
+def when_ready(server):
+    # 読み込み済みのオブジェクトをGCの対象から外す（GCが参照カウント以外のヘッダーを書き換えて、
+    # 共有しているメモリページがワーカーごとにコピーされるのを防ぐ）
+    gc.freeze()
+    if artifact_check_interval > 0:
+        threading.Thread(target=_watch_artifacts, args=(server,), daemon=True, name="artifact-watcher").start()
+
+
+def _watch_artifacts(server):
+    """
+    親プロセスで model/ の変更を確認し、変更があれば読み込み直してからワーカーを入れ替える（SIGHUP）。
+    新しいワーカーは読み込み直した成果物を親プロセスから引き継ぎ、古いワーカーは処理中のリクエストを終えてから終了する。
+    """
+    from modules.predicting._model_registry import get_registry
+
+    registry = get_registry()
+    while True:
+        time.sleep(artifact_check_interval)
+        try:
+            loaded = set(registry.loaded())
+            changed = registry.reload_changed()
+            added = [key for key in registry.preload() if key not in loaded]
+        except Exception as e:
+            server.log.error("成果物の確認に失敗しました: %s", e)
+            continue
+        if changed or added:
+            server.log.info("成果物が更新されたためワーカーを入れ替えます: %s", ", ".join(changed + added))
+            gc.freeze()
+            os.kill(os.getpid(), signal.SIGHUP)
+
+
+def post_fork(server, worker):
+    # ワーカーでは成果物を個別に読み込み直さない（読み込み直しは親プロセスで行い、ワーカーを入れ替える）
+    from modules.predicting._model_registry import get_registry
+
+    get_registry().auto_reload = False
+
+
+def post_worker_init(worker):
+    # XGBoost（OpenMP）はfork前にスレッドを作ると子プロセスで固まることがあるため、予測の試行はワーカーごとに行う
+    from app import warm_up
+
+    warm_up()
@@ -0,0 +1,206 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from feature_pipeline import RaceFeaturePipeline, RaceScores, race_card_results
+from predict_time import predict_time
+from predict_ranking import predict_ranking_proba
+from modules.predicting._label_encoding import onehot_with_unknown
+from modules.predicting._model_registry import get_registry
+from modules.predicting._segment_standardize import RaceSegments
+from modules.predicting._stage_timer import stage
+from modules.storage._race_card_schema import parse_race_cards
+from modules.monitoring._metrics import ROWS_SCORED, RACES_SCORED, INCREMENTAL_RESCORES
+
+# 前回の特徴量から計算し直せる出馬表の列（発走前に変わるのは主にオッズ・人気で、体重・馬場・天気も当日に発表される）
+UPDATABLE_FIELDS = ("オッズ", "人気", "体重", "体重変化", "馬場", "天気")
+
+
+class _RaceState:
+    """ 1レース分の出馬表・特徴量・予測結果 """
+
+    __slots__ = ("fingerprint", "card", "scores", "results")
+
+    def __init__(self, fingerprint, card, scores, results):
+        self.fingerprint = fingerprint
+        self.card = card
+        self.scores = scores
+        self.results = results
+
+
+def _changed_fields(previous, card):
+    """
+    前回の出馬表から変わった列を返す。出走馬の並び・UPDATABLE_FIELDS 以外の列が変わっている場合は None
+    （変化分だけでは計算し直せない）
+    """
+    if list(previous.columns) != list(card.columns) or not previous.index.equals(card.index):
+        return None
+    changed = []
+    for name in card.columns:
+        if previous[name].equals(card[name]):
+            continue
+        if name not in UPDATABLE_FIELDS:
+            return None
+        changed.append(name)
+    return changed
+
+
+class IncrementalScorer:
+    """
+    レースごとに前回の予測に使った特徴量を保持し、オッズ・人気・体重・馬場・天気だけが変わった場合は
+    それに依存する列（人気差・scaler で標準化したオッズなど・レース内で標準化した列・ワンホットの列）だけを計算し直して
+    2つのモデルの予測をやり直す。出馬表の読み込み・馬と騎手のエンコーディング・過去成績の付与は行わない。
+    結果は最初から計算した場合（predict_race_cards）と同じになる。
+
+    保持するのは最近使った max_races レースまで（0 の場合は保持せず、毎回最初から計算する）。
+    モデルなどの成果物が読み直された場合は最初から計算する。
+    """
+
+    def __init__(self, max_races=256):
+        self.max_races = max_races
+        self._races = OrderedDict()  # race_id -> _RaceState
+        self._lock = threading.Lock()
+
+    def _get(self, race_id):
+        with self._lock:
+            state = self._races.get(race_id)
+            if state is not None:
+                self._races.move_to_end(race_id)
+            return state
+
+    def _put(self, race_id, state):
+        with self._lock:
+            self._races[race_id] = state
+            self._races.move_to_end(race_id)
+            while len(self._races) > self.max_races:
+                self._races.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._races.clear()
+
+    def score(self, input_data):
+        """
+        1レース分の出馬表を予測する。同じレースの前回の出馬表から UPDATABLE_FIELDS だけが変わっている場合は
+        変化分だけ計算し直す。複数レースを含む出馬表は最初から計算する（保持しない）。
+        """
+        card = parse_race_cards(input_data)
+        race_ids = card["race_id"].unique()
+        if len(race_ids) != 1 or self.max_races <= 0:
+            return self._score_full(card)[0]
+        race_id = str(race_ids[0])
+        fingerprint = get_registry().fingerprint()
+        state = self._get(race_id)
+        if state is not None and state.fingerprint == fingerprint:
+            changed = _changed_fields(state.card, card)
+            if changed == []:
+                return state.results
+            if changed is not None:
+                state = self._rescore(state, card, changed)
+                self._put(race_id, state)
+                return state.results
+        results, scores = self._score_full(card)
+        self._put(race_id, _RaceState(fingerprint, card, scores, results))
+        return results
+
+    def update(self, race_id, changes):
+        """
+        保持しているレースの出馬表の一部の値を変えて予測し直す。
+        changes: 馬番 と UPDATABLE_FIELDS のいずれかの列を持つDataFrame（変わった馬の行だけでよい）
+        """
+        state = self._get(str(race_id))
+        if state is None:
+            raise KeyError(f"予測済みのレースではありません: {race_id}")
+        fields = [name for name in changes.columns if name != "馬番"]
+        unknown = [name for name in fields if name not in UPDATABLE_FIELDS]
+        if unknown:
+            raise ValueError(f"変化分だけでは計算し直せない列です: {unknown}")
+        positions = pd.Index(state.card["馬番"].astype(str)).get_indexer(changes["馬番"].astype(str))
+        if (positions == -1).any():
+            raise ValueError(f"出馬表に無い馬番です: {changes['馬番'][positions == -1].tolist()}")
+        card = state.card.copy()
+        for name in fields:
+            column = card[name].astype(object)
+            column.iloc[positions] = changes[name].to_numpy()
+            card[name] = column
+        return self.score(card)
+
+    def _score_full(self, card):
+        scores = RaceFeaturePipeline().score(card)
+        ROWS_SCORED.inc(len(card))
+        RACES_SCORED.inc(card["race_id"].nunique())
+        return race_card_results(card, scores.ranking), scores
+
+    def _rescore(self, state, card, changed):
+        pipeline = RaceFeaturePipeline()
+        preprocessor1, preprocessor2 = pipeline.preprocessor1, pipeline.preprocessor2
+        scores = state.scores
+        numeric = [name for name in changed if name in ("オッズ", "体重", "体重変化")]
+        categorical = [name for name in changed if name in ("馬場", "天気")]
+
+        with stage("incremental_features"):
+            # 両モデル共通の特徴量（RaceDataPreprocessor1._common_preprocessing と同じ計算）
+            common = scores.common.copy()
+            for name in numeric + categorical:
+                common[name] = card[name].to_numpy()
+            if "人気" in changed:
+                common["人気差"] = card["人気"] - card["人気"].min()
+
+            # 走破時間モデルの特徴量（scaler の列は StandardScaler.transform と同じ計算）
+            time_features = scores.time_features.copy()
+            scaled_columns = list(preprocessor1.scaler.feature_names_in_)
+            for name in numeric:
+                if name in scaled_columns:
+                    i = scaled_columns.index(name)
+                    time_features[name] = (common[name] - preprocessor1.scaler.mean_[i]) / preprocessor1.scaler.scale_[i]
+                else:
+                    time_features[name] = common[name]
+            if "人気" in changed:
+                time_features["人気差"] = common["人気差"]
+            if categorical:
+                self._update_onehot(time_features, preprocessor1, common)
+        with stage("predict_time"):
+            predicted_time = predict_time(time_features)
+
+        with stage("incremental_features"):
+            # 着順モデルの特徴量（予測し直した走破時間と、変わった列をレース内で標準化し直す）
+            ranking_features = scores.ranking_features.copy()
+            segments = RaceSegments(common["race_id"].to_numpy())
+            standardized = preprocessor2.STANDARDIZED_COLUMNS
+            for name, values in [(name, common[name].to_numpy(dtype=np.float64)) for name in numeric] + [
+                    ("走破時間", np.asarray(predicted_time))]:
+                ranking_features[name] = segments.standardize(values) if name in standardized else values
+            if "人気" in changed:
+                ranking_features["人気差"] = common["人気差"]
+            if categorical:
+                self._update_onehot(ranking_features, preprocessor2, common)
+        with stage("predict_ranking"):
+            ranking = predict_ranking_proba(card, ranking_features)
+
+        INCREMENTAL_RESCORES.inc()
+        ROWS_SCORED.inc(len(card))
+        RACES_SCORED.inc()
+        scores = RaceScores(common, time_features, predicted_time, ranking_features, ranking)
+        return _RaceState(state.fingerprint, card, scores, race_card_results(card, ranking))
+
+    @staticmethod
+    def _update_onehot(features, preprocessor, common):
+        onehot = onehot_with_unknown(preprocessor.onehot_encoder, common, preprocessor.CATEGORICAL_COLUMNS)
+        for name in onehot.columns:
+            features[name] = onehot[name].to_numpy()
+
+
+_incremental_scorer = None
+_incremental_scorer_lock = threading.Lock()
+
+
+def get_incremental_scorer():
+    """ プロセス共有のスコアラーを返す """
+    global _incremental_scorer
+    if _incremental_scorer is None:
+        with _incremental_scorer_lock:
+            if _incremental_scorer is None:
+                _incremental_scorer = IncrementalScorer()
+    return _incremental_scorer
@@ -1,13 +1,33 @@
-from shutuba_table_main import shutuba_table_main
-from preprocessing1 import RaceDataPreprocessor1
-from predict_time import predict_time
-from preprocessing2 import RaceDataPreprocessor2
-from predict_ranking import predict_ranking_proba
+from feature_pipeline import RaceFeaturePipeline, race_card_results
+from incremental_scoring import get_incremental_scorer
 from modules.constants._race_ground_from_name_to_id import convert_ground_to_id
+from modules.storage._race_file_index import get_race_file_index
+from modules.storage._race_card_store import load_race_card
+from modules.predicting._model_registry import get_registry
+from modules.predicting._result_cache import get_result_cache, race_card_key
+from modules.predicting._stage_timer import stage
+from modules.monitoring._metrics import ROWS_SCORED, RACES_SCORED
 import pandas as pd
-import json
-import os
-import glob
+
+def predict_race_cards(input_data):
+    """ 1レース以上の出馬表（race_id で区別）をまとめて前処理・予測する """
+    # データ前処理（両モデル共通の部分は1回だけ行う）と予測
+    scores = RaceFeaturePipeline().score(input_data)
+    print("走破時間予測完了")
+    '''
+    # 馬名と予測した走破時間を並べて表示
+    for horse, time in zip(input_data["馬"], scores.predicted_time):
+        print(f"馬: {horse}, 予測走破時間: {time}")
+    '''
+
+    # 予測データを統合
+    input_data["走破時間"] = scores.predicted_time
+    print("予測完了")
+    ROWS_SCORED.inc(len(input_data))
+    RACES_SCORED.inc(input_data["race_id"].nunique())
+
+    # 「馬の名前」と「複勝確率」だけを抽出して返す
+    return race_card_results(input_data, scores.ranking)
 
 def predict_main(input_date, input_race_number, input_ground):
     # input_date = '20241020'
@@ -15,74 +35,36 @@ def predict_main(input_date, input_race_number, input_ground):
     # input_ground = '京都'
 
     '''
-    # 予測用データの読み込み
+    # 予測用データの読み込み（スクレイピングに使う selenium などは、ここで初めて読み込む）
+    from shutuba_table_main import shutuba_table_main
     input_data = shutuba_table_main(input_date, input_race_number, input_ground)
     print("出馬表読み込み完了")
     '''
     ground_id = convert_ground_to_id(input_ground)
     # print(ground_id)
-    folder_path = os.path.join("出馬表データ",input_date + input_ground)
-    # print(folder_path)
-    # ファイルパターンを指定
-    file_pattern = os.path.join(folder_path, f"{input_date}{ground_id}{input_race_number}*.json")
-    # print(file_pattern)
-    
-    # 該当するファイルを検索
-    json_files = glob.glob(file_pattern)
-    
 
-    if not json_files:
+    # 出馬表ファイルをインデックスから検索
+    with stage("resolve"):
+        race_file = get_race_file_index().get(input_date, ground_id, input_race_number)
+
+    if race_file is None:
         print("No matching file found.")
         return None
-    
-    file_path = json_files[0]
 
-    # JSONファイルを読み込む
-    with open(file_path, "r", encoding="utf-8") as f:
-        input_data = json.load(f)
-    
-    input_data = pd.DataFrame(input_data)
+    # 出馬表を読み込む（列指向ストアに変換済みならそちらを使う）
+    with stage("load"):
+        input_data = load_race_card(race_file)
 
-    # データ前処理
-    preprocessor1 = RaceDataPreprocessor1(is_train=False)
-    processed_data = preprocessor1.transform(input_data)
-    # 不要な列を削除
-    processed_data = processed_data.drop(columns=['race_id'])
+    # 同じ出馬表・同じモデルで予測済みならキャッシュから返す
+    cache = get_result_cache()
+    with stage("result_cache"):
+        cache_key = race_card_key(input_data, get_registry().fingerprint())
+        results = cache.get(cache_key)
+    if results is None:
+        # 前回予測したときからオッズ・人気などしか変わっていなければ、その分だけ計算し直す
+        results = get_incremental_scorer().score(input_data)
+        cache.put(cache_key, results)
 
-    # 走破時間の予測（データには追加しない）
-    predicted_time = predict_time(processed_data)
-    print("走破時間予測完了")
-    '''
-    # 馬名と予測した走破時間を並べて表示
-    for horse, time in zip(input_data["馬"], predicted_time):
-        print(f"馬: {horse}, 予測走破時間: {time}")
-    '''
-    
-    
-    # 予測データを統合
-    input_data["走破時間"] = predicted_time
-    print("走破時間のデータ結合完了")
-
-    preprocessor2 = RaceDataPreprocessor2(is_train=False)
-    processed_data2 = preprocessor2.transform(input_data)
-
-    
-    # 着順の予測（走破時間のデータを含めて実施）
-    predicted_ranking = predict_ranking_proba(input_data, processed_data2)
-    print("予測完了")
-    
-    # 結果を出力
-    processed_data2["複勝確率"] = predicted_ranking["normalized_pred_proba"]
-    # 「馬の名前」と「複勝確率」だけを抽出して表示
-    results = pd.DataFrame({
-    # "race_id": input_data["race_id"] ,  
-    "馬": input_data["馬"],        # 馬の名前
-    "馬番": input_data["馬番"],     # 馬番
-    "人気": input_data["人気"],     # 人気
-    "予想複勝確率": processed_data2["複勝確率"],  # 複勝確率
-    "レース名":input_data["レース名"]
-    })
-    
     # 複勝確率の高い順に並べ替え
     # results = results.sort_values(by="複勝確率", ascending=False)
     
@@ -90,6 +72,24 @@ def predict_main(input_date, input_race_number, input_ground):
     print(results)
     
     return results
+
+def predict_batch(input_date, input_grounds=None):
+    """
+    開催日（と競馬場のリスト）に該当する全レースをまとめて予測し、race_id ごとの結果を返す。
+    出馬表を1つのDataFrameに連結して、前処理・各モデルの予測を1回ずつで済ませる。
+    """
+    ground_ids = None if not input_grounds else [convert_ground_to_id(ground) for ground in input_grounds]
+    race_files = get_race_file_index().races(input_date, ground_ids)
+    if not race_files:
+        print("No matching file found.")
+        return {}
+
+    input_data = pd.concat([load_race_card(race_file) for race_file in race_files], ignore_index=True)
+    results = predict_race_cards(input_data)
+    print(f"{len(race_files)}レースの予測完了")
+
+    return {race_id: group.reset_index(drop=True)
+            for race_id, group in results.groupby(input_data["race_id"], sort=False)}
     
     
 
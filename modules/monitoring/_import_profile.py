@@ -0,0 +1,61 @@
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict, namedtuple
+
+# python -X importtime の1行分（時間はマイクロ秒。depth はどのモジュールから読み込まれたかの深さで、0 が import した本人）
+ImportRecord = namedtuple("ImportRecord", ["module", "self_us", "cumulative_us", "depth"])
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)\s*$")
+
+
+def parse_importtime(text):
+    """ -X importtime の出力（標準エラー）から ImportRecord のリストを作る。それ以外の行は無視する """
+    records = []
+    for line in text.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            records.append(ImportRecord(module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return records
+
+
+def profile_imports(module, python=sys.executable, cwd=None, env=None):
+    """
+    新しいプロセスで module を import し、モジュールごとの読み込み時間を計測する。
+    読み込み済みのモジュールの影響を受けないよう、計測は必ず別のプロセスで行う。
+    戻り値: (ImportRecord のリスト, プロセス全体の秒数)
+    """
+    start = time.perf_counter()
+    proc = subprocess.run([python, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True, encoding="utf-8", errors="replace", cwd=cwd, env=env)
+    seconds = time.perf_counter() - start
+    if proc.returncode != 0:
+        errors = [line for line in proc.stderr.splitlines() if not line.startswith("import time:")]
+        raise RuntimeError(f"{module} の読み込みに失敗しました:\n" + "\n".join(errors[-20:]))
+    return parse_importtime(proc.stderr), seconds
+
+
+def by_package(records):
+    """ トップレベルのパッケージごとの読み込み時間（自身の時間の合計、マイクロ秒）を多い順に返す """
+    totals = defaultdict(int)
+    for record in records:
+        totals[record.module.split(".")[0]] += record.self_us
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def format_import_report(module, records, seconds, top=20):
+    """ profile_imports の結果を、パッケージごと・モジュールごとの表にする """
+    total_us = sum(record.self_us for record in records)
+    lines = [f"{module}: プロセス全体 {seconds * 1000:.0f} ms / import {total_us / 1000:.0f} ms"
+             f"（{len(records)}モジュール）",
+             "",
+             f"  {'パッケージ':<32} {'ms':>9} {'割合':>7}"]
+    for package, package_us in by_package(records)[:top]:
+        lines.append(f"  {package:<32} {package_us / 1000:>9.1f} {package_us / max(total_us, 1):>7.1%}")
+    lines += ["", f"  {'モジュール（読み込んだものを含む）':<32} {'ms':>9} {'自身 ms':>9}"]
+    for record in sorted(records, key=lambda record: record.cumulative_us, reverse=True)[:top]:
+        name = "  " * record.depth + record.module
+        lines.append(f"  {name:<32} {record.cumulative_us / 1000:>9.1f} {record.self_us / 1000:>9.1f}")
+    return "\n".join(lines)
@@ -0,0 +1,178 @@
+import bisect
+import threading
+
+from modules.predicting._result_cache import get_result_cache
+from modules.predicting._single_flight import get_prediction_flights
+from modules.predicting._stage_timer import add_stage_listener
+
+# 秒単位のヒストグラムの区切り
+LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + (extra or [])
+    if not pairs:
+        return ""
+    escaped = [(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+               for name, value in pairs]
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """ 増えるだけの値（リクエスト数など）。ラベルの組み合わせごとに数える """
+
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, _format_labels(self.labelnames, key), value)
+                    for key, value in sorted(self._values.items())]
+
+
+class Histogram:
+    """ 値の分布（処理時間など）。区切りごとの累積件数と合計を持つ """
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = list(buckets)
+        self._values = {}  # ラベル -> [区切りごとの件数..., 合計, 件数]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                entry[i] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            items = sorted((key, list(entry)) for key, entry in self._values.items())
+        for key, entry in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry):
+                cumulative += count
+                samples.append((self.name + "_bucket", _format_labels(self.labelnames, key, [("le", bound)]),
+                                cumulative))
+            samples.append((self.name + "_bucket", _format_labels(self.labelnames, key, [("le", "+Inf")]),
+                            entry[-1]))
+            samples.append((self.name + "_sum", _format_labels(self.labelnames, key), entry[-2]))
+            samples.append((self.name + "_count", _format_labels(self.labelnames, key), entry[-1]))
+        return samples
+
+
+class MetricsRegistry:
+    """ メトリクスを Prometheus のテキスト形式で書き出す """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help, labelnames=()):
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        """ collector() は [(名前, 種類, 説明, [(ラベルの辞書, 値)])] を返す（書き出す時点の値を読むもの） """
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in metric.samples())
+        for collector in self._collectors:
+            for name, kind, help, values in collector():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in values:
+                    lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+REQUESTS = registry.counter("keiba_requests_total", "APIのリクエスト数", ["route", "status"])
+REQUEST_ERRORS = registry.counter("keiba_request_errors_total", "エラーになったAPIのリクエスト数", ["route"])
+REQUEST_SECONDS = registry.histogram("keiba_request_seconds", "APIのリクエストの処理時間（秒）", ["route"])
+STAGE_SECONDS = registry.histogram("keiba_stage_seconds", "予測処理の区間ごとの処理時間（秒）", ["stage"])
+ARTIFACT_LOAD_SECONDS = registry.histogram("keiba_artifact_load_seconds", "モデルなどの成果物の読み込み時間（秒）",
+                                           ["artifact"])
+ROWS_SCORED = registry.counter("keiba_rows_scored_total", "予測した出走馬の数")
+RACES_SCORED = registry.counter("keiba_races_scored_total", "予測したレースの数")
+INCREMENTAL_RESCORES = registry.counter("keiba_incremental_rescores_total",
+                                        "オッズ・人気などの変化分だけ計算し直したレースの数")
+
+
+def _observe_stage(name, seconds, labels):
+    if name == "artifact_load":
+        ARTIFACT_LOAD_SECONDS.observe(seconds, artifact=labels.get("artifact", ""))
+    else:
+        STAGE_SECONDS.observe(seconds, stage=name)
+
+
+def _collect_result_cache():
+    stats = get_result_cache().stats()
+    return [
+        ("keiba_result_cache_hits_total", "counter", "予測結果のキャッシュのヒット数", [({}, stats["hits"])]),
+        ("keiba_result_cache_misses_total", "counter", "予測結果のキャッシュのミス数", [({}, stats["misses"])]),
+        ("keiba_result_cache_evictions_total", "counter", "予測結果のキャッシュから捨てた数", [({}, stats["evictions"])]),
+        ("keiba_result_cache_entries", "gauge", "予測結果のキャッシュの件数", [({}, stats["entries"])]),
+    ]
+
+
+def _collect_single_flight():
+    stats = get_prediction_flights().stats()
+    return [
+        ("keiba_single_flight_leaders_total", "counter", "予測を実際に実行したリクエスト数", [({}, stats["leaders"])]),
+        ("keiba_single_flight_shared_total", "counter", "実行中の同じレースの予測結果を受け取ったリクエスト数",
+         [({}, stats["shared"])]),
+        ("keiba_single_flight_timeouts_total", "counter", "実行中の同じレースの予測を待ちきれなかったリクエスト数",
+         [({}, stats["timeouts"])]),
+        ("keiba_single_flight_errors_total", "counter", "失敗した予測の数（待っていたリクエストにも同じエラーを返す）",
+         [({}, stats["errors"])]),
+        ("keiba_single_flight_in_flight", "gauge", "実行中の予測の数", [({}, stats["in_flight"])]),
+    ]
+
+
+add_stage_listener(_observe_stage)
+registry.add_collector(_collect_result_cache)
+registry.add_collector(_collect_single_flight)
+
+
+def render_metrics():
+    """ /metrics で返すテキスト """
+    return registry.render()
@@ -0,0 +1,418 @@
+import hashlib
+import json
+import os
+import struct
+import threading
+
+import numpy as np
+
+from modules.predicting._label_encoding import onehot_with_unknown, transform_with_unknown
+from modules.predicting._stats_table import StatsTable
+
+# ファイル構成（列指向ファイル .kcol と同じく、メタデータを末尾に置く）
+#   MAGIC | 配列（8バイト境界に揃える）... | メタデータ(JSON) | メタデータ長(u64) | MAGIC
+MAGIC = b"KART0001"
+_ALIGNMENT = 8
+COMPACT_EXT = ".kart"
+MANIFEST = "manifest.json"
+
+
+class StringTable:
+    """
+    文字列の配列を、UTF-8 のバイト列を NUL 区切りで連結したもの（メモリマップのまま）と各文字列の開始位置で持つ。
+    全体を使うときは一度だけまとめてデコードする（文字列ごとに Python のオブジェクトを読み込まない）。
+    """
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+        self._array = None
+
+    @classmethod
+    def encode(cls, values):
+        values = [str(value) for value in values]
+        if any("\0" in value for value in values):
+            raise ValueError("NUL 文字を含む文字列は保存できません")
+        encoded = [value.encode("utf-8") + b"\0" for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype="<i8")
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return bytes(self.data[self.offsets[i]:self.offsets[i + 1] - 1]).decode("utf-8")
+
+    def to_array(self):
+        """ 文字列の object 配列（デコードは初回だけ） """
+        if self._array is None:
+            values = bytes(self.data).decode("utf-8").split("\0")[:-1] if len(self) else []
+            array = np.empty(len(values), dtype=object)
+            array[:] = values
+            self._array = array
+        return self._array
+
+
+def write_compact(path, kind, arrays=None, strings=None, attrs=None):
+    """
+    数値配列・文字列表・JSON にできる属性を1ファイルに書き出す（一時ファイルに書いてから置き換える）。
+    書き出した内容の sha256 を返す。
+    """
+    arrays = dict(arrays or {})
+    for name, values in (strings or {}).items():
+        table = values if isinstance(values, StringTable) else StringTable.encode(values)
+        arrays[f"{name}.data"] = table.data
+        arrays[f"{name}.offsets"] = table.offsets
+    digest = hashlib.sha256()
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        def write(data):
+            f.write(data)
+            digest.update(data)
+
+        write(MAGIC)
+        layout = {}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            pad = -f.tell() % _ALIGNMENT
+            if pad:
+                write(b"\0" * pad)
+            layout[name] = {"offset": f.tell(), "dtype": array.dtype.str, "shape": list(array.shape)}
+            write(array.tobytes())
+        meta = {"kind": kind, "attrs": attrs or {}, "arrays": layout, "strings": list(strings or {})}
+        footer = json.dumps(meta, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        write(footer)
+        write(struct.pack("<Q", len(footer)))
+        write(MAGIC)
+    os.replace(tmp_path, path)
+    return digest.hexdigest()
+
+
+class CompactFile:
+    """ write_compact で書き出したファイルをメモリマップで開く。配列はファイル上のものをそのまま参照する（読み取り専用） """
+
+    def __init__(self, path):
+        self.path = path
+        self._data = np.memmap(path, dtype=np.uint8, mode="r")
+        if bytes(self._data[:len(MAGIC)]) != MAGIC or bytes(self._data[-len(MAGIC):]) != MAGIC:
+            raise ValueError(f"成果物の変換済みファイルの形式ではありません: {path}")
+        footer_end = len(self._data) - len(MAGIC) - 8
+        (footer_len,) = struct.unpack("<Q", bytes(self._data[footer_end:footer_end + 8]))
+        meta = json.loads(bytes(self._data[footer_end - footer_len:footer_end]).decode("utf-8"))
+        self.kind = meta["kind"]
+        self.attrs = meta["attrs"]
+        self._arrays = meta["arrays"]
+        self._strings = meta["strings"]
+
+    def array(self, name):
+        layout = self._arrays[name]
+        dtype = np.dtype(layout["dtype"])
+        count = int(np.prod(layout["shape"], dtype=np.int64))
+        array = np.frombuffer(self._data, dtype=dtype, count=count, offset=layout["offset"])
+        return array.reshape(layout["shape"])
+
+    def strings(self, name):
+        return StringTable(self.array(f"{name}.data"), self.array(f"{name}.offsets"))
+
+
+class CompactLabelEncoder:
+    """ fit済み LabelEncoder の代わり（classes_ を文字列表で持つ）。予測時に使う属性・メソッドだけを持つ """
+
+    def __init__(self, classes):
+        self._classes = classes
+
+    @property
+    def classes_(self):
+        return self._classes.to_array()
+
+    def transform(self, values):
+        codes = transform_with_unknown(self, values)
+        if (codes == -1).any():
+            raise ValueError("y contains previously unseen labels")
+        return codes
+
+    def inverse_transform(self, codes):
+        return self.classes_[np.asarray(codes)]
+
+
+class CompactOneHotEncoder:
+    """
+    fit済み OneHotEncoder（handle_unknown="ignore"・drop なし・密行列出力）の代わり。
+    onehot_with_unknown が使う属性と、同じ結果を返す transform だけを持つ。
+    """
+
+    handle_unknown = "ignore"
+    drop = None
+    drop_idx_ = None
+    sparse_output = False
+    _infrequent_enabled = False
+
+    def __init__(self, feature_names_in, categories, feature_names_out, dtype):
+        self._feature_names_in = feature_names_in
+        self._categories = categories
+        self._feature_names_out = feature_names_out
+        self.dtype = np.dtype(dtype).type
+
+    @property
+    def feature_names_in_(self):
+        return self._feature_names_in.to_array()
+
+    @property
+    def n_features_in_(self):
+        return len(self._feature_names_in)
+
+    @property
+    def categories_(self):
+        return [categories.to_array() for categories in self._categories]
+
+    def get_feature_names_out(self, input_features=None):
+        if input_features is not None and list(input_features) != list(self.feature_names_in_):
+            raise ValueError("input_features が学習時の列と一致しません")
+        return self._feature_names_out.to_array()
+
+    def transform(self, X):
+        return onehot_with_unknown(self, X, list(self.feature_names_in_)).to_numpy()
+
+
+class CompactStandardScaler:
+    """ fit済み StandardScaler の代わり。transform は StandardScaler.transform と同じ計算（平均を引いて scale_ で割る） """
+
+    copy = True
+
+    def __init__(self, mean, var, scale, n_samples_seen, with_mean, with_std, feature_names_in=None):
+        self.mean_ = mean
+        self.var_ = var
+        self.scale_ = scale
+        self.n_samples_seen_ = n_samples_seen
+        self.with_mean = with_mean
+        self.with_std = with_std
+        self._feature_names_in = feature_names_in
+
+    @property
+    def feature_names_in_(self):
+        if self._feature_names_in is None:
+            raise AttributeError("feature_names_in_")
+        return self._feature_names_in.to_array()
+
+    @property
+    def n_features_in_(self):
+        return len(self.scale_) if self.scale_ is not None else len(self.mean_)
+
+    def transform(self, X, copy=None):
+        if self._feature_names_in is not None and hasattr(X, "columns") \
+                and list(X.columns) != list(self.feature_names_in_):
+            raise ValueError("列名が学習時と一致しません")
+        X = np.asarray(X)
+        # StandardScaler と同じく float32 は float32 のまま、それ以外は float64 で計算する
+        X = np.array(X, dtype=X.dtype if X.dtype in (np.float32, np.float64) else np.float64)
+        if self.with_mean:
+            X -= self.mean_
+        if self.with_std:
+            X /= self.scale_
+        return X
+
+
+class CompactStats:
+    """
+    {名前: {統計名: 値}} の成績JSONの代わり。名前を文字列表、値を (名前の数, 統計の数) の配列で持つ。
+    辞書に項目が無い値は present が False（StatsTable を作るときに既定値になる）。
+    """
+
+    def __init__(self, names, fields, values, present):
+        self._names = names
+        self.fields = fields
+        self.values = values
+        self.present = present
+
+    def __len__(self):
+        return len(self._names)
+
+    def to_stats_table(self, fields):
+        """ StatsTable.from_stats(辞書, fields) と同じ表を作る """
+        values = np.empty((len(self), len(fields)))
+        for j, (field, default) in enumerate(fields):
+            if field in self.fields:
+                i = self.fields.index(field)
+                values[:, j] = np.where(self.present[:, i], self.values[:, i], default)
+            else:
+                values[:, j] = default
+        return StatsTable(self._names.to_array(), values, fields)
+
+
+def _read_label_encoder(f):
+    return CompactLabelEncoder(f.strings("classes"))
+
+
+def _read_onehot_encoder(f):
+    categories = [f.strings(f"categories{i}") for i in range(f.attrs["n_features"])]
+    return CompactOneHotEncoder(f.strings("feature_names_in"), categories, f.strings("feature_names_out"), f.attrs["dtype"])
+
+
+def _read_standard_scaler(f):
+    arrays = {name: f.array(name) if f.attrs[f"has_{name}"] else None for name in ("mean", "var", "scale")}
+    names = f.strings("feature_names_in") if f.attrs["has_feature_names_in"] else None
+    return CompactStandardScaler(arrays["mean"], arrays["var"], arrays["scale"], f.attrs["n_samples_seen"],
+                                 f.attrs["with_mean"], f.attrs["with_std"], names)
+
+
+def _read_stats(f):
+    return CompactStats(f.strings("names"), f.attrs["fields"], f.array("values"), f.array("present"))
+
+
+# 種類ごとの読み込み方法
+READERS = {
+    "label_encoder": _read_label_encoder,
+    "onehot_encoder": _read_onehot_encoder,
+    "standard_scaler": _read_standard_scaler,
+    "stats": _read_stats,
+}
+
+
+def load_compact(path):
+    f = CompactFile(path)
+    if f.kind not in READERS:
+        raise ValueError(f"読み込み方法が定義されていない種類です: {f.kind} ({path})")
+    return READERS[f.kind](f)
+
+
+def _stats_columns(stats):
+    # 成績JSON（全ての値が 数値 または null の辞書）でなければ None
+    if not isinstance(stats, dict) or not all(isinstance(entry, dict) for entry in stats.values()):
+        return None
+    fields = []
+    for entry in stats.values():
+        for field, value in entry.items():
+            if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+                return None
+            if field not in fields:
+                fields.append(field)
+    return fields
+
+
+def to_compact(value):
+    """
+    成果物を write_compact の引数（kind, arrays, strings, attrs）にする。変換できないもの
+    （モデル・未fitのスケーラー・疎行列出力のエンコーダーなど）は None。
+    """
+    from sklearn.preprocessing import LabelEncoder, OneHotEncoder, StandardScaler
+
+    if type(value) is LabelEncoder and hasattr(value, "classes_") and value.classes_.dtype == object \
+            and all(isinstance(name, str) for name in value.classes_):
+        return "label_encoder", {}, {"classes": value.classes_}, {}
+
+    if type(value) is OneHotEncoder and hasattr(value, "categories_") and hasattr(value, "feature_names_in_") \
+            and value.handle_unknown == "ignore" and value.drop is None and not value.sparse_output \
+            and not getattr(value, "_infrequent_enabled", False) \
+            and all(isinstance(category, str) for categories in value.categories_ for category in categories):
+        strings = {"feature_names_in": value.feature_names_in_, "feature_names_out": value.get_feature_names_out()}
+        strings.update({f"categories{i}": categories for i, categories in enumerate(value.categories_)})
+        return "onehot_encoder", {}, strings, {"n_features": len(value.categories_), "dtype": np.dtype(value.dtype).str}
+
+    if type(value) is StandardScaler and hasattr(value, "n_samples_seen_") and np.ndim(value.n_samples_seen_) == 0:
+        arrays = {name: getattr(value, f"{name}_") for name in ("mean", "var", "scale")
+                  if getattr(value, f"{name}_", None) is not None}
+        strings = {"feature_names_in": value.feature_names_in_} if hasattr(value, "feature_names_in_") else {}
+        attrs = {"with_mean": bool(value.with_mean), "with_std": bool(value.with_std),
+                 "n_samples_seen": int(value.n_samples_seen_), "has_feature_names_in": bool(strings)}
+        attrs.update({f"has_{name}": name in arrays for name in ("mean", "var", "scale")})
+        return "standard_scaler", arrays, strings, attrs
+
+    fields = _stats_columns(value)
+    if fields is not None:
+        values = np.zeros((len(value), len(fields)))
+        present = np.zeros((len(value), len(fields)), dtype=bool)
+        for i, entry in enumerate(value.values()):
+            for field, field_value in entry.items():
+                j = fields.index(field)
+                values[i, j] = np.nan if field_value is None else field_value
+                present[i, j] = True
+        return "stats", {"values": values, "present": present}, {"names": list(value)}, {"fields": fields}
+
+    return None
+
+
+def export_compact_artifacts(model_dir, compact_dir, loaders):
+    """
+    model_dir の成果物のうち変換できるものを compact_dir に変換済みファイルとして書き出し、
+    元ファイルの内容の sha256 → 変換済みファイル の対応を manifest.json に保存する。
+    変換済みファイルの名前は内容の sha256 なので、同じ内容の成果物（馬のエンコーダーが2つなど）は1つになる。
+    どこからも参照されなくなった変換済みファイルは削除する。
+    loaders: {拡張子: bytes から成果物を読み込む関数}（ModelRegistry の LOADERS）
+    戻り値: (変換したファイルのパス, 変換しなかったファイルのパス)
+    """
+    os.makedirs(compact_dir, exist_ok=True)
+    artifacts = {}
+    exported, skipped = [], []
+    for name in sorted(os.listdir(model_dir)):
+        path = os.path.join(model_dir, name)
+        ext = os.path.splitext(name)[1].lower()
+        if not os.path.isfile(path) or ext not in loaders:
+            continue
+        with open(path, "rb") as f:
+            data = f.read()
+        source_digest = hashlib.sha256(data).hexdigest()
+        if source_digest in artifacts:
+            artifacts[source_digest]["sources"].append(name)
+            exported.append(path)
+            continue
+        compact = to_compact(loaders[ext](data))
+        if compact is None:
+            skipped.append(path)
+            continue
+        tmp_path = os.path.join(compact_dir, f"{source_digest}{COMPACT_EXT}.new")
+        digest = write_compact(tmp_path, *compact)
+        os.replace(tmp_path, os.path.join(compact_dir, f"{digest}{COMPACT_EXT}"))
+        artifacts[source_digest] = {"file": f"{digest}{COMPACT_EXT}", "kind": compact[0], "sources": [name]}
+        exported.append(path)
+
+    manifest_path = os.path.join(compact_dir, MANIFEST)
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"artifacts": artifacts}, f, ensure_ascii=False, indent=1)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+    referenced = {entry["file"] for entry in artifacts.values()}
+    for name in os.listdir(compact_dir):
+        if name.endswith(COMPACT_EXT) and name not in referenced:
+            os.remove(os.path.join(compact_dir, name))
+    return exported, skipped
+
+
+class CompactArtifacts:
+    """
+    export_compact_artifacts で書き出した変換済みファイルを、元ファイルの内容の sha256 で引く。
+    同じ変換済みファイルは一度だけ開き、同じインスタンスを返す（同じ内容のエンコーダーはプロセス内で1つ）。
+    manifest.json は変更されていれば読み直す。元ファイルが書き換えられた場合は sha256 が変わるので引けなくなる。
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._entries = {}
+        self._signature = None
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _manifest(self):
+        path = os.path.join(self.directory, MANIFEST)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return {}
+        signature = (st.st_mtime_ns, st.st_size)
+        if signature != self._signature:
+            with open(path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f)["artifacts"]
+            self._signature = signature
+        return self._entries
+
+    def lookup(self, source_digest):
+        """ 元ファイルの sha256 に対応する変換済みの成果物。無ければ None """
+        with self._lock:
+            entry = self._manifest().get(source_digest)
+            if entry is None:
+                return None
+            value = self._values.get(entry["file"])
+            if value is None:
+                value = load_compact(os.path.join(self.directory, entry["file"]))
+                self._values[entry["file"]] = value
+            return value
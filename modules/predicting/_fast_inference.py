@@ -0,0 +1,86 @@
+import os
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+# 予測に使うスレッド数（1レース分の行数ではスレッドを増やしても速くならず、ワーカー間で奪い合うだけなので既定は1）
+XGB_NTHREAD = int(os.environ.get("KEIBA_XGB_NTHREAD", "1"))
+
+_MAX_CACHED_POSITIONS = 32
+_positions = {}  # (特徴量名, DataFrameの列名) -> 列番号の配列
+_configured = weakref.WeakKeyDictionary()  # スレッド数を設定済みの Booster
+_configure_lock = threading.Lock()
+_local = threading.local()
+
+
+def _column_positions(columns, features):
+    """ features の各特徴量が columns の何番目かを返す（同じ列の並びには一度だけ計算する） """
+    key = (tuple(features), tuple(columns))
+    positions = _positions.get(key)
+    if positions is None:
+        positions = pd.Index(columns).get_indexer(features)
+        missing = [feature for feature, position in zip(features, positions) if position == -1]
+        if missing:
+            raise KeyError(f"特徴量がありません: {missing}")
+        if len(_positions) >= _MAX_CACHED_POSITIONS:
+            _positions.clear()
+        _positions[key] = positions
+    return positions
+
+
+def _buffer(n_rows, n_features):
+    """ スレッドごとに使い回す float32 の行列（行数が足りなければ作り直す） """
+    buffers = getattr(_local, "buffers", None)
+    if buffers is None:
+        buffers = _local.buffers = {}
+    buffer = buffers.get(n_features)
+    if buffer is None or len(buffer) < n_rows:
+        buffer = buffers[n_features] = np.empty((max(n_rows, 2 * len(buffer) if buffer is not None else 32),
+                                                 n_features), dtype=np.float32)
+    return buffer[:n_rows]
+
+
+def feature_matrix(df, features):
+    """
+    df から features の順に並べた float32 の連続した行列を作る。
+    スレッドごとのバッファを使い回すため、同じスレッドで次に呼び出すまでの間だけ有効。
+    """
+    positions = _column_positions(df.columns, features)
+    columns = [column for _, column in df.items()]
+    out = _buffer(len(df), len(features))
+    for j, position in enumerate(positions):
+        out[:, j] = columns[position].to_numpy()
+    return out
+
+
+def _booster(model):
+    """ モデルの Booster と、予測に使う木の範囲（sklearnのモデルは best_iteration までを使う） """
+    # xgboost はモデルの読み込み（unpickle）のときに読み込まれるので、ここでは import せずに区別する
+    if hasattr(model, "get_booster"):
+        try:
+            iteration_range = (0, model.best_iteration + 1)
+        except AttributeError:
+            iteration_range = (0, 0)
+        booster = model.get_booster()
+    else:
+        booster, iteration_range = model, (0, 0)
+    if booster not in _configured:
+        with _configure_lock:
+            if booster not in _configured:
+                booster.set_param({"nthread": XGB_NTHREAD})
+                _configured[booster] = XGB_NTHREAD
+    return booster, iteration_range
+
+
+def predict_fast(model, df, features=None):
+    """
+    XGBoostのモデル（XGBRegressor などのsklearn形式 または Booster）で df を予測する。
+    DMatrix を作らず、float32 の行列に inplace_predict する。features を省略した場合はモデルの特徴量名の順。
+    """
+    booster, iteration_range = _booster(model)
+    if features is None:
+        features = booster.feature_names
+    X = feature_matrix(df, features)
+    return booster.inplace_predict(X, iteration_range=iteration_range, validate_features=False)
@@ -0,0 +1,149 @@
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+from modules.predicting._stats_table import StatsTable
+
+# 累計する値（行ごとに足し込むだけで更新できるもの）
+_SUM_COLUMNS = ["出走回数", "着順合計", "着順件数", "3着以内回数", "速度合計", "速度件数", "人気合計", "人気件数"]
+
+
+class IncrementalStats:
+    """
+    馬・騎手ごとの過去成績を、平均ではなく合計と件数で持つ。
+    新しいレース結果は ingest() で足し込むだけなので、過去分を計算し直す必要がない。
+    取り込み済みの race_id を覚えておき、同じレースを二重に数えないようにする。
+    save()/load() は非圧縮の .npz（名前の配列と合計の2次元配列）で、読み込みはほぼコピーのみ。
+    """
+
+    def __init__(self, names=None, sums=None, race_ids=None):
+        self.index = pd.Index([] if names is None else list(names), dtype=object)
+        self.sums = np.zeros((0, len(_SUM_COLUMNS))) if sums is None else np.asarray(sums, dtype=float)
+        self.race_ids = set() if race_ids is None else set(race_ids)
+
+    def __len__(self):
+        return len(self.index)
+
+    def ingest(self, df, key_column):
+        """
+        レース結果（着順を含むDataFrame）を key_column（"馬" or "騎手"）ごとに足し込む。
+        取り込んだ行数を返す。
+        """
+        if "race_id" in df.columns:
+            race_ids = df["race_id"].astype(str)
+            new_rows = ~race_ids.isin(self.race_ids)
+            df, race_ids = df[new_rows], race_ids[new_rows]
+        else:
+            race_ids = None
+        if df.empty:
+            return 0
+
+        rank = pd.to_numeric(df["着順"], errors="coerce")
+        if "走破時間" in df.columns and "距離" in df.columns:
+            speed = df["走破時間"] / df["距離"]
+        else:
+            speed = pd.Series(np.nan, index=df.index)
+        if "人気" in df.columns:
+            popularity = pd.to_numeric(df["人気"], errors="coerce")
+        else:
+            popularity = pd.Series(np.nan, index=df.index)
+        parts = pd.DataFrame({
+            "key": df[key_column].values,
+            "出走回数": 1.0,
+            "着順合計": rank.fillna(0).values,
+            "着順件数": rank.notna().values,
+            "3着以内回数": (rank <= 3).values,
+            "速度合計": speed.fillna(0).values,
+            "速度件数": speed.notna().values,
+            "人気合計": popularity.fillna(0).values,
+            "人気件数": popularity.notna().values,
+        })
+        grouped = parts.groupby("key", sort=False)[_SUM_COLUMNS].sum()
+
+        positions = self.index.get_indexer(grouped.index)
+        known = positions != -1
+        values = grouped.to_numpy(dtype=float)
+        np.add.at(self.sums, positions[known], values[known])
+        if (~known).any():
+            self.index = self.index.append(grouped.index[~known])
+            self.sums = np.vstack([self.sums, values[~known]])
+
+        if race_ids is not None:
+            self.race_ids.update(race_ids.unique())
+        return len(df)
+
+    def _means(self):
+        s = dict(zip(_SUM_COLUMNS, self.sums.T))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return {
+                "平均着順": s["着順合計"] / s["着順件数"],
+                "勝率": s["3着以内回数"] / s["出走回数"],  # 3着以内の割合
+                "出走回数": s["出走回数"],
+                "平均速度": s["速度合計"] / s["速度件数"],
+                "平均人気": s["人気合計"] / s["人気件数"],
+            }
+
+    def to_stats_dict(self, fields):
+        """ 従来のJSONと同じ {名前: {統計名: 値}} 形式に変換する """
+        means = self._means()
+        columns = [(field, means[field]) for field in fields]
+        result = {}
+        for i, name in enumerate(self.index):
+            entry = {}
+            for field, values in columns:
+                entry[field] = int(values[i]) if field == "出走回数" else float(values[i])
+            result[name] = entry
+        return result
+
+    def to_stats_table(self, fields):
+        """ 予測時に使う StatsTable を辞書を経由せずに作る。fields: [(統計名, 既定値)] """
+        means = self._means()
+        values = np.column_stack([means[field] for field, _ in fields]) if len(self) else np.zeros((0, len(fields)))
+        return StatsTable(self.index, values, fields)
+
+    @classmethod
+    def from_stats_dict(cls, stats, race_ids=None):
+        """
+        従来のJSON（平均と出走回数）から累計を復元する。
+        JSONにはどのレースを集計したかが残っていないため、集計済みとみなす race_ids を指定できる。
+        """
+        names = list(stats)
+        sums = np.zeros((len(names), len(_SUM_COLUMNS)))
+        col = {name: i for i, name in enumerate(_SUM_COLUMNS)}
+        for i, name in enumerate(names):
+            entry = stats[name]
+            runs = entry.get("出走回数", 0)
+            sums[i, col["出走回数"]] = runs
+            sums[i, col["3着以内回数"]] = entry.get("勝率", 0) * runs
+            for mean_field, sum_field, count_field in [("平均着順", "着順合計", "着順件数"),
+                                                       ("平均速度", "速度合計", "速度件数"),
+                                                       ("平均人気", "人気合計", "人気件数")]:
+                if entry.get(mean_field) is not None:
+                    sums[i, col[sum_field]] = entry[mean_field] * runs
+                    sums[i, col[count_field]] = runs
+        return cls(names, sums, race_ids)
+
+    def save(self, path):
+        """ 非圧縮の .npz に保存する（一時ファイルに書いてから置き換える） """
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, names=np.array(self.index, dtype=str), sums=self.sums,
+                     race_ids=np.array(sorted(self.race_ids), dtype=str))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def from_bytes(cls, data):
+        with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+            return cls(arrays["names"].tolist(), arrays["sums"], arrays["race_ids"].tolist())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+
+def stats_binary_path(json_path):
+    """ 成績JSONのパスに対応するバイナリのパス（model/horse_stats.json -> model/horse_stats.stats.npz） """
+    return os.path.splitext(json_path)[0] + ".stats.npz"
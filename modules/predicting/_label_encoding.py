@@ -0,0 +1,70 @@
+import weakref
+
+import numpy as np
+import pandas as pd
+
+# エンコーダーごとの「クラス名 → コード」のハッシュインデックス
+_class_indexes = weakref.WeakKeyDictionary()
+
+
+def _class_index(encoder):
+    """ fit済みLabelEncoderの classes_ からハッシュインデックスを作る（エンコーダーごとに一度だけ） """
+    index = _class_indexes.get(encoder)
+    if index is None:
+        # LabelEncoderのコードは classes_（ソート済み・重複なし）内の位置と一致する
+        index = pd.Index(encoder.classes_)
+        _class_indexes[encoder] = index
+    return index
+
+
+def transform_with_unknown(encoder, values, unknown=-1):
+    """
+    LabelEncoder.transform と同じコードを列全体に対して一括で求める。
+    学習時に存在しなかった値（欠損値を含む）は unknown に置き換える。
+    """
+    codes = _class_index(encoder).get_indexer(values)
+    if unknown != -1:
+        codes[codes == -1] = unknown
+    return codes
+
+
+# ワンホットエンコーダーごとの (列ごとのカテゴリのインデックス, 出力の列名)
+_onehot_indexes = weakref.WeakKeyDictionary()
+
+
+def _onehot_index(encoder):
+    cached = _onehot_indexes.get(encoder)
+    if cached is None:
+        cached = ([pd.Index(categories) for categories in encoder.categories_], encoder.get_feature_names_out())
+        _onehot_indexes[encoder] = cached
+    return cached
+
+
+def _is_plain_onehot(encoder, columns):
+    # drop・頻度の低いカテゴリのまとめ・疎行列出力を使わず、未知の値を無視する設定のときだけ一括で求める
+    return (hasattr(encoder, "categories_") and encoder.handle_unknown == "ignore" and encoder.drop is None
+            and not encoder.sparse_output
+            and not getattr(encoder, "_infrequent_enabled", False)
+            and list(getattr(encoder, "feature_names_in_", columns)) == list(columns))
+
+
+def onehot_with_unknown(encoder, df, columns):
+    """
+    OneHotEncoder.transform(df[columns]) と同じ結果を、列の名前を付けたDataFrameで返す。
+    category 型の列はカテゴリごとに1回だけ引くので、行ごとの比較をしない。未知の値（欠損値を含む）は全て0。
+    """
+    if not _is_plain_onehot(encoder, columns):
+        return pd.DataFrame(encoder.transform(df[columns]), columns=encoder.get_feature_names_out(columns))
+    indexes, names = _onehot_index(encoder)
+    out = np.zeros((len(df), len(names)), dtype=encoder.dtype)
+    offset = 0
+    for column, index in zip(columns, indexes):
+        values = df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            positions = np.append(index.get_indexer(values.cat.categories), -1)[values.cat.codes.to_numpy()]
+        else:
+            positions = index.get_indexer(values)
+        rows = np.flatnonzero(positions != -1)
+        out[rows, offset + positions[rows]] = 1
+        offset += len(index)
+    return pd.DataFrame(out, columns=names)
@@ -0,0 +1,212 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+
+from modules.predicting._compact_artifacts import CompactArtifacts
+from modules.predicting._incremental_stats import IncrementalStats
+from modules.predicting._stage_timer import stage
+
+MODEL_DIR = "model"
+# export_compact_artifacts.py で変換した成果物の置き場所（model_dir からの相対パス）
+COMPACT_DIR = "compact"
+
+logger = logging.getLogger(__name__)
+
+
+def _load_pickle(data):
+    # joblib（と pickle の中のモデルが使う sklearn・xgboost）は最初に pickle を読み込むときに読み込む
+    import joblib
+
+    return joblib.load(io.BytesIO(data))
+
+
+def _load_json(data):
+    return json.loads(data.decode("utf-8"))
+
+
+def _load_csv(data):
+    return pd.read_csv(io.BytesIO(data))
+
+
+def _load_incremental_stats(data):
+    return IncrementalStats.from_bytes(data)
+
+
+# 拡張子ごとの読み込み方法
+LOADERS = {
+    ".pkl": _load_pickle,
+    ".json": _load_json,
+    ".csv": _load_csv,
+    ".npz": _load_incremental_stats,  # 馬・騎手の累計成績（*.stats.npz）
+}
+
+
+class _Artifact:
+    """ 読み込み済みの成果物と、その読み込み元ファイルの状態 """
+
+    def __init__(self, value, signature, digest):
+        self.value = value
+        self.signature = signature  # (mtime_ns, size)
+        self.digest = digest  # ファイル内容のsha256
+        self.checked_at = time.monotonic()
+
+
+class ModelRegistry:
+    """
+    model/ 配下の成果物（エンコーダー・スケーラー・モデル・統計JSONなど）を
+    プロセス内で一度だけ読み込み、前処理と予測で同じインスタンスを共有する。
+    共有インスタンスは読み取り専用として扱うこと（fitなどで書き換えない）。
+
+    check_interval 秒ごとにファイルの mtime/サイズを確認し、変化していれば内容の
+    ハッシュを比較して、変わっていた場合のみ読み込み直して差し替える。
+    差し替えは読み込みが完了してから行うため、読み込み中のリクエストは古い値を使い続ける。
+
+    model_dir/compact に同じ内容のファイルを変換した成果物（エンコーダー・スケーラー・成績JSON）があれば、
+    pickle などを読み込まずにそちら（メモリマップ）を使う。同じ内容のファイルは同じインスタンスになる。
+    """
+
+    def __init__(self, model_dir=MODEL_DIR, check_interval=2.0, auto_reload=True):
+        self.model_dir = model_dir
+        self.compact = CompactArtifacts(os.path.join(model_dir, COMPACT_DIR))
+        self.check_interval = check_interval
+        self.auto_reload = auto_reload
+        self._artifacts = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _key(path):
+        return os.path.normpath(path)
+
+    @staticmethod
+    def _signature(path):
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def get(self, path):
+        """ 成果物を返す。未読み込みなら読み込み、変更されていれば読み込み直す """
+        key = self._key(path)
+        artifact = self._artifacts.get(key)
+        if artifact is None:
+            return self._load(key).value
+        if self.auto_reload and time.monotonic() - artifact.checked_at >= self.check_interval:
+            artifact = self._refresh(key, artifact)
+        return artifact.value
+
+    def _load(self, key):
+        with self._lock:
+            artifact = self._artifacts.get(key)
+            if artifact is not None:
+                return artifact
+            signature = self._signature(key)
+            with open(key, "rb") as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()
+            with stage("artifact_load", artifact=os.path.basename(key)):
+                value = self._deserialize(key, data, digest)
+            artifact = _Artifact(value, signature, digest)
+            self._artifacts[key] = artifact
+            return artifact
+
+    def _refresh(self, key, artifact):
+        with self._lock:
+            current = self._artifacts.get(key, artifact)
+            if current is not artifact:
+                # 他のスレッドがすでに読み込み直している
+                return current
+            artifact.checked_at = time.monotonic()
+            try:
+                signature = self._signature(key)
+            except OSError:
+                # ファイルが一時的に存在しない場合は読み込み済みの値を使い続ける
+                return artifact
+            if signature == artifact.signature:
+                return artifact
+
+            with open(key, "rb") as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()
+            if digest == artifact.digest:
+                # 内容は同じ（touchされただけ）
+                artifact.signature = signature
+                return artifact
+
+            try:
+                with stage("artifact_load", artifact=os.path.basename(key)):
+                    value = self._deserialize(key, data, digest)
+            except Exception as e:
+                # 書き込み途中などで読めない場合は次回の確認時に再試行する
+                logger.warning("%s の再読み込みに失敗しました: %s", key, e)
+                return artifact
+
+            new_artifact = _Artifact(value, signature, digest)
+            self._artifacts[key] = new_artifact
+            logger.info("%s を再読み込みしました", key)
+            return new_artifact
+
+    def _deserialize(self, key, data, digest):
+        try:
+            value = self.compact.lookup(digest)
+        except Exception as e:
+            # 変換済みファイルが壊れているなどの場合は元のファイルから読み込む
+            logger.warning("%s の変換済みファイルを読み込めませんでした: %s", key, e)
+            value = None
+        if value is not None:
+            return value
+        ext = os.path.splitext(key)[1].lower()
+        if ext not in LOADERS:
+            raise ValueError(f"読み込み方法が定義されていないファイル形式です: {key}")
+        return LOADERS[ext](data)
+
+    def preload(self):
+        """ model_dir 内の読み込み可能なファイルをすべて読み込んでおく """
+        loaded = []
+        for name in sorted(os.listdir(self.model_dir)):
+            path = os.path.join(self.model_dir, name)
+            if os.path.isfile(path) and os.path.splitext(name)[1].lower() in LOADERS:
+                self.get(path)
+                loaded.append(self._key(path))
+        return loaded
+
+    def loaded(self):
+        """ 読み込み済みの成果物のパス """
+        return list(self._artifacts)
+
+    def fingerprint(self):
+        """
+        読み込み済みの成果物の内容から作った指紋を返す。いずれかが読み込み直されると変わる。
+        確認間隔を過ぎた成果物はここで変更を確認する。
+        """
+        h = hashlib.sha256()
+        for key, artifact in sorted(self._artifacts.items()):
+            if self.auto_reload and time.monotonic() - artifact.checked_at >= self.check_interval:
+                artifact = self._refresh(key, artifact)
+            h.update(f"{key}:{artifact.digest}\n".encode("utf-8"))
+        return h.hexdigest()
+
+    def reload_changed(self):
+        """ 読み込み済みの成果物のうち、ファイルが変更されたものを読み込み直す """
+        reloaded = []
+        for key, artifact in list(self._artifacts.items()):
+            if self._refresh(key, artifact) is not artifact:
+                reloaded.append(key)
+        return reloaded
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """ プロセス共有のレジストリを返す """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry()
+    return _registry
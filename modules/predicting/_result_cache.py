@@ -0,0 +1,92 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+
+def race_card_key(df, model_fingerprint=""):
+    """
+    出馬表の内容（列名・型・全ての値）とモデルの指紋からキャッシュのキーを作る。
+    オッズや人気が1つでも変われば別のキーになる。
+    """
+    h = hashlib.sha256()
+    h.update(model_fingerprint.encode("utf-8"))
+    for name, column in df.items():
+        h.update(f"\0{name}:{column.dtype}:{len(column)}\0".encode("utf-8"))
+        values = column.to_numpy()
+        if values.dtype == object:
+            # 文字列列は値を区切り文字でつなげる（欠損値は区切り文字とは別の印にする）
+            h.update("\x1f".join("\x1e" if pd.isna(v) else str(v) for v in values).encode("utf-8"))
+        else:
+            h.update(values.tobytes())
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    予測結果をメモリに保持するLRUキャッシュ。
+    max_entries を超えたら最も長く使われていないものから捨て、ttl 秒を過ぎたものは使わない。
+    返す結果は共有しているため、呼び出し側で書き換えないこと。
+    """
+
+    def __init__(self, max_entries=256, ttl=600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # キー -> (保存時刻, 結果)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """ キャッシュされた結果を返す。無い・期限切れの場合は None """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """ ヒット数などの集計を返す """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """ プロセス共有のキャッシュを返す """
+    global _result_cache
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                _result_cache = ResultCache()
+    return _result_cache
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+
+class RaceSegments:
+    """
+    keys（race_id など）が同じ行を1つの区間（レース）としてまとめたもの。
+    区間ごとの集計は、同じ頭数のレースを (レース数, 列数, 頭数) の配列にまとめて最後の軸で一度に行う。
+    頭数の種類（高々十数種類）の分しかループしないので、レース数が増えても Python の処理はほとんど増えない。
+    keys が欠損値の行はどの区間にも含めない（groupby と同じ）。
+    """
+
+    def __init__(self, keys):
+        codes, _ = pd.factorize(np.asarray(keys, dtype=object))
+        # 区間ごとに連続するよう並べ替える（出馬表を連結したデータは既に連続している）。欠損値（-1）は先頭に集まる
+        order = np.argsort(codes, kind="stable")
+        sorted_codes = codes[order]
+        first_valid = int(np.searchsorted(sorted_codes, 0))
+        rows = order[first_valid:]
+        sorted_codes = sorted_codes[first_valid:]
+        starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]]) if len(sorted_codes) else np.zeros(0, dtype=int)
+        lengths = np.diff(np.r_[starts, len(sorted_codes)])
+        # 頭数ごとに、その頭数のレースの行番号を (レース数, 頭数) の配列で持つ
+        self.buckets = [rows[starts[lengths == length][:, None] + np.arange(length)]
+                        for length in np.unique(lengths)]
+
+    def standardize(self, values):
+        """
+        values の各列を区間ごとに標準化する。
+        groupby(keys).transform(lambda g: (g - g.mean()) / g.std(ddof=0)) と同じ結果を、レースごとの関数呼び出しなしで求める。
+        pandas と同じ順序で足し合わせる（列ごとに連続した配列に対する numpy の sum）ので、前処理の DataFrame ではビット単位で一致する。
+        - 欠損値は平均・分散の計算から除き、結果も欠損値のまま
+        - 1頭だけのレースや全頭が同じ値の列（分散0）は欠損値。ただし 1.6 のように2進数で表せない値が並ぶ列は、
+          pandas と同じく丸め誤差で ±1 になることがある（学習時のデータもこの結果で作られている）
+        - float32 の列は pandas と同じく float32 で返す（分散は float64 で求める）。それ以外は float64
+        values: (行数,) または (行数, 列数) の数値配列
+        """
+        values = np.asarray(values)
+        if values.dtype != np.float32:
+            values = values.astype(np.float64)
+        squeeze = values.ndim == 1
+        x = values[:, None] if squeeze else values
+        result = np.full(x.shape, np.nan, dtype=x.dtype)
+        for rows in self.buckets:
+            result[rows] = self._standardize_block(x[rows]).transpose(0, 2, 1)
+        return result[:, 0] if squeeze else result
+
+    @staticmethod
+    def _standardize_block(block):
+        # block: (レース数, 頭数, 列数) -> 列ごとの値が連続した (レース数, 列数, 頭数) にして最後の軸で集計する
+        block = np.ascontiguousarray(block.transpose(0, 2, 1))
+        missing = np.isnan(block)
+        filled = np.where(missing, 0, block)
+        counts = (~missing).sum(axis=-1, keepdims=True).astype(block.dtype)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = filled.sum(axis=-1, keepdims=True) / counts
+            # 分散は pandas（nanops.nanvar）と同じく float64 の2パスで求め、元の型に戻す
+            means64 = filled.sum(axis=-1, keepdims=True, dtype=np.float64) / counts
+            squares = np.where(missing, 0, (means64 - block) ** 2)
+            variances = squares.sum(axis=-1, keepdims=True, dtype=np.float64) / counts
+            stds = np.sqrt(variances.astype(block.dtype))
+            # 分散0の列は 0 / 0 で欠損値になる（pandas と同じく特別扱いはしない）
+            return (block - means) / stds
@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+
+# 同じキーの計算を待つ最大時間（秒）
+SINGLE_FLIGHT_TIMEOUT = float(os.environ.get("KEIBA_SINGLE_FLIGHT_TIMEOUT", "30"))
+
+
+class SingleFlightTimeout(TimeoutError):
+    """ 実行中の同じ計算が timeout 秒以内に終わらなかった """
+
+
+class SingleFlightError(RuntimeError):
+    """ 後から来た呼び出しが受け取る、先頭の計算の失敗（先頭の例外は __cause__ に入っている） """
+
+
+class _Flight:
+    __slots__ = ("done", "deadline", "finished", "result", "error")
+
+    def __init__(self, deadline):
+        self.done = threading.Event()
+        self.deadline = deadline
+        self.finished = False
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    同じキーの計算が実行中なら、新しく計算せずにその結果を待って受け取る。
+    最初の呼び出し（先頭）だけが fn() を実行し、後から来た呼び出しは同じ結果を受け取る。
+    fn() が例外を送出した場合、先頭にはその例外がそのまま届き、後から来た呼び出しには
+    それを原因とする SingleFlightError が届く（1つの例外を複数のスレッドで送出し直さないように）。
+    計算が終わったら結果は保持しない（結果を使い回すのは ResultCache の役割）。
+
+    後から来た呼び出しは、計算の開始から timeout 秒で SingleFlightTimeout になる。
+    timeout を過ぎても終わらない計算には合流せず、新しく計算を始める（止まった計算に全員が待たされないように）。
+    """
+
+    def __init__(self, timeout=SINGLE_FLIGHT_TIMEOUT):
+        self.timeout = timeout
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.shared = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    def do(self, key, fn, timeout=None):
+        """ fn() の結果と、他の呼び出しの結果を受け取ったかどうかを返す """
+        timeout = self.timeout if timeout is None else timeout
+        now = time.monotonic()
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None and flight.deadline > now:
+                leader = False
+            else:
+                flight = self._flights[key] = _Flight(now + timeout)
+                self.leaders += 1
+                leader = True
+
+        if leader:
+            try:
+                flight.result = fn()
+                flight.finished = True
+            except Exception as e:
+                flight.error = e
+                flight.finished = True
+                raise
+            finally:
+                # KeyboardInterrupt などで中断された場合も、待っている呼び出しを起こす
+                with self._lock:
+                    if self._flights.get(key) is flight:
+                        del self._flights[key]
+                    if not flight.finished or flight.error is not None:
+                        self.errors += 1
+                flight.done.set()
+            return flight.result, False
+
+        if not flight.done.wait(max(flight.deadline - time.monotonic(), 0)):
+            with self._lock:
+                self.timeouts += 1
+            raise SingleFlightTimeout(f"実行中の計算が{timeout:g}秒以内に終わりませんでした: {key}")
+        with self._lock:
+            self.shared += 1
+        if flight.error is not None:
+            raise SingleFlightError(str(flight.error)) from flight.error
+        if not flight.finished:
+            raise SingleFlightError(f"実行中の計算が中断されました: {key}")
+        return flight.result, True
+
+    def stats(self):
+        with self._lock:
+            return {"leaders": self.leaders, "shared": self.shared, "timeouts": self.timeouts,
+                    "errors": self.errors, "in_flight": len(self._flights)}
+
+
+_prediction_flights = None
+_prediction_flights_lock = threading.Lock()
+
+
+def get_prediction_flights():
+    """ 1レースの予測（/process）で共有する SingleFlight を返す """
+    global _prediction_flights
+    if _prediction_flights is None:
+        with _prediction_flights_lock:
+            if _prediction_flights is None:
+                _prediction_flights = SingleFlight()
+    return _prediction_flights
@@ -0,0 +1,82 @@
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import numpy as np
+
+_local = threading.local()
+# すべてのスレッドの stage() を受け取る関数（メトリクスの集計など）
+_listeners = []
+
+
+def add_stage_listener(listener):
+    """ listener(区間名, 秒, ラベルの辞書) をすべての stage() の終了時に呼ぶ """
+    _listeners.append(listener)
+
+
+@contextmanager
+def stage(name, **labels):
+    """
+    予測処理の区間（ファイルの検索・読み込み・前処理・予測など）を計測する。
+    StageTimer.activate() の中か、add_stage_listener() で受け取り先がある場合だけ記録し、
+    それ以外ではほとんど何もしない。labels は受け取り先に渡す補足情報（読み込んだファイル名など）。
+    """
+    timers = getattr(_local, "timers", None)
+    if not timers and not _listeners:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        for timer in timers or ():
+            timer.record(name, elapsed)
+        for listener in _listeners:
+            listener(name, elapsed, labels)
+
+
+def summarize(values):
+    """ 秒の一覧を件数・合計・平均・分位点（ミリ秒）にまとめる """
+    if not values:
+        return {"count": 0}
+    ms = np.asarray(values) * 1000
+    return {
+        "count": len(ms),
+        "total_ms": float(ms.sum()),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+    }
+
+
+class StageTimer:
+    """ stage() で計測した時間を区間名ごとに集める """
+
+    def __init__(self):
+        self.timings = defaultdict(list)
+
+    def record(self, name, seconds):
+        self.timings[name].append(seconds)
+
+    @contextmanager
+    def activate(self):
+        """ このブロックの中（同じスレッド）で実行された stage() を記録する """
+        timers = getattr(_local, "timers", None)
+        if timers is None:
+            timers = _local.timers = []
+        timers.append(self)
+        try:
+            yield self
+        finally:
+            timers.remove(self)
+
+    def summary(self):
+        return {name: summarize(values) for name, values in self.timings.items()}
+
+    def server_timing(self):
+        """ HTTPの Server-Timing ヘッダーの値（区間ごとの合計ミリ秒） """
+        return ", ".join(f"{name};dur={sum(values) * 1000:.2f}" for name, values in self.timings.items())
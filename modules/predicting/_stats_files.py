@@ -0,0 +1,33 @@
+import json
+import os
+
+from modules.predicting._incremental_stats import IncrementalStats, stats_binary_path
+from modules.predicting._model_registry import get_registry
+
+
+def load_stats(json_file, is_train):
+    """
+    成績情報を読み込む。累計形式のバイナリがあれば IncrementalStats、無ければ従来のJSONの辞書を返す（どちらも無ければ空の辞書）。
+    予測時はプロセス共有のレジストリから読み込む。
+    """
+    for path in [stats_binary_path(json_file), json_file]:
+        if not os.path.exists(path):
+            continue
+        if not is_train:
+            return get_registry().get(path)
+        if path != json_file:
+            return IncrementalStats.load(path)
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def stats_to_ingest(stats, json_file, is_train):
+    """
+    レース結果を足し込む先の IncrementalStats を返す（予測時に共有しているものは書き換えないよう読み直す）。
+    従来のJSONの場合はその値を合計に戻したものを返す。JSONはこれから足し込むレースより前のレースを集計したものとみなし、
+    足し込むレース結果はJSONの値に加算される（どのレースを集計したかは残っていないため、集計済みのレースは記録しない）。
+    """
+    if isinstance(stats, IncrementalStats):
+        return stats if is_train else IncrementalStats.load(stats_binary_path(json_file))
+    return IncrementalStats.from_stats_dict(stats)
@@ -0,0 +1,71 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+# 成績の辞書ごとに作った表（レジストリで読み直されたら新しい辞書になるので、古いものは捨てる）
+_MAX_CACHED_TABLES = 8
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+class StatsTable:
+    """
+    {馬名 or 騎手名: {統計名: 値}} の辞書を、名前のインデックスと数値の2次元配列にしたもの。
+    """
+
+    def __init__(self, index, values, fields):
+        self.fields = [field for field, _ in fields]
+        self.defaults = np.array([default for _, default in fields], dtype=float)
+        self.index = pd.Index(index)
+        self.values = np.asarray(values, dtype=float).reshape(len(self.index), len(fields))
+
+    @classmethod
+    def from_stats(cls, stats, fields):
+        """ {名前: {統計名: 値}} の辞書から作る。辞書の項目が無い場合は既定値 """
+        values = [[entry.get(field, default) for field, default in fields] for entry in stats.values()]
+        return cls(list(stats), values, fields)
+
+    def lookup(self, keys):
+        """ keysの各要素の統計を (len(keys), 統計の数) の配列で返す。辞書に無い名前は既定値 """
+        positions = self.index.get_indexer(keys)
+        known = positions != -1
+        result = np.empty((len(positions), len(self.fields)))
+        result[known] = self.values[positions[known]]
+        result[~known] = self.defaults
+        return result
+
+
+def _build_table(stats, fields):
+    # 累計形式（IncrementalStats）の場合は辞書を経由せずに作る
+    if hasattr(stats, "to_stats_table"):
+        return stats.to_stats_table(fields)
+    return StatsTable.from_stats(stats, fields)
+
+
+def get_stats_table(stats, fields, cache=True):
+    """
+    stats（辞書 または IncrementalStats）から StatsTable を作る。cache=True の場合は同じ辞書オブジェクトに対して一度だけ作る
+    （学習時のように辞書を書き換える場合は cache=False にする）。
+    fields: [(統計名, 辞書に無い場合の値)]
+    """
+    if not cache:
+        return _build_table(stats, fields)
+    key = (id(stats), tuple(fields))
+    cached = _tables.get(key)
+    if cached is not None and cached[0] is stats:
+        return cached[1]
+    table = _build_table(stats, fields)
+    with _tables_lock:
+        if len(_tables) >= _MAX_CACHED_TABLES:
+            _tables.clear()
+        _tables[key] = (stats, table)
+    return table
+
+
+def add_stats_features(df, key_column, table, columns):
+    """ df[key_column] で table を一括で引き、columns（table.fields と同じ順）の列として追加する """
+    values = table.lookup(df[key_column])
+    for i, column in enumerate(columns):
+        df[column] = values[:, i]
+    return df
@@ -0,0 +1,142 @@
+import atexit
+import threading
+import time
+from contextlib import contextmanager
+
+from ._prepare_chrome_driver import prepare_chrome_driver
+
+DRIVER_POOL_SIZE = 2
+DRIVER_MAX_USES = 50
+
+
+class _PooledDriver:
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+
+
+class ChromeDriverPool:
+    """
+    起動済みのChromeを使い回すプール。スクレイピング関数は borrow() で借りて、終わったら返す。
+    - size: 同時に起動しておくChromeの最大数（すべて貸し出し中なら返されるまで待つ）
+    - max_uses: この回数貸し出したChromeは終了して作り直す（メモリの増加対策）
+    貸し出す前に応答を確認し、応答しないChromeは作り直す。
+    """
+
+    def __init__(self, size=DRIVER_POOL_SIZE, max_uses=DRIVER_MAX_USES, factory=prepare_chrome_driver):
+        self.size = size
+        self.max_uses = max_uses
+        self.factory = factory
+        self._idle = []
+        self._created = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+    @staticmethod
+    def _is_healthy(pooled):
+        try:
+            pooled.driver.execute_script("return document.readyState")
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _quit(pooled):
+        try:
+            pooled.driver.quit()
+        except Exception as e:
+            print(f"Chromeの終了に失敗しました: {e}")
+
+    def acquire(self, timeout=None):
+        """ Chromeを1つ借りる。timeout 秒待っても空かなければ TimeoutError """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise RuntimeError("プールは終了しています")
+                if self._idle:
+                    pooled = self._idle.pop()
+                    break
+                if self._created < self.size:
+                    self._created += 1
+                    pooled = None
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("空いているChromeがありません")
+                self._condition.wait(remaining)
+
+        # 起動と応答確認はロックの外で行う
+        if pooled is not None and not self._is_healthy(pooled):
+            self._quit(pooled)
+            pooled = None
+        if pooled is None:
+            try:
+                pooled = _PooledDriver(self.factory())
+            except Exception:
+                with self._condition:
+                    self._created -= 1
+                    self._condition.notify()
+                raise
+        pooled.uses += 1
+        return pooled
+
+    def release(self, pooled, broken=False):
+        """ 借りたChromeを返す。broken=True または使用回数の上限に達したものは終了する """
+        with self._condition:
+            recycle = broken or self._closed or pooled.uses >= self.max_uses or self._created > self.size
+            if recycle:
+                self._created -= 1
+            else:
+                self._idle.append(pooled)
+            self._condition.notify()
+        if recycle:
+            self._quit(pooled)
+
+    @contextmanager
+    def borrow(self, timeout=None):
+        """ with pool.borrow() as driver: の形で使う。例外が起きたChromeは作り直す """
+        pooled = self.acquire(timeout)
+        try:
+            yield pooled.driver
+        except BaseException:
+            self.release(pooled, broken=True)
+            raise
+        else:
+            self.release(pooled)
+
+    def resize(self, size):
+        """ 同時に起動しておくChromeの最大数を変更する（減らした分は返されたものから終了する） """
+        with self._condition:
+            self.size = size
+            excess = self._idle[size:] if len(self._idle) > size else []
+            self._idle = self._idle[:len(self._idle) - len(excess)]
+            self._created -= len(excess)
+            self._condition.notify_all()
+        for pooled in excess:
+            self._quit(pooled)
+
+    def close(self):
+        """ 待機中のChromeを終了する。貸し出し中のものは返されたときに終了する """
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+            self._condition.notify_all()
+        for pooled in idle:
+            self._quit(pooled)
+
+
+_driver_pool = None
+_driver_pool_lock = threading.Lock()
+
+
+def get_driver_pool():
+    """ プロセス共有のプールを返す（プロセス終了時にChromeを終了する） """
+    global _driver_pool
+    if _driver_pool is None:
+        with _driver_pool_lock:
+            if _driver_pool is None:
+                _driver_pool = ChromeDriverPool()
+                atexit.register(_driver_pool.close)
+    return _driver_pool
@@ -0,0 +1,221 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+HTTP_CACHE_DIR = "cache/http"
+
+logger = logging.getLogger(__name__)
+
+# 仕様変更対策（スクレイピングするモジュールはこの一覧を使う）
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:115.0) Gecko/20100101 Firefox/115.0",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:115.0) Gecko/20100101 Firefox/115.0",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.1.2 Safari/605.1.15",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36 Edg/115.0.0.0",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36 OPR/85.0.4341.72",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36 OPR/85.0.4341.72",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36 Vivaldi/5.3.2679.55",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36 Vivaldi/5.3.2679.55",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36 Brave/1.40.107",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36 Brave/1.40.107",
+]
+
+# URLごとのキャッシュの有効期間（秒）。上から順に最初に一致したものを使う
+TTL_RULES = [
+    (re.compile(r"/jockey/"), 7 * 24 * 3600),  # 騎手ページ（名前は変わらない）
+    (re.compile(r"/race/result\.html"), 30 * 24 * 3600),  # 確定したレース結果
+    (re.compile(r"/odds/|/api/"), 30),  # オッズ
+    (re.compile(r"/race/shutuba\.html"), 60),  # 出馬表（オッズ・人気を含む）
+    (re.compile(r"/top/race_list"), 3600),  # 開催日のレース一覧
+]
+DEFAULT_TTL = 300
+
+# 再試行するステータスコード
+_RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """ 平均 rate 回/秒、最大 capacity 回まで連続してリクエストできるようにする """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """ トークンを1つ取り出す。無ければ補充されるまで待つ """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def ttl_for_url(url, rules=TTL_RULES, default=DEFAULT_TTL):
+    for pattern, ttl in rules:
+        if pattern.search(url):
+            return ttl
+    return default
+
+
+def _retry_after(error):
+    value = error.headers.get("Retry-After") if error.headers else None
+    if not value:
+        return None
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class CachedFetcher:
+    """
+    スクレイピング用のHTTP取得。レスポンスをURLごとにファイルへ保存し、有効期間内はそのまま返す。
+    期限切れの場合は ETag / Last-Modified を付けて問い合わせ、304 なら保存済みの内容を使う。
+    実際に送るリクエストはトークンバケットで間隔を制限し、通信エラーや 429/5xx は待ち時間を延ばしながら再試行する。
+    """
+
+    def __init__(self, cache_dir=HTTP_CACHE_DIR, rate=1.0, burst=3, max_retries=3, backoff=1.0, timeout=10,
+                 ttl_rules=TTL_RULES, default_ttl=DEFAULT_TTL):
+        self.cache_dir = cache_dir
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.ttl_rules = ttl_rules
+        self.default_ttl = default_ttl
+        self.bucket = TokenBucket(rate, burst)
+        self.hits = 0
+        self.revalidated = 0
+        self.fetched = 0
+        self._stats_lock = threading.Lock()
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def _count(self, name):
+        # 複数のスレッドから取得するため、件数はロックを取って数える
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _paths(self, url):
+        name = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self.cache_dir, name[:2], name)
+        return base + ".body", base + ".json"
+
+    def _url_lock(self, url):
+        # 同じURLを同時に取得しないようにする
+        with self._locks_lock:
+            return self._locks.setdefault(url, threading.Lock())
+
+    def _read_cache(self, url):
+        body_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                return meta, f.read()
+        except (OSError, ValueError):
+            return None, None
+
+    def _write_cache(self, url, meta, body=None):
+        body_path, meta_path = self._paths(url)
+        os.makedirs(os.path.dirname(body_path), exist_ok=True)
+        if body is not None:
+            with open(body_path + ".tmp", "wb") as f:
+                f.write(body)
+            os.replace(body_path + ".tmp", body_path)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def _request(self, url, headers):
+        """ リクエストを送り (ステータス, ヘッダー, 本文) を返す。304 もここで返す """
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            request = Request(url, headers={"User-Agent": random.choice(USER_AGENTS), **headers})
+            try:
+                with urlopen(request, timeout=self.timeout) as response:
+                    return response.status, response.headers, response.read()
+            except HTTPError as e:
+                if e.code == 304:
+                    return 304, e.headers, b""
+                if e.code not in _RETRY_STATUSES or attempt == self.max_retries:
+                    raise
+                wait = _retry_after(e)
+            except (URLError, TimeoutError, ConnectionError):
+                if attempt == self.max_retries:
+                    raise
+                wait = None
+            if wait is None:
+                wait = self.backoff * 2 ** attempt * (1 + random.random() * 0.1)
+            logger.warning("%s の取得に失敗したため %.1f秒後に再試行します（%d/%d）", url, wait, attempt + 1, self.max_retries)
+            time.sleep(wait)
+
+    def fetch(self, url, ttl=None):
+        """ URLの内容をバイト列で返す。ttl を省略した場合は TTL_RULES から決める """
+        if ttl is None:
+            ttl = ttl_for_url(url, self.ttl_rules, self.default_ttl)
+        with self._url_lock(url):
+            meta, body = self._read_cache(url)
+            if meta is not None and time.time() - meta["fetched_at"] < ttl:
+                self._count("hits")
+                return body
+
+            headers = {}
+            if meta is not None:
+                if meta.get("etag"):
+                    headers["If-None-Match"] = meta["etag"]
+                if meta.get("last_modified"):
+                    headers["If-Modified-Since"] = meta["last_modified"]
+            status, response_headers, new_body = self._request(url, headers)
+
+            if status == 304 and body is not None:
+                self._count("revalidated")
+                meta["fetched_at"] = time.time()
+                self._write_cache(url, meta)
+                return body
+
+            self._count("fetched")
+            self._write_cache(url, {
+                "url": url,
+                "fetched_at": time.time(),
+                "etag": response_headers.get("ETag"),
+                "last_modified": response_headers.get("Last-Modified"),
+            }, new_body)
+            return new_body
+
+    def stats(self):
+        with self._stats_lock:
+            return {"hits": self.hits, "revalidated": self.revalidated, "fetched": self.fetched}
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def get_fetcher():
+    """ プロセス共有の取得クラスを返す """
+    global _fetcher
+    if _fetcher is None:
+        with _fetcher_lock:
+            if _fetcher is None:
+                _fetcher = CachedFetcher()
+    return _fetcher
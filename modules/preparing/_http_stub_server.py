@@ -0,0 +1,89 @@
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubServer:
+    """
+    スクレイピングの確認用に、決まった内容を返すローカルのHTTPサーバー。
+    pages: {パス（クエリを含む）: 応答}。応答は 本文(bytes)・(ステータス, 本文)・(ステータス, 本文, ヘッダーの辞書) のいずれか。
+    応答のリストを渡すとリクエストごとに順に返す（使い切ったら最後の応答を返し続ける）。
+    200 の応答には ETag（etag=False の場合は付けない）と、last_modified を指定した場合は Last-Modified を付け、
+    If-None-Match / If-Modified-Since が一致すれば 304 を返す。
+    パスごとのリクエスト数を requests に、最後のリクエストのヘッダーを last_headers に記録する。
+
+        with StubServer({"/race/shutuba.html?race_id=1": html}) as server:
+            fetcher.fetch(server.url("/race/shutuba.html?race_id=1"))
+    """
+
+    def __init__(self, pages, host="127.0.0.1", port=0, etag=True, last_modified=None):
+        self.pages = pages
+        self.etag = etag
+        self.last_modified = last_modified
+        self.requests = {}
+        self.last_headers = {}
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stub._lock:
+                    count = stub.requests.get(self.path, 0)
+                    stub.requests[self.path] = count + 1
+                    stub.last_headers[self.path] = dict(self.headers)
+                page = stub.pages.get(self.path)
+                if isinstance(page, list):
+                    page = page[min(count, len(page) - 1)]
+                if page is None:
+                    self.send_error(404)
+                    return
+                if not isinstance(page, tuple):
+                    page = (200, page)
+                status, body, headers = page if len(page) == 3 else page + ({},)
+                if status != 200:
+                    self._send(status, body, headers)
+                    return
+                headers = dict(headers)
+                if stub.etag:
+                    headers["ETag"] = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+                if stub.last_modified:
+                    headers["Last-Modified"] = stub.last_modified
+                if ((stub.etag and self.headers.get("If-None-Match") == headers["ETag"]) or
+                        (stub.last_modified and self.headers.get("If-Modified-Since") == stub.last_modified)):
+                    self._send(304, b"", headers)
+                    return
+                self._send(200, body, headers)
+
+            def _send(self, status, body, headers):
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._thread = None
+
+    def url(self, path):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{path}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
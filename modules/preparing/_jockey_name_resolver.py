@@ -0,0 +1,138 @@
+import glob
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from bs4 import BeautifulSoup
+
+from ._http_fetch import get_fetcher
+
+JOCKEY_NAME_CACHE = "cache/jockey_names.json"
+JOCKEY_STATS_FILE = "model/jockey_stats.json"
+RACE_CARD_GLOB = "出馬表データ/*/*.json"
+
+
+def jockey_id_from_url(url):
+    """ 騎手ページのURL（例: https://db.netkeiba.com/jockey/result/recent/05339/）から騎手IDを取り出す """
+    return urlparse(url).path.rstrip("/").rsplit("/", 1)[-1]
+
+
+def fetch_jockey_full_name(url):
+    """ 騎手ページを取得し、タイトル（「○○の近走成績」）からフルネームを取り出す """
+    html = get_fetcher().fetch(url)
+    title = BeautifulSoup(html, "html.parser").title
+    if title is None:
+        raise ValueError(f"タイトルがありません: {url}")
+    return title.get_text().split("の近走成績")[0].strip()
+
+
+def load_seed_names(jockey_stats_file=JOCKEY_STATS_FILE, race_card_glob=RACE_CARD_GLOB):
+    """ 既に持っている騎手名（騎手成績JSONのキーと保存済み出馬表の騎手名）を集める """
+    names = set()
+    if os.path.exists(jockey_stats_file):
+        with open(jockey_stats_file, "r", encoding="utf-8") as f:
+            names.update(json.load(f))
+    for path in glob.glob(race_card_glob):
+        with open(path, "r", encoding="utf-8") as f:
+            names.update(record.get("騎手") for record in json.load(f))
+    names.discard(None)
+    return names
+
+
+class JockeyNameResolver:
+    """
+    出馬表の騎手リンクから騎手のフルネームを求める。騎手ページから取得した名前だけを騎手IDをキーにファイルへ保存し、
+    次回以降は取得しない。未知のIDはまとめて並行に取得し、取得できなかった場合に限り、
+    出馬表の表示名で始まる既知の名前がちょうど1つあればその呼び出しだけで使う（推測なので保存しない）。
+    """
+
+    def __init__(self, cache_path=JOCKEY_NAME_CACHE, seed_names=None, max_workers=8, fetch=fetch_jockey_full_name):
+        self.cache_path = cache_path
+        self.max_workers = max_workers
+        self.fetch = fetch
+        self._seed_names = seed_names
+        self._names = self._load_cache()  # 騎手ID -> フルネーム
+        self._lock = threading.Lock()
+
+    def _load_cache(self):
+        if not os.path.exists(self.cache_path):
+            return {}
+        with open(self.cache_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_cache(self):
+        directory = os.path.dirname(self.cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._names, f, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, self.cache_path)
+
+    def _match_seed(self, display_name):
+        """
+        表示名で始まる既知の名前が実質1つだけならそれを返す。
+        騎手成績JSONのキーは途中で切れている場合があるため、他の候補の先頭部分にすぎない名前は除く。
+        """
+        if not display_name:
+            return None
+        if self._seed_names is None:
+            self._seed_names = load_seed_names()
+        candidates = [name for name in self._seed_names if name.startswith(display_name)]
+        candidates = [name for name in candidates
+                      if not any(other != name and other.startswith(name) for other in candidates)]
+        return candidates[0] if len(candidates) == 1 else None
+
+    def _fetch(self, url):
+        try:
+            return self.fetch(url)
+        except Exception as e:
+            # 取得できない場合は表示名を使う（キャッシュには保存しない）
+            print(f"騎手名の取得に失敗しました: {url} {e}")
+            return None
+
+    def resolve(self, jockeys):
+        """
+        jockeys: [(騎手ページのURL, 出馬表の表示名)]
+        それぞれのフルネームを同じ順のリストで返す。
+        ロックは保存済みの名前を読むときと、取得した名前を追加して保存するときだけ取る（取得中は他の呼び出しを待たせない）。
+        """
+        ids = [jockey_id_from_url(url) for url, _ in jockeys]
+        with self._lock:
+            names = {jockey_id: self._names[jockey_id] for jockey_id in ids if jockey_id in self._names}
+        unknown = {jockey_id: url for jockey_id, (url, _) in zip(ids, jockeys) if jockey_id not in names}
+
+        if unknown:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                fetched = {jockey_id: name for jockey_id, name in zip(unknown, executor.map(self._fetch, unknown.values()))
+                           if name}
+            if fetched:
+                with self._lock:
+                    self._names.update(fetched)
+                    self._save_cache()
+            names.update(fetched)
+
+        results = []
+        for jockey_id, (_, display_name) in zip(ids, jockeys):
+            name = names.get(jockey_id)
+            if name is None:
+                # 取得できなかった騎手は、既知の名前から推測する（無ければ表示名のまま）
+                name = self._match_seed(display_name) or display_name
+            results.append(name)
+        return results
+
+
+_jockey_name_resolver = None
+_jockey_name_resolver_lock = threading.Lock()
+
+
+def get_jockey_name_resolver():
+    """ プロセス共有のリゾルバを返す """
+    global _jockey_name_resolver
+    if _jockey_name_resolver is None:
+        with _jockey_name_resolver_lock:
+            if _jockey_name_resolver is None:
+                _jockey_name_resolver = JockeyNameResolver()
+    return _jockey_name_resolver
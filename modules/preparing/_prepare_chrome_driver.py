@@ -1,8 +1,24 @@
+import threading
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
 
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+def get_chrome_driver_path():
+    """
+    ChromeDriverManager().install() はバージョン確認のため毎回時間がかかるので、
+    プロセス内で一度だけ実行して結果を使い回す。
+    """
+    global _driver_path
+    if _driver_path is None:
+        with _driver_path_lock:
+            if _driver_path is None:
+                _driver_path = ChromeDriverManager().install()
+    return _driver_path
+
 def prepare_chrome_driver():
     """
     Chromeのバージョンアップは頻繁に発生し、Webdriverとのバージョン不一致が多発するため、
@@ -15,7 +31,7 @@ def prepare_chrome_driver():
     # Selenium3の場合
     #driver = webdriver.Chrome(ChromeDriverManager().install(), options=options)
     # Selenium4の場合
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+    driver = webdriver.Chrome(service=Service(get_chrome_driver_path()), options=options)
     # 画面サイズをなるべく小さくし、余計な画像などを読み込まないようにする
     driver.set_window_size(50, 50)
-    return driver
\ No newline at end of file
+    return driver
@@ -1,71 +1,92 @@
-import pandas as pd
-import datetime
-import time
-import random
 import re
 from tqdm.auto import tqdm
 from bs4 import BeautifulSoup
-from urllib.request import Request, urlopen
 from selenium.webdriver.common.by import By
 
 #from modules.constants import UrlPaths
-from ._prepare_chrome_driver import prepare_chrome_driver
+from ._chrome_driver_pool import get_driver_pool
+from ._http_fetch import get_fetcher
 
-# 仕様変更対策
-USER_AGENTS = [
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36",
-    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36",
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:115.0) Gecko/20100101 Firefox/115.0",
-    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:115.0) Gecko/20100101 Firefox/115.0",
-    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.1.2 Safari/605.1.15",
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36 Edg/115.0.0.0",
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36 OPR/85.0.4341.72",
-    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36 OPR/85.0.4341.72",
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36 Vivaldi/5.3.2679.55",
-    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36 Vivaldi/5.3.2679.55",
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36 Brave/1.40.107",
-    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36 Brave/1.40.107",
-]
+
+RACE_LIST_URL = 'https://race.netkeiba.com/top/race_list.html'
+# race_list.html がJavaScriptで読み込んでいるレース一覧の部分（HTMLにレース一覧がそのまま含まれる）
+RACE_LIST_SUB_URL = 'https://race.netkeiba.com/top/race_list_sub.html'
+_RACE_ID_PATTERN = re.compile(r'(?<=shutuba.html\?race_id=)\d+|(?<=result.html\?race_id=)\d+')
+
+
+def parse_race_id_list_html(html):
+    """ レース一覧のHTMLからレースidを取り出す """
+    race_id_list = []
+    for a in BeautifulSoup(html, 'html.parser').find_all('a', href=True):
+        race_id = _RACE_ID_PATTERN.findall(a['href'])
+        if len(race_id) > 0:
+            race_id_list.append(race_id[0])
+    return race_id_list
+
+
+def _fetch_race_id_list(kaisai_date):
+    """ race_list_sub.html を（キャッシュを通して）取得してレースidを返す。取得できなければ空のリスト """
+    url = RACE_LIST_SUB_URL + '?kaisai_date=' + str(kaisai_date)
+    try:
+        return parse_race_id_list_html(get_fetcher().fetch(url))
+    except Exception as e:
+        print(f'error:{e} url:{url}')
+        return []
 
 
 def scrape_race_id_list(kaisai_date_list: list, waiting_time=10):
     """
     開催日をyyyymmddの文字列形式でリストで入れると、レースid一覧が返ってくる関数。
+    まずレース一覧のHTMLを直接取得し、取得できなかった日だけChromeで race_list.html を開く。
     ChromeDriverは要素を取得し終わらないうちに先に進んでしまうことがあるので、
     要素が見つかるまで(ロードされるまで)の待機時間をwaiting_timeで指定。
     """
     race_id_list = []
-    driver = prepare_chrome_driver()
-    # 取得し終わらないうちに先に進んでしまうのを防ぐため、暗黙的な待機（デフォルト10秒）
-    driver.implicitly_wait(waiting_time)
-    max_attempt = 2
+    remaining_dates = []
     print('getting race_id_list')
     for kaisai_date in tqdm(kaisai_date_list):
-        try:
-            query = [
-                'kaisai_date=' + str(kaisai_date)
-            ]
-            url = 'https://race.netkeiba.com/top/race_list.html' + '?' + '&'.join(query)
-            print('scraping: {}'.format(url))
-            driver.get(url)
+        race_ids = _fetch_race_id_list(kaisai_date)
+        if race_ids:
+            race_id_list.extend(race_ids)
+        else:
+            remaining_dates.append(kaisai_date)
+
+    if remaining_dates:
+        race_id_list.extend(_scrape_race_id_list_with_driver(remaining_dates, waiting_time))
+    return race_id_list
+
+
+def _scrape_race_id_list_with_driver(kaisai_date_list, waiting_time):
+    """ Chromeで race_list.html を開いてレースidを取得する """
+    race_id_list = []
+    # 起動済みのChromeをプールから借りる
+    with get_driver_pool().borrow() as driver:
+        # 取得し終わらないうちに先に進んでしまうのを防ぐため、暗黙的な待機（デフォルト10秒）
+        driver.implicitly_wait(waiting_time)
+        max_attempt = 2
+        for kaisai_date in tqdm(kaisai_date_list):
+            try:
+                query = [
+                    'kaisai_date=' + str(kaisai_date)
+                ]
+                url = RACE_LIST_URL + '?' + '&'.join(query)
+                print('scraping: {}'.format(url))
+                driver.get(url)
 
-            for i in range(1, max_attempt):
-                try:
-                    a_list = driver.find_element(By.CLASS_NAME, 'RaceList_Box').find_elements(By.TAG_NAME, 'a')
-                    break
-                except Exception as e:
-                    # 取得できない場合は、リトライを実施
-                    print(f'error:{e} retry:{i}/{max_attempt} waiting more {waiting_time} seconds')
+                for i in range(1, max_attempt):
+                    try:
+                        a_list = driver.find_element(By.CLASS_NAME, 'RaceList_Box').find_elements(By.TAG_NAME, 'a')
+                        break
+                    except Exception as e:
+                        # 取得できない場合は、リトライを実施
+                        print(f'error:{e} retry:{i}/{max_attempt} waiting more {waiting_time} seconds')
 
-            for a in a_list:
-                race_id = re.findall('(?<=shutuba.html\?race_id=)\d+|(?<=result.html\?race_id=)\d+',
-                    a.get_attribute('href'))
-                if len(race_id) > 0:
-                    race_id_list.append(race_id[0])
-        except Exception as e:
-            print(e)
-            break
+                for a in a_list:
+                    race_id = _RACE_ID_PATTERN.findall(a.get_attribute('href'))
+                    if len(race_id) > 0:
+                        race_id_list.append(race_id[0])
+            except Exception as e:
+                print(e)
+                break
 
-    driver.close()
-    driver.quit()
-    return race_id_list
\ No newline at end of file
+    return race_id_list
@@ -1,60 +1,212 @@
 import re
+from urllib.parse import urljoin
 import pandas as pd
+from bs4 import BeautifulSoup
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from ._prepare_chrome_driver import prepare_chrome_driver
-
-# 仕様変更対策
-USER_AGENTS = [
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36",
-    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36",
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:115.0) Gecko/20100101 Firefox/115.0",
-    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:115.0) Gecko/20100101 Firefox/115.0",
-    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.1.2 Safari/605.1.15",
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36 Edg/115.0.0.0",
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36 OPR/85.0.4341.72",
-    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36 OPR/85.0.4341.72",
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36 Vivaldi/5.3.2679.55",
-    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36 Vivaldi/5.3.2679.55",
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36 Brave/1.40.107",
-    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36 Brave/1.40.107",
-]
-
-def scrape_shutuba_table(race_id: str, input_ground: str, input_date: str):
+from ._chrome_driver_pool import get_driver_pool
+from ._jockey_name_resolver import get_jockey_name_resolver
+
+SHUTUBA_URL = 'https://race.netkeiba.com/race/shutuba.html'
+
+HORSE_COLUMNS = ['馬','馬番', '性', '齢', '斤量', '体重', '体重変化', '騎手', 'オッズ', '人気']
+RACE_INFO_COLUMNS = ["race_id","芝・ダート", "距離", "回り", "天気", "馬場", "クラス","場名","レース名","日付"]
+
+
+def scrape_shutuba_table(race_id: str, input_ground: str, input_date: str, mode: str = "html"):
     """
     当日の出馬表をスクレイピング。
     dateはyyyy/mm/ddの形式。
+    mode="html" はページのHTMLを1回だけ取得して BeautifulSoup で解析する（セルごとの WebDriver 呼び出しが無い）。
+    mode="webdriver" は従来どおり要素ごとに WebDriver から取得する。
     """
-    driver = prepare_chrome_driver()
-    # 取得し終わらないうちに先に進んでしまうのを防ぐため、暗黙的な待機（デフォルト10秒）
-    driver.implicitly_wait(10)
-    query = '?race_id=' + race_id
-    url = 'https://race.netkeiba.com/race/shutuba.html' + query
-    df = pd.DataFrame()
-    
-    
-    driver.get(url)
-    # 現在のウィンドウハンドル（元のタブ）を保存
-    original_handle = driver.current_window_handle
+    url = SHUTUBA_URL + '?race_id=' + race_id
+    if mode not in ("html", "webdriver"):
+        raise ValueError(f"mode は 'html' または 'webdriver' を指定してください: {mode}")
 
-    rows = []  # 全体の行データを格納するリスト
+    # 騎手のフルネームは騎手IDごとに保存したものを使い、未知の騎手だけまとめて取得する
+    jockey_names = get_jockey_name_resolver().resolve
+
+    # 起動済みのChromeをプールから借りる
+    with get_driver_pool().borrow() as driver:
+        # 取得し終わらないうちに先に進んでしまうのを防ぐため、暗黙的な待機（デフォルト10秒）
+        driver.implicitly_wait(10)
+        driver.get(url)
+
+        if mode == "html":
+            # 出馬表の表が描画されるまで待ってから、HTMLを一度だけ取得する
+            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CLASS_NAME, 'HorseList')))
+            html = driver.page_source
+        else:
+            df = _scrape_with_webdriver(driver, race_id, input_ground, input_date, jockey_names)
+
+    if mode == "html":
+        # HTMLの解析と騎手名の取得はChromeを返してから行う
+        df = parse_shutuba_html(html, race_id, input_ground, input_date, jockey_names=jockey_names, base_url=url)
+    print(df)
+
+    return df
+
+
+def parse_shutuba_html(html, race_id: str, input_ground: str, input_date: str, jockey_names=None, base_url=SHUTUBA_URL):
+    """
+    出馬表ページのHTMLから scrape_shutuba_table と同じ列のDataFrameを作る（保存したHTMLにも使える）。
+    jockey_names: [(騎手ページのURL, 表示名)] を受け取ってフルネームのリストを返す関数。
+                  省略時は出馬表に表示された騎手名を使う。
+    """
+    soup = BeautifulSoup(html, 'html.parser')
 
     # メインのテーブルの取得
+    rows, jockey_links = [], []
+    for tr in soup.find_all(class_='HorseList'):
+        row, jockey_link = _parse_horse_row(tr, base_url)
+        rows.append(row)
+        jockey_links.append(jockey_link)
+    _resolve_jockey_names(rows, jockey_links, jockey_names)
+
+    # レース情報の取得
+    race_data01 = soup.find(class_='RaceData01')
+    race_data02 = soup.find(class_='RaceData02')
+    # レース名を取得
+    racelist_item = soup.find(class_='RaceList_Item02')
+    if racelist_item:
+        race_name = _text(racelist_item.find(class_='RaceName'))
+    else:
+        race_name = None
+        print("RaceList_Item02 が見つかりません")
+
+    return _build_shutuba_frame(rows, race_id, input_ground, input_date, _text(race_data01),
+                                [_text(span) for span in race_data02.find_all('span')], race_name)
+
+
+def _text(tag):
+    """ WebDriverの .text と同様に、要素内の文字列を空白を詰めて返す """
+    return " ".join(tag.get_text().split()) if tag is not None else ''
+
+
+def _resolve_jockey_names(rows, jockey_links, jockey_names):
+    """ 各行の騎手名（表示名）を jockey_names で求めたフルネームに置き換える """
+    targets = [i for i, link in enumerate(jockey_links) if link is not None]
+    if jockey_names is None or not targets:
+        return
+    names = jockey_names([(jockey_links[i], rows[i][7]) for i in targets])
+    for i, name in zip(targets, names):
+        rows[i][7] = name  # 騎手名
+
+
+def _parse_horse_row(tr, base_url):
+    """ HorseList の1行から馬の情報（並びは HORSE_COLUMNS）と騎手ページのURLを取り出す """
+    row = [None] * 10  # 10列分の空のリストを事前に作成
+    jockey_link = None
+
+    for td in tr.find_all('td'):
+        td_class = " ".join(td.get('class', []))
+        text = _text(td)
+        # HorseInfoクラスのセルから馬の名前を取得
+        if td_class == 'HorseInfo':
+            row[0] = _text(td.find(class_='HorseName').find('a'))  # 馬の名前
+
+        # 馬番の情報がある<td>を取得
+        elif re.search(r'Umaban\d+ Txt_C', td_class):
+            row[1] = text  # 馬番
+
+        # 性別・年齢の情報がある<td>を取得
+        elif td_class == 'Barei Txt_C':
+            row[2], row[3] = text[0], int(text[1:])  # 性別と年齢を分割
+
+        # 斤量の情報がある<td>を取得
+        elif td_class == 'Txt_C' and text.replace('.', '').isdigit():
+            row[4] = float(text)  # 斤量
+
+        # 体重と体重変化の情報がある<td>を取得
+        elif td_class == 'Weight':
+            weight_change_text = _text(td.find('small')).strip('()')
+            row[5] = int(text.split('(')[0].strip())  # 体重
+            row[6] = 0 if weight_change_text == '前計不' else int(weight_change_text)  # 体重変化
+
+        # オッズの情報がある<td>を取得
+        elif td_class == 'Txt_R Popular':
+            row[8] = _text(td.find('span'))  # オッズ
+
+        # 人気の情報がある<td>を取得
+        elif td_class == 'Popular Popular_Ninki Txt_C':
+            row[9] = _text(td.find('span'))  # 人気
+
+        # 騎手名の情報がある<td>を取得
+        elif td_class == 'Jockey':
+            link = td.find('a')
+            jockey_link = urljoin(base_url, link['href'])
+            row[7] = _text(link)  # 騎手名（表示名）
+
+    return row, jockey_link
+
+
+def _parse_race_info(texts, class_spans):
+    """ RaceData01 の文字列と RaceData02 の<span>の文字列から (芝・ダート, 距離, 回り, 天気, 馬場, クラス) を取り出す """
+    # 正規表現を使って必要な情報を抽出
+    track_type = re.search(r'(芝|ダート)', texts)
+    track_type = track_type.group(0) if track_type else None
+
+    distance = re.search(r'(\d+)(m)', texts)
+    distance = distance.group(1) if distance else None
+
+    direction = re.search(r'(右|左|外)', texts)
+    direction = direction.group(0) if direction else None
+
+    weather = re.search(r'天候:(\w+)', texts)
+    weather = weather.group(1) if weather else None
+
+    ground_condition = re.search(r'馬場:(\w+)', texts)
+    ground_condition = ground_condition.group(1) if ground_condition else None
+
+    # 「サラ系」が含まれていればそれを取り除く
+    race_class = class_spans[3]  # サラ系３歳がある部分
+    if 'サラ系' in race_class:
+        race_class = race_class.replace('サラ系', '').strip()  # サラ系を取り除く
+
+    # 「オープン」の部分を取得
+    race_class += class_spans[4]  # オープンを追加
+
+    return track_type, distance, direction, weather, ground_condition, race_class
+
+
+def _build_shutuba_frame(rows, race_id, input_ground, input_date, race_data01_text, race_data02_spans, race_name):
+    """ 馬ごとの行とレース情報を結合して出馬表のDataFrameにする """
+    # ループ終了後、一度だけDataFrameに変換
+    df_rows = pd.DataFrame(rows, columns=HORSE_COLUMNS)
+
+    track_type, distance, direction, weather, ground_condition, race_class = _parse_race_info(
+        race_data01_text, race_data02_spans)
+
+    # 日付の形式を変換
+    input_date = input_date[:4] + "-" + input_date[4:6] + "-" + input_date[6:8]
+
+    # レース情報をリストにまとめる
+    race_info = [race_id, track_type, distance, direction, weather, ground_condition,race_class, input_ground, race_name, input_date]
+
+    # 出走馬の数（dfの行数）に合わせて繰り返す
+    race_info_repeated = [race_info] * len(df_rows)
+
+    # 繰り返した情報をdfに新しい列として追加
+    race_info_df = pd.DataFrame(race_info_repeated, columns=RACE_INFO_COLUMNS)
+    df = pd.concat([df_rows, race_info_df], axis=1)
+
+    df = df.dropna(subset=['馬'])
+    df = df.reset_index(drop=True)  # インデックスをリセット
+    return df
+
+
+def _scrape_with_webdriver(driver, race_id, input_ground, input_date, jockey_names):
+    """ 要素ごとに WebDriver から取得する従来の方法 """
+    rows = []  # 全体の行データを格納するリスト
+    jockey_links = []
+
     # メインのテーブルの取得
     for tr in driver.find_elements(By.CLASS_NAME, 'HorseList'):
 
         row = [None] * 10  # 10列分の空のリストを事前に作成
-        horse_name = None
-        umaban = None
-        sex = None
-        age = None
-        weight = None
-        horse_weight = None
-        horse_weight_change = None
-        jockey_full_name = None
-        odds = None
-        popularity = None
+        jockey_link = None
 
         for td in tr.find_elements(By.TAG_NAME, 'td'):
             # HorseInfoクラスのセルから馬の名前を取得
@@ -66,140 +218,65 @@ def scrape_shutuba_table(race_id: str, input_ground: str, input_date: str):
             elif re.search(r'Umaban\d+ Txt_C', td.get_attribute('class')):  # 直接クラス名を取得して比較
                 umaban = td.text  # 馬番を取得
                 row[1] = umaban  # 馬番
-                        
+
             # 性別・年齢の情報がある<td>を取得
             elif td.get_attribute('class') == 'Barei Txt_C':
                 sex_age = td.text  # 例えば「牡3」
                 sex, age = sex_age[0], int(sex_age[1:])  # 性別と年齢を分割
                 row[2] = sex  # 性別
                 row[3] = age  # 年齢
-        
+
             # 斤量の情報がある<td>を取得
             elif td.get_attribute('class') == 'Txt_C' and td.text.replace('.', '').isdigit():
                 weight = float(td.text)  # 斤量を数値化
                 row[4] = weight  # 斤量
-        
+
             # 体重と体重変化の情報がある<td>を取得
             elif td.get_attribute('class') == 'Weight':
                 weight_text = td.text.split('(')[0].strip()  # 体重（数字部分）を取得
                 weight_change_text = td.find_element(By.TAG_NAME, 'small').text.strip('()')  # 体重変化を取得
-            
+
                 horse_weight = int(weight_text)  # 体重（数字部分）
                 if weight_change_text == '前計不':
                     horse_weight_change = 0  # 0 にする場合
                 else:
                     horse_weight_change = int(weight_change_text)
-            
-            
+
                 row[5] = horse_weight  # 体重
                 row[6] = horse_weight_change  # 体重変化
             # オッズの情報がある<td>を取得
             elif td.get_attribute('class') == 'Txt_R Popular':
                 odds = td.find_element(By.TAG_NAME, 'span').text  # オッズを取得
                 row[8] = odds  # オッズ
-            
+
             # 人気の情報がある<td>を取得
             elif td.get_attribute('class') == 'Popular Popular_Ninki Txt_C':
-                
+
                 popularity = td.find_element(By.TAG_NAME, 'span').text  # 人気を取得
                 row[9] = popularity  # 人気
-            
+
             # 騎手名の情報がある<td>を取得
             elif td.get_attribute('class') == 'Jockey':
                 # 騎手のリンクを取得
-                jockey_link = td.find_element(By.TAG_NAME, 'a').get_attribute('href')
-            
-                # 新しいタブを開く
-                driver.execute_script(f'window.open("{jockey_link}");')
-
-                # 新しいタブに切り替え
-                new_handle = [handle for handle in driver.window_handles if handle != original_handle][0]
-                driver.switch_to.window(new_handle)
-
-                # ページがロードされるまで待機
-                WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.TAG_NAME, 'title')))
-
-                # フルネームを取得
-                title = driver.title
-                jockey_full_name = title.split("の近走成績")[0]  # 名前を抽出
-
-                # フルネームを行に追加
-                row[7] = jockey_full_name  # 騎手名
-
-                # 新しいタブを閉じる
-                driver.close()
-
-                # 元のタブに戻る
-                driver.switch_to.window(original_handle)
-                WebDriverWait(driver, 10).until(
-                lambda driver: driver.execute_script('return document.readyState') == 'complete'
-                )
-            
+                jockey = td.find_element(By.TAG_NAME, 'a')
+                jockey_link = jockey.get_attribute('href')
+                row[7] = jockey.text  # 騎手名（表示名）
 
         # 各行のデータが完成したら、リストに追加
         rows.append(row)
-        
-    # ループ終了後、一度だけDataFrameに変換
-    df_rows = pd.DataFrame(rows, columns=['馬','馬番', '性', '齢', '斤量', '体重', '体重変化', '騎手', 'オッズ', '人気'])
-    
+        jockey_links.append(jockey_link)
+
+    _resolve_jockey_names(rows, jockey_links, jockey_names)
 
     # レース情報の取得
     texts = driver.find_element(By.CLASS_NAME, 'RaceData01').text
 
-    # 正規表現を使って必要な情報を抽出
-    track_type = re.search(r'(芝|ダート)', texts)
-    track_type = track_type.group(0) if track_type else None
-
-    distance = re.search(r'(\d+)(m)', texts)
-    distance = distance.group(1) if distance else None
-
-    direction = re.search(r'(右|左|外)', texts)
-    direction = direction.group(0) if direction else None
-
-    weather = re.search(r'天候:(\w+)', texts)
-    weather = weather.group(1) if weather else None
-
-    ground_condition = re.search(r'馬場:(\w+)', texts)
-    ground_condition = ground_condition.group(1) if ground_condition else None
-
-    # RaceData02クラス内の情報を取得
+    # RaceData02クラス内の<span>タグの内容をすべて取得
     class_info = driver.find_element(By.CLASS_NAME, 'RaceData02')
-
-    # <span>タグの内容をすべて取得
-    span_elements = class_info.find_elements(By.TAG_NAME, 'span')
-
-    # 「サラ系」が含まれていればそれを取り除く
-    race_class = span_elements[3].text  # サラ系３歳がある部分
-    if 'サラ系' in race_class:
-        race_class = race_class.replace('サラ系', '').strip()  # サラ系を取り除く
-
-    # 「オープン」の部分を取得
-    race_class += span_elements[4].text  # オープンを追加
+    span_texts = [span.text for span in class_info.find_elements(By.TAG_NAME, 'span')]
 
     # レース名を取得
     racelist_item = driver.find_element(By.CLASS_NAME, 'RaceList_Item02')
-    if racelist_item:
-        race_name = racelist_item.find_element(By.CLASS_NAME, 'RaceName').text.strip()
-        
-    else:
-        print("RaceList_Item02 が見つかりません")
-
-    # 日付の形式を変換
-    input_date = input_date[:4] + "-" + input_date[4:6] + "-" + input_date[6:8]
-
-    # レース情報をリストにまとめる
-    race_info = [race_id, track_type, distance, direction, weather, ground_condition,race_class, input_ground, race_name, input_date]
-    
-    # 出走馬の数（dfの行数）に合わせて繰り返す
-    race_info_repeated = [race_info] * len(df_rows)
-
-    # 繰り返した情報をdfに新しい列として追加
-    race_info_df = pd.DataFrame(race_info_repeated, columns=["race_id","芝・ダート", "距離", "回り", "天気", "馬場", "クラス","場名","レース名","日付"])
-    df = pd.concat([df_rows, race_info_df], axis=1)
-    
-    df = df.dropna(subset=['馬'])
-    df = df.reset_index(drop=True)  # インデックスをリセット
-    print(df)
-   
-    return df
+    race_name = racelist_item.find_element(By.CLASS_NAME, 'RaceName').text.strip()
 
+    return _build_shutuba_frame(rows, race_id, input_ground, input_date, texts, span_texts, race_name)
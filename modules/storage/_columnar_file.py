@@ -0,0 +1,169 @@
+import json
+import os
+import struct
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# ファイル構成（Parquetと同様にメタデータを末尾に置くため、行グループを順に追記できる）
+#   MAGIC | 列データ（8バイト境界に揃える）... | メタデータ(JSON) | メタデータ長(u64) | MAGIC
+MAGIC = b"KCOL0001"
+_ALIGNMENT = 8
+
+# 文字列列は辞書（ファイル単位）へのコードとして保存する。欠損値は -1
+# コードは行グループごとに収まる最小の整数型で保存する
+STRING = "string"
+_STRING_CODE_DTYPES = ["<i1", "<i2", "<i4"]
+
+
+@lru_cache(maxsize=1024)
+def _categorical_dtype(categories):
+    # 馬場・天気などはどのファイルでも同じ値の組になるので、dtype はファイルをまたいで共有する
+    return pd.CategoricalDtype(list(categories))
+
+
+class ColumnarWriter:
+    """
+    DataFrameを列ごとの連続したバイナリとして1ファイルに書き出す。
+    write() 1回分が1つの行グループになり、読み込み時は行グループ単位でコピーせずに取り出せる。
+    書き込みは一時ファイルに行い、close() で置き換える。
+
+    schema: [(列名, numpyのdtype文字列 または "string")]
+    """
+
+    def __init__(self, path, schema):
+        self.path = path
+        self.schema = [(name, kind if kind == STRING else np.dtype(kind).str) for name, kind in schema]
+        self._tmp_path = path + ".tmp"
+        self._file = open(self._tmp_path, "wb")
+        self._file.write(MAGIC)
+        self._dictionaries = {name: {} for name, kind in self.schema if kind == STRING}
+        self._row_groups = []
+
+    def _write_array(self, array):
+        pad = -self._file.tell() % _ALIGNMENT
+        if pad:
+            self._file.write(b"\0" * pad)
+        offset = self._file.tell()
+        self._file.write(np.ascontiguousarray(array).tobytes())
+        return offset
+
+    def _encode_strings(self, name, values):
+        dictionary = self._dictionaries[name]
+        codes = np.empty(len(values), dtype="<i4")
+        for i, value in enumerate(values):
+            if value is None or (isinstance(value, float) and np.isnan(value)):
+                codes[i] = -1
+            else:
+                codes[i] = dictionary.setdefault(str(value), len(dictionary))
+        max_code = codes.max(initial=0)
+        for dtype in _STRING_CODE_DTYPES:
+            if max_code <= np.iinfo(dtype).max:
+                return codes.astype(dtype)
+
+    def write(self, df, metadata=None):
+        """ dfを1つの行グループとして追記する。metadataは行グループごとの任意の情報（JSONにできるもの） """
+        arrays = []
+        for name, kind in self.schema:
+            if kind == STRING:
+                arrays.append(self._encode_strings(name, df[name].tolist()))
+            else:
+                array = df[name].to_numpy()
+                if np.dtype(kind).kind in "iu" and pd.isna(array).any():
+                    raise ValueError(f"整数列 {name} に欠損値があります")
+                arrays.append(array.astype(kind))
+        offsets = [self._write_array(array) for array in arrays]
+        self._row_groups.append({"num_rows": len(df), "offsets": offsets,
+                                 "dtypes": [array.dtype.str for array in arrays], "metadata": metadata or {}})
+
+    def close(self, metadata=None):
+        meta = {
+            "columns": [{"name": name, "kind": kind} for name, kind in self.schema],
+            "dictionaries": {name: list(dictionary) for name, dictionary in self._dictionaries.items()},
+            "row_groups": self._row_groups,
+            "metadata": metadata or {},
+        }
+        footer = json.dumps(meta, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self._file.write(footer)
+        self._file.write(struct.pack("<Q", len(footer)))
+        self._file.write(MAGIC)
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        self._file.close()
+        os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class ColumnarReader:
+    """
+    ColumnarWriter で書き出したファイルをメモリマップで開く。
+    数値列は読み込まずにファイル上の配列をそのまま参照する（読み取り専用）。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._data = np.memmap(path, dtype=np.uint8, mode="r")
+        if bytes(self._data[:len(MAGIC)]) != MAGIC or bytes(self._data[-len(MAGIC):]) != MAGIC:
+            raise ValueError(f"列指向ファイルの形式ではありません: {path}")
+        footer_end = len(self._data) - len(MAGIC) - 8
+        (footer_len,) = struct.unpack("<Q", bytes(self._data[footer_end:footer_end + 8]))
+        meta = json.loads(bytes(self._data[footer_end - footer_len:footer_end]).decode("utf-8"))
+        self.columns = [(column["name"], column["kind"]) for column in meta["columns"]]
+        self.row_groups = meta["row_groups"]
+        self.metadata = meta["metadata"]
+        # コード -1（欠損値）が末尾の None を指すように辞書の最後に None を置く
+        self._dictionaries = {name: np.array(values + [None], dtype=object)
+                              for name, values in meta["dictionaries"].items()}
+        self._categorical_dtypes = {}
+
+    def _categorical_dtype(self, name):
+        # 辞書を昇順に並べたカテゴリと、ファイル上のコードを並べ替え後のコードに直す表（-1 は -1 のまま）
+        cached = self._categorical_dtypes.get(name)
+        if cached is None:
+            values = self._dictionaries[name][:-1]
+            order = sorted(range(len(values)), key=values.__getitem__)
+            remap = np.full(len(values) + 1, -1, dtype=np.int32)
+            remap[order] = np.arange(len(values), dtype=np.int32)
+            cached = (_categorical_dtype(tuple(values[order])), remap)
+            self._categorical_dtypes[name] = cached
+        return cached
+
+    def _column(self, row_group, position, categorical=False):
+        name, kind = self.columns[position]
+        array = np.frombuffer(self._data, dtype=row_group["dtypes"][position], count=row_group["num_rows"],
+                              offset=row_group["offsets"][position])
+        if kind == STRING and categorical:
+            dtype, remap = self._categorical_dtype(name)
+            return pd.Categorical.from_codes(remap[array], dtype=dtype, validate=False)
+        if kind == STRING:
+            return self._dictionaries[name][array]
+        return array
+
+    def read_row_group(self, i, columns=None, categorical=()):
+        """
+        i番目の行グループをDataFrameとして返す。
+        categorical に指定した文字列列は、ファイルの辞書をカテゴリにした category 型で返す（値ごとの文字列を作らない）。
+        """
+        row_group = self.row_groups[i]
+        data = {name: self._column(row_group, position, name in categorical)
+                for position, (name, _) in enumerate(self.columns) if columns is None or name in columns}
+        # copy=False で列ごとの配列をそのまま使う（同じdtypeの列をまとめ直さない）
+        return pd.DataFrame(data, copy=False)
+
+    def read(self, columns=None):
+        """ 全行グループを連結したDataFrameを返す """
+        frames = [self.read_row_group(i, columns) for i in range(len(self.row_groups))]
+        if not frames:
+            return pd.DataFrame(columns=[name for name, _ in self.columns if columns is None or name in columns])
+        return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,135 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_datetime64_any_dtype, is_numeric_dtype
+
+# 出馬表（学習時はレース結果）の各列をどの型として読むか
+TEXT = "text"          # 文字列のまま（馬名・騎手名など。ラベルエンコーディングするもの）
+CATEGORY = "category"  # pandas の category 型（ワンホットエンコーディングするもの）
+NUMBER = "number"      # 数値（数字以外の文字は取り除く）
+INTEGER = "integer"    # 整数（欠損値がある場合は数値のまま）
+DATE = "date"          # "%Y-%m-%d" の日付
+TIME = "time"          # "m:ss.s" の走破時間を秒に
+
+RACE_CARD_FIELDS = {
+    "馬": TEXT,
+    "騎手": TEXT,
+    "馬番": INTEGER,
+    "オッズ": NUMBER,
+    "体重": NUMBER,
+    "体重変化": NUMBER,
+    "齢": NUMBER,
+    "斤量": NUMBER,
+    "人気": NUMBER,
+    "距離": NUMBER,
+    "性": CATEGORY,
+    "日付": DATE,
+    "クラス": CATEGORY,
+    "芝・ダート": CATEGORY,
+    "回り": CATEGORY,
+    "馬場": CATEGORY,
+    "天気": CATEGORY,
+    "場名": CATEGORY,
+    "race_id": TEXT,
+    "レース名": TEXT,
+    # レース結果にだけある列
+    "走破時間": TIME,
+    "上がり": NUMBER,
+}
+
+_NON_NUMERIC = r'[^\d.-]'
+# "m:ss.s" の形式、または "HHMM"（4桁の数字）
+_TIME_PATTERN = r'^(?:(\d\d)(\d\d)|([^:]*):([^:]*))\Z'
+
+
+def parse_numbers(values):
+    """
+    文字列の列を数値に変換する（変換できない値は NaN）。既に数値型の列はそのまま返す。
+    まず列全体をそのまま変換し、変換できなかった値（"+4kg" など）だけ数字以外を取り除いて変換し直す。
+    """
+    if is_numeric_dtype(values):
+        return values
+    numbers = pd.to_numeric(values, errors="coerce")
+    retry = values.notna() & (numbers.isna() | np.isinf(numbers))
+    if retry.any():
+        numbers = numbers.astype(float)
+        cleaned = values[retry].astype(str).str.replace(_NON_NUMERIC, "", regex=True)
+        numbers[retry] = pd.to_numeric(cleaned, errors="coerce")
+    return numbers
+
+
+def parse_times(values):
+    """
+    走破時間（"1:35.2" など）を秒に変換する。"HHMM" 形式（4桁の数字）は 時 * 60 + 分。
+    変換できない値や文字列以外は NaN。既に数値型の列（変換済み）はそのまま返す。
+    """
+    if is_numeric_dtype(values):
+        return values
+    parts = values.astype(object).str.extract(_TIME_PATTERN)
+    hours_minutes = pd.to_numeric(parts[0], errors="coerce") * 60 + pd.to_numeric(parts[1], errors="coerce")
+    minutes_seconds = pd.to_numeric(parts[2], errors="coerce") * 60 + pd.to_numeric(parts[3], errors="coerce")
+    return hours_minutes.where(parts[0].notna(), minutes_seconds).astype(float)
+
+
+@lru_cache(maxsize=4096)
+def _parse_date(text):
+    return pd.to_datetime(text, format="%Y-%m-%d", errors="coerce").to_datetime64()
+
+
+def parse_dates(values):
+    """
+    "%Y-%m-%d" の日付に変換する（変換できない値は NaT）。既に日付型の列はそのまま返す。
+    1レースの日付は1種類なので、異なる値だけを変換して（結果は覚えておく）各行に割り当てる。
+    """
+    if is_datetime64_any_dtype(values):
+        return values
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+    else:
+        codes, uniques = pd.factorize(values)
+    dates = np.array([_parse_date(str(text)) for text in uniques] + [np.datetime64("NaT")], dtype="datetime64[ns]")
+    return pd.Series(dates[codes], index=values.index, name=values.name)
+
+
+def parse_categories(values):
+    """ category 型に変換する（astype("category") と同じく、カテゴリは値の昇順） """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values
+    codes, uniques = pd.factorize(values, sort=True)
+    categorical = pd.Categorical.from_codes(codes, categories=uniques, validate=False)
+    return pd.Series(categorical, index=values.index, name=values.name)
+
+
+def parse_integers(values):
+    """ 整数に変換する。欠損値・小数がある場合は数値（float）のまま返す """
+    numbers = parse_numbers(values)
+    if numbers.dtype.kind == "f" and numbers.notna().all() and (numbers % 1 == 0).all():
+        numbers = numbers.astype("int64")
+    return numbers
+
+
+_PARSERS = {
+    NUMBER: parse_numbers,
+    INTEGER: parse_integers,
+    CATEGORY: parse_categories,
+    DATE: parse_dates,
+    TIME: parse_times,
+}
+
+
+def parse_race_cards(df, fields=RACE_CARD_FIELDS):
+    """
+    出馬表（またはレース結果）のDataFrameの各列を fields の型に一括で変換した新しいDataFrameを返す。
+    fields に無い列・TEXT の列はそのまま。既に変換済みの列は変換しないので、何度呼んでもよい。
+    """
+    df = df.copy(deep=False)
+    for name, kind in fields.items():
+        parser = _PARSERS.get(kind)
+        if parser is None or name not in df.columns:
+            continue
+        values = df[name]
+        parsed = parser(values)
+        if parsed is not values:
+            df[name] = parsed
+    return df
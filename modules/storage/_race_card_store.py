@@ -0,0 +1,158 @@
+import json
+import os
+import threading
+from collections import defaultdict
+
+import pandas as pd
+
+from modules.storage._columnar_file import ColumnarReader, ColumnarWriter, STRING
+from modules.storage._race_card_schema import CATEGORY, DATE, RACE_CARD_FIELDS, parse_numbers, parse_race_cards
+from modules.storage._race_file_index import RaceFileIndex, RACE_CARD_DIR
+
+RACE_CARD_STORE_DIR = "出馬表ストア"
+STORE_EXTENSION = ".kcol"
+
+# 出馬表JSONの列（並び順もJSONと同じにする）と保存形式
+RACE_CARD_SCHEMA = [
+    ("馬", STRING),
+    ("騎手", STRING),
+    ("馬番", "int16"),
+    ("オッズ", "float64"),
+    ("体重", "float64"),
+    ("体重変化", "float64"),
+    ("齢", "float64"),
+    ("斤量", "float64"),
+    ("人気", "float64"),
+    ("距離", "int16"),
+    ("性", STRING),
+    ("日付", STRING),
+    ("クラス", STRING),
+    ("芝・ダート", STRING),
+    ("回り", STRING),
+    ("馬場", STRING),
+    ("天気", STRING),
+    ("場名", STRING),
+    ("race_id", STRING),
+    ("レース名", STRING),
+]
+
+# category 型で読み出す列（日付も1ファイル内の値の種類が少ないので category 型で読み、変換は種類ごとに行う）
+_CATEGORICAL_COLUMNS = frozenset(name for name, kind in RACE_CARD_FIELDS.items() if kind in (CATEGORY, DATE))
+
+
+def _to_typed_frame(records):
+    """ 出馬表JSONのレコードを保存形式の型に変換する（数値は前処理と同じく数字以外を取り除いて変換） """
+    df = pd.DataFrame(records)
+    if list(df.columns) != [name for name, _ in RACE_CARD_SCHEMA]:
+        raise ValueError(f"列が想定と異なります: {list(df.columns)}")
+    for name, kind in RACE_CARD_SCHEMA:
+        if kind != STRING:
+            df[name] = parse_numbers(df[name])
+    return df
+
+
+def _partition_name(race_file):
+    return f"{race_file.date}{race_file.ground}"
+
+
+def convert_race_cards(src_root=RACE_CARD_DIR, dst_root=RACE_CARD_STORE_DIR):
+    """
+    出馬表データ配下のJSONを、開催日・競馬場ごとに1ファイルの列指向形式へ変換する。
+    1レースが1つの行グループになる。変換できなかったレースはJSONのまま読み込まれる。
+    """
+    index = RaceFileIndex(src_root)
+    index.refresh()
+    partitions = defaultdict(list)
+    for race_file in index.races():
+        partitions[_partition_name(race_file)].append(race_file)
+
+    os.makedirs(dst_root, exist_ok=True)
+    converted, skipped = 0, []
+    for partition, race_files in sorted(partitions.items()):
+        with ColumnarWriter(os.path.join(dst_root, partition + STORE_EXTENSION), RACE_CARD_SCHEMA) as writer:
+            for race_file in race_files:
+                st = os.stat(race_file.path)
+                try:
+                    with open(race_file.path, "r", encoding="utf-8") as f:
+                        df = _to_typed_frame(json.load(f))
+                    writer.write(df, {
+                        "race_number": race_file.race_number,
+                        "race_id": str(df["race_id"].iloc[0]) if len(df) else None,
+                        "file_name": os.path.basename(race_file.path),
+                        "source_mtime_ns": st.st_mtime_ns,
+                        "source_size": st.st_size,
+                    })
+                    converted += 1
+                except ValueError as e:
+                    skipped.append((race_file.path, str(e)))
+    return converted, skipped
+
+
+class RaceCardStore:
+    """
+    convert_race_cards で作ったファイルから1レース分の出馬表を取り出す。
+    元のJSONが変換後に更新されている場合は None を返し、呼び出し側でJSONを読む。
+    """
+
+    def __init__(self, root=RACE_CARD_STORE_DIR):
+        self.root = root
+        self._readers = {}  # 区分名 -> (mtime_ns, ColumnarReader, {レース番号: 行グループ番号})
+        self._lock = threading.Lock()
+
+    def _reader(self, partition):
+        path = os.path.join(self.root, partition + STORE_EXTENSION)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        cached = self._readers.get(partition)
+        if cached is not None and cached[0] == mtime:
+            return cached
+        with self._lock:
+            reader = ColumnarReader(path)
+            races = {row_group["metadata"]["race_number"]: i for i, row_group in enumerate(reader.row_groups)}
+            cached = (mtime, reader, races)
+            self._readers[partition] = cached
+            return cached
+
+    def load(self, race_file):
+        """ race_file（RaceFileIndexの要素）の出馬表をDataFrameで返す。無い・古い場合は None """
+        cached = self._reader(_partition_name(race_file))
+        if cached is None:
+            return None
+        _, reader, races = cached
+        i = races.get(race_file.race_number)
+        if i is None:
+            return None
+        metadata = reader.row_groups[i]["metadata"]
+        st = os.stat(race_file.path)
+        if (metadata["file_name"] != os.path.basename(race_file.path)
+                or metadata["source_mtime_ns"] != st.st_mtime_ns or metadata["source_size"] != st.st_size):
+            return None
+        return reader.read_row_group(i, categorical=_CATEGORICAL_COLUMNS)
+
+
+_race_card_store = None
+_race_card_store_lock = threading.Lock()
+
+
+def get_race_card_store():
+    """ プロセス共有のストアを返す """
+    global _race_card_store
+    if _race_card_store is None:
+        with _race_card_store_lock:
+            if _race_card_store is None:
+                _race_card_store = RaceCardStore()
+    return _race_card_store
+
+
+def load_race_card(race_file):
+    """
+    出馬表を列指向ストアから読み込む。ストアに無い場合はJSONから読み込む。
+    どちらの場合も RACE_CARD_FIELDS の型（数値・category・日付）に変換して返す。
+    """
+    df = get_race_card_store().load(race_file)
+    if df is None:
+        with open(race_file.path, "r", encoding="utf-8") as f:
+            df = pd.DataFrame(json.load(f))
+    return parse_race_cards(df)
@@ -0,0 +1,142 @@
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+
+from modules.constants._race_ground_from_name_to_id import convert_ground_to_id
+
+RACE_CARD_DIR = "出馬表データ"
+
+# 出馬表ファイル名の形式（いずれも "出馬表データ/{日付}{場名}/" 配下）
+#   {日付}{場id}{レース番号}R{レース名}.json  例: 202410050811RオパールS.json
+#   {日付}{レース番号}R{場id}{レース名}.json  例: 2024102011R04新潟牝馬S.json
+#   {日付}{レース番号}R{レース名}.json        例: 2024102011RブラジルC.json
+_FILE_NAME_PATTERN = re.compile(r"^(\d{8})(\d{1,4})R(.*)\.json$")
+_DIR_NAME_PATTERN = re.compile(r"^(\d{8})(\D+)$")
+
+RaceFile = namedtuple("RaceFile", ["path", "date", "ground", "ground_id", "race_number", "race_name", "canonical"])
+
+
+def parse_race_file_name(file_name, ground_id):
+    """
+    出馬表のファイル名から (日付, 場id, レース番号, レース名, 標準形式かどうか) を取り出す。
+    場idがファイル名に含まれない形式では、フォルダの場名から求めた ground_id を使う。
+    形式に合わない場合は None を返す。
+    """
+    m = _FILE_NAME_PATTERN.match(file_name)
+    if not m:
+        return None
+    date, digits, rest = m.groups()
+    if len(digits) >= 3:
+        # {日付}{場id}{レース番号}R の形式
+        return date, digits[:2], int(digits[2:]), rest, True
+    if rest.startswith(ground_id):
+        rest = rest[len(ground_id):]
+    return date, ground_id, int(digits), rest, False
+
+
+def _put_preferred(race_files, key, race_file):
+    # 同じレースのファイルが複数ある場合は標準形式のファイル名を優先する
+    current = race_files.get(key)
+    if current is None or (race_file.canonical and not current.canonical):
+        race_files[key] = race_file
+
+
+class RaceFileIndex:
+    """
+    出馬表データ配下のファイルを (日付, 場id, レース番号) で引けるようにしたインデックス。
+    ファイル名の解析は起動時に一度だけ行い、以降はフォルダの mtime が変わったものだけを読み直す。
+    読み直した結果は新しい辞書に作ってから差し替えるので、読み取りはロックを取らずに行える。
+    """
+
+    def __init__(self, root=RACE_CARD_DIR, refresh_interval=5.0):
+        self.root = root
+        self.refresh_interval = refresh_interval
+        self._dirs = {}  # フォルダ名 -> (mtime_ns, {キー: RaceFile})
+        self._by_key = {}  # (日付, 場id, レース番号) -> RaceFile（差し替えるだけで書き換えない）
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """ 追加・更新・削除されたフォルダだけを読み直す """
+        with self._lock:
+            self._refreshed_at = time.monotonic()
+            if not os.path.isdir(self.root):
+                return
+            dirs = {}
+            for entry in os.scandir(self.root):
+                if not entry.is_dir():
+                    continue
+                mtime = entry.stat().st_mtime_ns
+                cached = self._dirs.get(entry.name)
+                if cached is not None and cached[0] == mtime:
+                    dirs[entry.name] = cached
+                else:
+                    dirs[entry.name] = (mtime, self._scan_dir(entry.name, entry.path))
+            if dirs.keys() == self._dirs.keys() and all(dirs[name] is self._dirs[name] for name in dirs):
+                return
+            by_key = {}
+            for name in sorted(dirs):
+                for key, race_file in dirs[name][1].items():
+                    _put_preferred(by_key, key, race_file)
+            self._dirs = dirs
+            self._by_key = by_key
+
+    def _scan_dir(self, dir_name, dir_path):
+        m = _DIR_NAME_PATTERN.match(dir_name)
+        if not m:
+            return {}
+        ground = m.group(2)
+        ground_id = convert_ground_to_id(ground)
+        race_files = {}
+        for file_name in sorted(os.listdir(dir_path)):
+            parsed = parse_race_file_name(file_name, ground_id)
+            if parsed is None:
+                continue
+            date, file_ground_id, race_number, race_name, canonical = parsed
+            _put_preferred(race_files, (date, file_ground_id, race_number),
+                           RaceFile(os.path.join(dir_path, file_name), date, ground, file_ground_id,
+                                    race_number, race_name, canonical))
+        return race_files
+
+    def _refresh_if_stale(self, force=False):
+        # 見つからなかった場合も、短時間に何度も読み直さないよう最低1秒は間隔をあける
+        interval = 1.0 if force else self.refresh_interval
+        if self._refreshed_at is None or time.monotonic() - self._refreshed_at >= interval:
+            self.refresh()
+
+    def get(self, date, ground_id, race_number):
+        """ 該当するレースの RaceFile を返す。存在しなければ None """
+        key = (str(date), ground_id, int(race_number))
+        self._refresh_if_stale()
+        race_file = self._by_key.get(key)
+        if race_file is None:
+            self._refresh_if_stale(force=True)
+            race_file = self._by_key.get(key)
+        return race_file
+
+    def find(self, date, ground_id, race_number):
+        """ 該当するレースのファイルパスを返す。存在しなければ None """
+        race_file = self.get(date, ground_id, race_number)
+        return race_file.path if race_file else None
+
+    def races(self, date=None, ground_ids=None):
+        """ 条件に合うレースの RaceFile を (日付, 場id, レース番号) 順で返す """
+        self._refresh_if_stale()
+        return [race_file for key, race_file in sorted(self._by_key.items())
+                if (date is None or key[0] == str(date)) and (ground_ids is None or key[1] in ground_ids)]
+
+
+_race_file_index = None
+_race_file_index_lock = threading.Lock()
+
+
+def get_race_file_index():
+    """ プロセス共有のインデックスを返す """
+    global _race_file_index
+    if _race_file_index is None:
+        with _race_file_index_lock:
+            if _race_file_index is None:
+                _race_file_index = RaceFileIndex()
+    return _race_file_index
@@ -1,11 +1,11 @@
-import joblib
+from modules.predicting._model_registry import get_registry
+from modules.predicting._fast_inference import predict_fast
 
 def predict_time(processed_data):
-    # 学習済みモデルの読み込み
-    model = joblib.load("model/horse_race_model_走破時間.pkl")
+    # 学習済みモデルの読み込み（プロセス内で共有）
+    model = get_registry().get("model/horse_race_model_走破時間.pkl")
 
-    # モデルにそのままデータを入力
-    predicted_time = model.predict(processed_data)
+    # モデルの特徴量の順に並べた float32 の行列で予測
+    predicted_time = predict_fast(model, processed_data)
 
     return predicted_time
-
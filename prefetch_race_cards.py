@@ -0,0 +1,206 @@
+import argparse
+import datetime
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from modules.constants._race_ground_from_name_to_id import GROUND_DICT, convert_id_to_ground
+from modules.preparing._chrome_driver_pool import get_driver_pool
+from modules.preparing._scrape_race_id_list import scrape_race_id_list
+from modules.preparing._scrape_shutuba_table import scrape_shutuba_table
+from modules.storage._race_card_store import RACE_CARD_SCHEMA
+from modules.storage._race_file_index import RACE_CARD_DIR, RaceFileIndex
+
+CHECKPOINT_FILE = "cache/prefetch_checkpoint.json"
+
+# 出馬表JSONで文字列として保存している列と、小数として保存している列
+_TEXT_COLUMNS = ["馬番", "オッズ", "人気", "距離"]
+_FLOAT_COLUMNS = ["体重", "体重変化", "齢", "斤量"]
+# 出馬表JSONでは先頭の1文字で保存している列（ダート -> ダ、稍重 -> 稍、不良 -> 不）。天気は「小雨」などそのまま
+_ABBREVIATED_COLUMNS = ["芝・ダート", "馬場"]
+# ファイル名に使えない文字（パスの区切り文字と、Windowsで使えない文字）
+_UNSAFE_FILE_NAME_CHARS = re.compile(r'[\\/:*?"<>|]')
+
+
+class RateLimiter:
+    """ スレッドをまたいで、リクエストの開始間隔を interval 秒以上あける """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class Checkpoint:
+    """ 開催日ごとの race_id 一覧と、取得済み・失敗したレースをファイルに記録する """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.data = {"race_ids": {}, "done": [], "failed": {}}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.data.update(json.load(f))
+        self.done = set(self.data["done"])
+
+    def save(self):
+        with self._lock:
+            self.data["done"] = sorted(self.done)
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, ensure_ascii=False, indent=4)
+            os.replace(tmp_path, self.path)
+
+    def mark_done(self, race_id):
+        with self._lock:
+            self.done.add(race_id)
+            self.data["failed"].pop(race_id, None)
+        self.save()
+
+    def mark_failed(self, race_id, error):
+        with self._lock:
+            self.data["failed"][race_id] = error
+        self.save()
+
+
+def date_range(start, end):
+    """ yyyymmdd の開始日から終了日まで（両端を含む）の日付 """
+    day = datetime.datetime.strptime(start, "%Y%m%d").date()
+    last = datetime.datetime.strptime(end, "%Y%m%d").date()
+    while day <= last:
+        yield day.strftime("%Y%m%d")
+        day += datetime.timedelta(days=1)
+
+
+def discover_race_ids(dates, ground_ids, checkpoint):
+    """ 開催日ごとの race_id を取得し、対象の競馬場のものだけを (日付, race_id) で返す """
+    targets = []
+    for date in dates:
+        race_ids = checkpoint.data["race_ids"].get(date)
+        if race_ids is None:
+            race_ids = sorted(set(scrape_race_id_list([date])))
+            # 取得に失敗した場合も空のリストになるため、空の結果は記録せず再開時に取得し直す
+            if race_ids:
+                checkpoint.data["race_ids"][date] = race_ids
+                checkpoint.save()
+            else:
+                print(f"{date} のレースが見つかりませんでした（再開時に取得し直します）")
+        targets.extend((date, race_id) for race_id in race_ids if race_id[4:6] in ground_ids)
+    return targets
+
+
+def race_card_path(dst_root, date, race_id, race_name):
+    """
+    既存の命名規則（{日付}{場名}/{日付}{場id}{レース番号}R{レース名}.json）のパス。
+    レース名のうちファイル名に使えない文字（"/" など）は "_" に置き換える。
+    """
+    ground_id = race_id[4:6]
+    ground = convert_id_to_ground(ground_id)
+    race_name = _UNSAFE_FILE_NAME_CHARS.sub("_", race_name)
+    file_name = f"{date}{ground_id}{int(race_id[10:12])}R{race_name}.json"
+    return os.path.join(dst_root, f"{date}{ground}", file_name)
+
+
+def to_card_records(df):
+    """ スクレイピング結果を出馬表JSONと同じ列順・表記のレコードにする """
+    df = df[[name for name, _ in RACE_CARD_SCHEMA]].copy()
+    for column in _TEXT_COLUMNS:
+        df[column] = df[column].map(lambda x: None if x is None else str(x))
+    for column in _FLOAT_COLUMNS:
+        df[column] = df[column].astype(float)
+    for column in _ABBREVIATED_COLUMNS:
+        df[column] = df[column].map(lambda x: x[:1] if isinstance(x, str) else x)
+    return json.loads(df.to_json(orient="records", force_ascii=False))
+
+
+def write_json_atomic(path, records):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(records, f, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, path)
+
+
+def prefetch_race(date, race_id, dst_root, rate_limiter):
+    """ 1レース分の出馬表を取得して保存し、保存先のパスを返す """
+    ground = convert_id_to_ground(race_id[4:6])
+    rate_limiter.wait()
+    df = scrape_shutuba_table(race_id, ground, date)
+    if df.empty:
+        raise ValueError("出走馬がありません")
+    path = race_card_path(dst_root, date, race_id, df["レース名"].iloc[0])
+    write_json_atomic(path, to_card_records(df))
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="期間内の出馬表をまとめて取得して出馬表データに保存する（中断しても続きから再開できる）")
+    parser.add_argument("--start", required=True, help="開始日（yyyymmdd）")
+    parser.add_argument("--end", help="終了日（yyyymmdd、省略時は開始日と同じ）")
+    parser.add_argument("--grounds", nargs="*", choices=list(GROUND_DICT), help="競馬場名（省略時はすべて）")
+    parser.add_argument("--workers", type=int, default=2, help="同時に取得するレース数（起動するChromeの数）")
+    parser.add_argument("--interval", type=float, default=1.0, help="ページ取得の最小間隔（秒）")
+    parser.add_argument("--dst", default=RACE_CARD_DIR, help="出馬表JSONのフォルダ")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE, help="進捗を記録するファイル")
+    parser.add_argument("--retry-failed", action="store_true", help="前回失敗したレースも取得し直す")
+    args = parser.parse_args()
+
+    grounds = args.grounds or list(GROUND_DICT)
+    ground_ids = {GROUND_DICT[ground] for ground in grounds}
+    dates = list(date_range(args.start, args.end or args.start))
+    checkpoint = Checkpoint(args.checkpoint)
+    get_driver_pool().resize(args.workers)
+
+    start = time.time()
+    targets = discover_race_ids(dates, ground_ids, checkpoint)
+
+    # 取得済みのレースと、既に出馬表データにあるレースは飛ばす
+    index = RaceFileIndex(args.dst)
+    index.refresh()
+    pending = []
+    for date, race_id in targets:
+        if race_id in checkpoint.done:
+            continue
+        if race_id in checkpoint.data["failed"] and not args.retry_failed:
+            continue
+        if index.get(date, race_id[4:6], int(race_id[10:12])) is not None:
+            checkpoint.done.add(race_id)
+            continue
+        pending.append((date, race_id))
+    checkpoint.save()
+    print(f"{len(targets)}レース中 {len(pending)}レースを取得します")
+
+    rate_limiter = RateLimiter(args.interval)
+    saved = 0
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(prefetch_race, date, race_id, args.dst, rate_limiter): race_id
+                   for date, race_id in pending}
+        for future in as_completed(futures):
+            race_id = futures[future]
+            try:
+                path = future.result()
+            except Exception as e:
+                print(f"失敗: {race_id} ({e})")
+                checkpoint.mark_failed(race_id, str(e))
+                continue
+            checkpoint.mark_done(race_id)
+            saved += 1
+            print(f"保存: {path}")
+
+    print(f"{saved}/{len(pending)}レースを保存しました（{time.time() - start:.1f}秒）")
+
+if __name__ == "__main__":
+    main()
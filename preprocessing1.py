@@ -1,11 +1,25 @@
 import pandas as pd
-from sklearn.preprocessing import StandardScaler, OneHotEncoder, LabelEncoder
-import json
 import os
-import joblib
 import numpy as np
+from modules.predicting._model_registry import get_registry
+from modules.predicting._label_encoding import onehot_with_unknown, transform_with_unknown
+from modules.predicting._stats_table import get_stats_table, add_stats_features
+from modules.predicting._incremental_stats import stats_binary_path
+from modules.predicting._stats_files import load_stats, stats_to_ingest
+from modules.storage._race_card_schema import parse_dates, parse_numbers, parse_times
+
+# 過去成績の項目と、成績が無い馬・騎手に使う値
+HORSE_STAT_FIELDS = [("平均着順", 10), ("勝率", 0), ("出走回数", 0), ("平均速度", 0)]
+JOCKEY_STAT_FIELDS = [("平均着順", 10), ("勝率", 0), ("出走回数", 0)]
 
 class RaceDataPreprocessor1:
+    # ワンホットエンコーディングする列
+    CATEGORICAL_COLUMNS = ["クラス", "天気", "馬場", "場名", "性", "芝・ダート", "回り", "距離区分"]
+    # scaler で標準化する列
+    SCALED_COLUMNS = ["体重", "体重変化", "斤量", "オッズ",
+                      "馬の平均着順", "馬の出走回数", "馬の勝率", "馬の平均速度",
+                      "騎手の平均着順", "騎手の勝率", "騎手の出走回数", "距離"]
+
     def __init__(self, is_train=True,stats_file="model/horse_stats.json", jockey_stats_file="model/jockey_stats.json",
                  scaler_file="model/scaler_タイム.pkl", horse_encoder_file="model/horse_encoder_タイム.pkl", 
                  jockey_encoder_file="model/jockey_encoder_タイム.pkl", onehot_encoder_file="model/onehot_encoder_タイム.pkl"):
@@ -17,126 +31,110 @@ class RaceDataPreprocessor1:
         self.jockey_encoder_file = jockey_encoder_file
         self.onehot_encoder_file = onehot_encoder_file
         
-        self.skip_horse_stats = os.path.exists(self.stats_file)
-        self.skip_jockey_stats = os.path.exists(self.jockey_stats_file)
+        # 予測時はプロセス共有のレジストリから読み込む（学習時はfitで書き換えるため個別に読み込む）
+        # sklearn・joblib は学習時と成果物が無い場合にだけ読み込む（予測用のプロセスの起動を速くするため）
+        if self.is_train:
+            import joblib
+            load_artifact = joblib.load
+        else:
+            load_artifact = get_registry().get
         
         self.horse_stats = self._load_horse_stats()
         self.jockey_stats = self._load_jockey_stats()
         
         if os.path.exists(self.scaler_file):
-            self.scaler = joblib.load(self.scaler_file)
+            self.scaler = load_artifact(self.scaler_file)
         else:
+            from sklearn.preprocessing import StandardScaler
             self.scaler = StandardScaler()
         
         if os.path.exists(self.horse_encoder_file):
-            self.horse_label_encoder = joblib.load(self.horse_encoder_file)
+            self.horse_label_encoder = load_artifact(self.horse_encoder_file)
         else:
+            from sklearn.preprocessing import LabelEncoder
             self.horse_label_encoder = LabelEncoder()
         
         if os.path.exists(self.jockey_encoder_file):
-            self.jockey_label_encoder = joblib.load(self.jockey_encoder_file)
+            self.jockey_label_encoder = load_artifact(self.jockey_encoder_file)
         else:
+            from sklearn.preprocessing import LabelEncoder
             self.jockey_label_encoder = LabelEncoder()
 
         if os.path.exists(self.onehot_encoder_file):
-            self.onehot_encoder = joblib.load(self.onehot_encoder_file)
+            self.onehot_encoder = load_artifact(self.onehot_encoder_file)
         else:
+            from sklearn.preprocessing import OneHotEncoder
             self.onehot_encoder = OneHotEncoder(sparse_output=False, handle_unknown='ignore')
 
     
     def transform(self, df):
+        df = self.transform_common(df)
+        df = self.transform_model(df)
+        return df    
+
+    def transform_common(self, df):
+        """ 走破時間モデル・着順モデルで共通の特徴量（列の整形と馬・騎手の過去成績）を作る """
         df = self._common_preprocessing(df)
         df = self._add_horse_features(df)
         df = self._add_jockey_features(df)
+        return df
+
+    def transform_model(self, df):
+        """ transform_common の結果に、このモデル用のエンコーディングとスケーリングを行う """
         df = self._transform_label_encoders(df)
         df = self._fit_onehot_encoder(df)
         df = self._scale_numeric(df)
-        return df    
+        return df
 
 
     def _compute_horse_stats(self, df):
-        """各馬の過去成績を計算して辞書に保存（JSONファイルに保存）"""
-        if self.skip_horse_stats:
-            print("過去の馬の成績データが存在するため、スキップします。")
-            return
-
-        horse_groups = df.groupby("馬")
-        for horse, group in horse_groups:
-            if horse in self.horse_stats:
-                # すでにデータが存在する場合はスキップ
-                continue
-
-            # 馬ごとの過去成績の計算
-            avg_speed = (group["走破時間"] / group["距離"]).mean()  # 平均速度計算（走破時間 / 距離）
-
-            self.horse_stats[horse] = {
-                "平均着順": group["着順"].mean(),
-                "勝率": (group["着順"] <= 3).mean(),  # 3着以内の割合
-                "出走回数": len(group),
-                "平均速度": avg_speed  # 馬ごとの平均速度を追加
-            }
+        """ レース結果を馬ごとの累計成績に足し込んで保存する（取り込み済みのレースは数えない） """
+        stats = stats_to_ingest(self.horse_stats, self.stats_file, self.is_train)
+        added = stats.ingest(df, "馬")
+        print(f"馬の成績に{added}行を追加しました。")
+        self.horse_stats = stats
+        self._save_horse_stats()  # バイナリファイルに保存
 
     def _save_horse_stats(self):
-        """ 馬の成績情報をJSONファイルに保存 """
-        with open(self.stats_file, "w", encoding="utf-8") as f:
-            json.dump(self.horse_stats, f, ensure_ascii=False, indent=4)
+        """ 馬の成績情報をバイナリファイルに保存 """
+        self.horse_stats.save(stats_binary_path(self.stats_file))
 
     def _load_horse_stats(self):
-        """ JSONファイルから馬の成績情報を読み込む """
-        if os.path.exists(self.stats_file):
-            with open(self.stats_file, "r", encoding="utf-8") as f:
-                return json.load(f)
-        else:
-            return {}    
+        """ バイナリファイル（無ければJSONファイル）から馬の成績情報を読み込む """
+        return load_stats(self.stats_file, self.is_train)
 
     def _add_horse_features(self, df):
         """馬ごとに過去レースの平均速度（走破時間 / 距離）を計算する"""
         # df["走破距離速度"] = df["走破時間"] / df["距離"]  # 1mあたりの走破時間
 
         """馬の過去成績を特徴量として追加（JSONファイルから読み込んだデータを使用）"""
-        df["馬の平均着順"] = df["馬"].map(lambda x: self.horse_stats.get(x, {}).get("平均着順", 10))
-        df["馬の勝率"] = df["馬"].map(lambda x: self.horse_stats.get(x, {}).get("勝率", 0))
-        df["馬の出走回数"] = df["馬"].map(lambda x: self.horse_stats.get(x, {}).get("出走回数", 0))
-        df["馬の平均速度"] = df["馬"].map(lambda x: self.horse_stats.get(x, {}).get("平均速度", 0))
+        # 成績表を馬名で一括で引く（学習時は成績を書き換えるため表を使い回さない）
+        table = get_stats_table(self.horse_stats, HORSE_STAT_FIELDS, cache=not self.is_train)
+        df = add_stats_features(df, "馬", table, ["馬の平均着順", "馬の勝率", "馬の出走回数", "馬の平均速度"])
         # df["馬の平均速度"] = df.groupby("馬")["走破距離速度"].transform(lambda x: x.expanding().mean().shift(1))
 
         return df
     
     def _compute_jockey_stats(self, df):
-        """ 各騎手の過去成績を計算して辞書に保存（JSONファイルに保存） """
-        if self.skip_jockey_stats:
-            print("過去の騎手の成績データが存在するため、スキップします。")
-            return
-
-        jockey_groups = df.groupby("騎手")
-        for jockey, group in jockey_groups:
-            self.jockey_stats[jockey] = {
-                "平均人気": group["人気"].mean(),
-                "平均着順": group["着順"].mean(),
-                "勝率": (group["着順"] <= 3).mean(),  # 3着以内の割合
-                "出走回数": len(group)
-            }
-        self._save_jockey_stats()  # JSONファイルに保存
-
+        """ レース結果を騎手ごとの累計成績に足し込んで保存する（取り込み済みのレースは数えない） """
+        stats = stats_to_ingest(self.jockey_stats, self.jockey_stats_file, self.is_train)
+        added = stats.ingest(df, "騎手")
+        print(f"騎手の成績に{added}行を追加しました。")
+        self.jockey_stats = stats
+        self._save_jockey_stats()  # バイナリファイルに保存
 
     def _save_jockey_stats(self):
-        """ 騎手の成績情報をJSONファイルに保存 """
-        with open(self.jockey_stats_file, "w", encoding="utf-8") as f:
-            json.dump(self.jockey_stats, f, ensure_ascii=False, indent=4)
+        """ 騎手の成績情報をバイナリファイルに保存 """
+        self.jockey_stats.save(stats_binary_path(self.jockey_stats_file))
 
     def _load_jockey_stats(self):
-        """ JSONファイルから騎手の成績情報を読み込む """
-        if os.path.exists(self.jockey_stats_file):
-            with open(self.jockey_stats_file, "r", encoding="utf-8") as f:
-                return json.load(f)
-        else:
-            return {}
+        """ バイナリファイル（無ければJSONファイル）から騎手の成績情報を読み込む """
+        return load_stats(self.jockey_stats_file, self.is_train)
 
     def _add_jockey_features(self, df):
         """ 騎手の過去成績を特徴量として追加（JSONファイルから読み込んだデータを使用） """
-        df["騎手の平均着順"] = df["騎手"].map(lambda x: self.jockey_stats.get(x, {}).get("平均着順", 10))
-        df["騎手の勝率"] = df["騎手"].map(lambda x: self.jockey_stats.get(x, {}).get("勝率", 0))
-        df["騎手の出走回数"] = df["騎手"].map(lambda x: self.jockey_stats.get(x, {}).get("出走回数", 0))
+        table = get_stats_table(self.jockey_stats, JOCKEY_STAT_FIELDS, cache=not self.is_train)
+        df = add_stats_features(df, "騎手", table, ["騎手の平均着順", "騎手の勝率", "騎手の出走回数"])
         return df
 
 
@@ -163,26 +161,24 @@ class RaceDataPreprocessor1:
 
         # 不要な列を削除
         df = df.drop(columns=["レース名", "場id", "通過順", "開催"], errors="ignore")
-        # 日本語の日付フォーマットを指定して変換
-        df["日付"] = pd.to_datetime(df["日付"], format='%Y-%m-%d', errors='coerce')
+        # 日本語の日付フォーマットを指定して変換（読み込み時に変換済みの列はそのまま）
+        df["日付"] = parse_dates(df["日付"])
         df["月"] = df["日付"].dt.month
         #df["曜日"] = df["日付"].dt.weekday
 
         # 走破時間の補正
         if "走破時間" in df.columns:
-            df["走破時間"] = df["走破時間"].apply(self.convert_time_to_seconds)
+            df["走破時間"] = parse_times(df["走破時間"])
         
 
-        # 数値列を数値に変換（非数値はNaNに）
+        # 数値列を数値に変換（数字以外を取り除き、非数値はNaNに。読み込み時に変換済みの列はそのまま）
         numeric_cols = ["体重", "体重変化", "斤量", "距離", "人気", "オッズ"]
         for col in numeric_cols:
-            df[col] = df[col].replace(r'[^\d.-]', '', regex=True)  # 数字以外を取り除く
-            df[col] = pd.to_numeric(df[col], errors='coerce')
+            df[col] = parse_numbers(df[col])
 
         # "上がり" 列が存在する場合のみ処理
         if "上がり" in df.columns:
-            df["上がり"] = df["上がり"].replace(r'[^\d.-]', '', regex=True)  # 数字以外を取り除く
-            df["上がり"] = pd.to_numeric(df["上がり"], errors='coerce')
+            df["上がり"] = parse_numbers(df["上がり"])
         
         # 距離区分を追加
         df["距離区分"] = pd.cut(df["距離"], 
@@ -208,11 +204,9 @@ class RaceDataPreprocessor1:
             # fit された classes_ 属性を表示して確認
             print("馬エンコーダーのクラス: ", self.horse_label_encoder.classes_)
             print("騎手エンコーダーのクラス: ", self.jockey_label_encoder.classes_)
-        else:  # 予測時
-            df["馬"] = df["馬"].map(lambda x: self.horse_label_encoder.transform([x])[0] 
-                                    if x in self.horse_label_encoder.classes_ else -1)
-            df["騎手"] = df["騎手"].map(lambda x: self.jockey_label_encoder.transform([x])[0] 
-                                    if x in self.jockey_label_encoder.classes_ else -1)
+        else:  # 予測時（未知の馬・騎手は-1）
+            df["馬"] = transform_with_unknown(self.horse_label_encoder, df["馬"])
+            df["騎手"] = transform_with_unknown(self.jockey_label_encoder, df["騎手"])
 
         return df
 
@@ -221,9 +215,8 @@ class RaceDataPreprocessor1:
 
     def _fit_onehot_encoder(self, df):
         # ワンホットエンコーディング
-        categorical_cols = ["クラス", "天気", "馬場", "場名", "性", "芝・ダート", "回り", "距離区分"]
-        df_onehot = self.onehot_encoder.transform(df[categorical_cols])
-        df_onehot = pd.DataFrame(df_onehot, columns=self.onehot_encoder.get_feature_names_out(categorical_cols))
+        categorical_cols = self.CATEGORICAL_COLUMNS
+        df_onehot = onehot_with_unknown(self.onehot_encoder, df, categorical_cols)
         df = pd.concat([df, df_onehot], axis=1)
         df = df.drop(columns=categorical_cols)
         return df
@@ -233,9 +226,7 @@ class RaceDataPreprocessor1:
     def _scale_numeric(self, df):
         df["騎手の出走回数"] = np.log1p(df["騎手の出走回数"])
 
-        numeric_cols = ["体重", "体重変化", "斤量",  "オッズ", 
-                    "馬の平均着順", "馬の出走回数","馬の勝率","馬の平均速度",
-                    "騎手の平均着順","騎手の勝率","騎手の出走回数", "距離"]
+        numeric_cols = self.SCALED_COLUMNS
 
         
         df[numeric_cols] = self.scaler.transform(df[numeric_cols])
@@ -0,0 +1,32 @@
+import argparse
+import json
+import os
+from modules.monitoring._import_profile import by_package, format_import_report, profile_imports
+
+def main():
+    parser = argparse.ArgumentParser(description="APIやコマンドの起動時に、どのモジュールの読み込みに時間がかかっているかを表示する")
+    parser.add_argument("modules", nargs="*", default=["app"], help="計測するモジュール（既定は app）")
+    parser.add_argument("--top", type=int, default=20, help="表示する件数")
+    parser.add_argument("--output", help="計測結果を保存するJSONファイル")
+    args = parser.parse_args()
+
+    results = {}
+    for module in args.modules:
+        # 各モジュールを新しいプロセスで読み込む（このリポジトリのフォルダから）
+        records, seconds = profile_imports(module, cwd=os.path.dirname(os.path.abspath(__file__)))
+        print(format_import_report(module, records, seconds, args.top))
+        print()
+        results[module] = {
+            "seconds": seconds,
+            "import_ms": sum(record.self_us for record in records) / 1000,
+            "packages": {package: package_us / 1000 for package, package_us in by_package(records)},
+            "modules": [record._asdict() for record in records],
+        }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=1)
+        print(f"結果を {args.output} に保存しました")
+
+if __name__ == "__main__":
+    main()
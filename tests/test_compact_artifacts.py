@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.preprocessing import LabelEncoder, OneHotEncoder, StandardScaler
+
+from modules.predicting._compact_artifacts import (CompactArtifacts, export_compact_artifacts, load_compact,
+                                                   to_compact, write_compact)
+from modules.predicting._label_encoding import onehot_with_unknown, transform_with_unknown
+from modules.predicting._model_registry import LOADERS
+from modules.predicting._stats_table import StatsTable
+from preprocessing1 import JOCKEY_STAT_FIELDS
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_DIR = os.path.join(REPO_ROOT, "model")
+CARD_PATH = os.path.join(REPO_ROOT, "出馬表データ", "20241019京都", "202410190811RオータムリーフS.json")
+
+
+def _card():
+    with open(CARD_PATH, "r", encoding="utf-8") as f:
+        df = pd.DataFrame(json.load(f))
+    df["距離区分"] = "マイル"
+    return df
+
+
+def _round_trip(tmp_path, value):
+    path = str(tmp_path / "artifact.kart")
+    write_compact(path, *to_compact(value))
+    return load_compact(path)
+
+
+@pytest.fixture(scope="module")
+def exported(tmp_path_factory):
+    compact_dir = str(tmp_path_factory.mktemp("compact"))
+    exported_paths, skipped = export_compact_artifacts(MODEL_DIR, compact_dir, LOADERS)
+    artifacts = CompactArtifacts(compact_dir)
+
+    def lookup(name):
+        with open(os.path.join(MODEL_DIR, name), "rb") as f:
+            return artifacts.lookup(hashlib.sha256(f.read()).hexdigest())
+
+    return lookup, exported_paths, skipped
+
+
+def test_export_skips_models(exported):
+    lookup, exported_paths, skipped = exported
+    # モデル・列順のCSV・未fitのスケーラー（レースごとに標準化する preprocessing2 では使わない）は変換しない
+    assert {os.path.basename(path) for path in skipped} == {
+        "horse_race_model.pkl", "horse_race_model_走破時間.pkl", "column_order.csv", "scaler.pkl"}
+    assert {os.path.basename(path) for path in exported_paths} >= {
+        "horse_encoder.pkl", "jockey_encoder.pkl", "onehot_encoder.pkl", "scaler_タイム.pkl", "jockey_stats.json"}
+    # 同じ内容のエンコーダーは同じインスタンス
+    assert lookup("horse_encoder.pkl") is lookup("horse_encoder_タイム.pkl")
+
+
+@pytest.mark.parametrize("name, column", [("horse_encoder.pkl", "馬"), ("jockey_encoder.pkl", "騎手")])
+def test_label_encoder_matches_pickle(exported, name, column):
+    original = joblib.load(os.path.join(MODEL_DIR, name))
+    compact = exported[0](name)
+    np.testing.assert_array_equal(compact.classes_, original.classes_)
+
+    values = _card()[column]
+    values.loc[0] = "学習時に無い名前"
+    np.testing.assert_array_equal(transform_with_unknown(compact, values), transform_with_unknown(original, values))
+    known = values[transform_with_unknown(original, values) != -1].tolist()
+    codes = original.transform(known)
+    np.testing.assert_array_equal(compact.transform(known), codes)
+    np.testing.assert_array_equal(compact.inverse_transform(codes), original.inverse_transform(codes))
+    with pytest.raises(ValueError):
+        compact.transform(values.tolist())
+
+
+@pytest.mark.parametrize("name", ["onehot_encoder.pkl", "onehot_encoder_タイム.pkl"])
+def test_onehot_encoder_matches_pickle(exported, name):
+    original = joblib.load(os.path.join(MODEL_DIR, name))
+    compact = exported[0](name)
+    columns = list(original.feature_names_in_)
+    # 実際の出馬表には学習時に無い値（全角数字のクラス・小雨）がある
+    df = _card()
+    df.loc[1, "距離区分"] = None
+    pd.testing.assert_frame_equal(onehot_with_unknown(compact, df, columns), onehot_with_unknown(original, df, columns))
+    np.testing.assert_array_equal(compact.get_feature_names_out(columns), original.get_feature_names_out(columns))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        expected = original.transform(df[columns].astype(object).where(df[columns].notna(), None))
+    np.testing.assert_array_equal(compact.transform(df[columns]), expected)
+
+
+def test_standard_scaler_matches_pickle(exported):
+    original = joblib.load(os.path.join(MODEL_DIR, "scaler_タイム.pkl"))
+    compact = exported[0]("scaler_タイム.pkl")
+    columns = list(original.feature_names_in_)
+    np.testing.assert_array_equal(compact.feature_names_in_, columns)
+    X = pd.DataFrame(np.random.default_rng(0).normal(50, 20, size=(18, len(columns))), columns=columns)
+    before = X.copy()
+    np.testing.assert_array_equal(compact.transform(X), original.transform(X))
+    X32 = X.astype(np.float32)
+    np.testing.assert_array_equal(compact.transform(X32), original.transform(X32))
+    # 入力は書き換えない
+    pd.testing.assert_frame_equal(X, before)
+
+
+def test_stats_match_json(exported):
+    with open(os.path.join(MODEL_DIR, "jockey_stats.json"), "r", encoding="utf-8") as f:
+        stats = json.load(f)
+    names = pd.Series(list(stats)[:20] + ["新人騎手", None])
+    expected = StatsTable.from_stats(stats, JOCKEY_STAT_FIELDS).lookup(names)
+    np.testing.assert_array_equal(exported[0]("jockey_stats.json").to_stats_table(JOCKEY_STAT_FIELDS).lookup(names),
+                                  expected)
+
+
+def test_synthetic_artifacts_round_trip(tmp_path):
+    train = pd.DataFrame({"馬場": ["良", "稍", "重", "良"], "天気": ["晴", "曇", "雨", "晴"]})
+    df = pd.DataFrame({"馬場": ["重", "不", None], "天気": ["雪", "晴", "曇"]})
+    onehot = OneHotEncoder(sparse_output=False, handle_unknown="ignore").fit(train)
+    compact = _round_trip(tmp_path, onehot)
+    pd.testing.assert_frame_equal(onehot_with_unknown(compact, df, list(train.columns)),
+                                  onehot_with_unknown(onehot, df, list(train.columns)))
+
+    # 列名つきで学習したスケーラーは列名も確かめる
+    X = pd.DataFrame({"体重": [480.0, 502.0, 456.0], "斤量": [57.0, 55.0, 58.0]})
+    scaler = StandardScaler().fit(X)
+    compact = _round_trip(tmp_path, scaler)
+    np.testing.assert_array_equal(compact.feature_names_in_, scaler.feature_names_in_)
+    np.testing.assert_array_equal(compact.transform(X), scaler.transform(X))
+    with pytest.raises(ValueError):
+        compact.transform(X[["斤量", "体重"]])
+
+    # 項目が欠けている・null の成績
+    stats = {"騎手A": {"平均着順": 3.5, "勝率": 0.2, "出走回数": 10}, "騎手B": {"平均着順": None, "出走回数": 1}}
+    names = pd.Series(["騎手B", "騎手C", "騎手A"])
+    np.testing.assert_array_equal(_round_trip(tmp_path, stats).to_stats_table(JOCKEY_STAT_FIELDS).lookup(names),
+                                  StatsTable.from_stats(stats, JOCKEY_STAT_FIELDS).lookup(names))
+
+
+def test_to_compact_rejects_unsupported():
+    train = pd.DataFrame({"天気": ["晴", "曇"]})
+    assert to_compact(OneHotEncoder(handle_unknown="ignore").fit(train)) is None  # 疎行列出力
+    assert to_compact(OneHotEncoder(sparse_output=False, handle_unknown="ignore", drop="first").fit(train)) is None
+    assert to_compact(LabelEncoder().fit([1, 2, 3])) is None
+    assert to_compact(StandardScaler()) is None
+    assert to_compact({"騎手A": {"所属": "美浦"}}) is None
@@ -0,0 +1,119 @@
+import time
+from types import SimpleNamespace
+from urllib.error import HTTPError
+
+import pytest
+
+import modules.preparing._http_fetch as http_fetch
+from modules.preparing._http_fetch import CachedFetcher, TokenBucket
+from modules.preparing._http_stub_server import StubServer
+
+PAGE = "<html>出馬表</html>".encode("utf-8")
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """ 再試行の待ち時間を記録し、実際には待たない """
+    waits = []
+    monkeypatch.setattr(http_fetch, "time", SimpleNamespace(time=time.time, monotonic=time.monotonic,
+                                                            sleep=waits.append))
+    return waits
+
+
+def _fetcher(tmp_path, **kwargs):
+    kwargs = {"rate": 1000.0, "burst": 1000, "backoff": 0.5, **kwargs}
+    return CachedFetcher(cache_dir=str(tmp_path / "http"), **kwargs)
+
+
+def test_cache_hit_within_ttl(tmp_path):
+    fetcher = _fetcher(tmp_path)
+    with StubServer({"/page": PAGE}) as server:
+        assert fetcher.fetch(server.url("/page"), ttl=60) == PAGE
+        assert fetcher.fetch(server.url("/page"), ttl=60) == PAGE
+    assert server.requests["/page"] == 1
+    assert fetcher.stats() == {"hits": 1, "revalidated": 0, "fetched": 1}
+
+
+def test_etag_revalidation_returns_cached_body(tmp_path):
+    fetcher = _fetcher(tmp_path)
+    with StubServer({"/page": PAGE}) as server:
+        assert fetcher.fetch(server.url("/page"), ttl=0) == PAGE
+        assert fetcher.fetch(server.url("/page"), ttl=0) == PAGE
+        assert server.last_headers["/page"].get("If-None-Match")
+    assert server.requests["/page"] == 2
+    assert fetcher.stats() == {"hits": 0, "revalidated": 1, "fetched": 1}
+
+
+def test_last_modified_revalidation(tmp_path):
+    fetcher = _fetcher(tmp_path)
+    last_modified = "Sat, 19 Oct 2024 01:00:00 GMT"
+    with StubServer({"/page": PAGE}, etag=False, last_modified=last_modified) as server:
+        assert fetcher.fetch(server.url("/page"), ttl=0) == PAGE
+        assert fetcher.fetch(server.url("/page"), ttl=0) == PAGE
+        assert server.last_headers["/page"].get("If-Modified-Since") == last_modified
+    assert fetcher.stats()["revalidated"] == 1
+
+
+def test_changed_page_is_fetched_again(tmp_path):
+    fetcher = _fetcher(tmp_path)
+    new_page = "<html>出馬表（更新）</html>".encode("utf-8")
+    with StubServer({"/page": [PAGE, new_page]}) as server:
+        assert fetcher.fetch(server.url("/page"), ttl=0) == PAGE
+        assert fetcher.fetch(server.url("/page"), ttl=0) == new_page
+    assert fetcher.stats() == {"hits": 0, "revalidated": 0, "fetched": 2}
+
+
+def test_retries_with_retry_after_and_backoff(tmp_path, sleeps):
+    fetcher = _fetcher(tmp_path, max_retries=3)
+    responses = [(429, b"", {"Retry-After": "2"}), (503, b""), (500, b""), PAGE]
+    with StubServer({"/odds": responses}) as server:
+        assert fetcher.fetch(server.url("/odds"), ttl=60) == PAGE
+    assert server.requests["/odds"] == 4
+    # 1回目は Retry-After の秒数、その後は backoff * 2 ** 試行回数（に最大10%の揺らぎ）
+    assert sleeps[0] == 2.0
+    assert 0.5 * 2 <= sleeps[1] <= 0.5 * 2 * 1.1
+    assert 0.5 * 4 <= sleeps[2] <= 0.5 * 4 * 1.1
+
+
+def test_gives_up_after_max_retries(tmp_path, sleeps):
+    fetcher = _fetcher(tmp_path, max_retries=2)
+    with StubServer({"/odds": (503, b"")}) as server:
+        with pytest.raises(HTTPError) as error:
+            fetcher.fetch(server.url("/odds"), ttl=60)
+    assert error.value.code == 503
+    assert server.requests["/odds"] == 3
+    assert len(sleeps) == 2
+
+
+def test_not_found_raises_without_retry(tmp_path, sleeps):
+    fetcher = _fetcher(tmp_path)
+    with StubServer({}) as server:
+        with pytest.raises(HTTPError) as error:
+            fetcher.fetch(server.url("/missing"), ttl=60)
+    assert error.value.code == 404
+    assert server.requests["/missing"] == 1
+    assert sleeps == []
+
+
+def test_token_bucket_paces_requests():
+    bucket = TokenBucket(rate=20, capacity=2)
+    start = time.monotonic()
+    bucket.acquire()
+    bucket.acquire()
+    # 最初の capacity 回は待たない
+    assert time.monotonic() - start < 0.04
+    for _ in range(4):
+        bucket.acquire()
+    # 残りの4回は 1 / rate 秒ごと
+    assert time.monotonic() - start >= 4 / 20 - 0.01
+
+
+def test_fetcher_paces_requests_to_server(tmp_path):
+    fetcher = _fetcher(tmp_path, rate=20.0, burst=1)
+    pages = {f"/race/{i}": PAGE for i in range(4)}
+    with StubServer(pages) as server:
+        start = time.monotonic()
+        for path in pages:
+            fetcher.fetch(server.url(path), ttl=60)
+        elapsed = time.monotonic() - start
+    assert elapsed >= 3 / 20 - 0.01
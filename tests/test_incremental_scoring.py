@@ -0,0 +1,114 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from incremental_scoring import IncrementalScorer, _changed_fields
+from main import predict_race_cards
+from modules.monitoring._metrics import INCREMENTAL_RESCORES
+from modules.storage._race_card_schema import parse_race_cards
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CARD_PATH = os.path.join(REPO_ROOT, "出馬表データ", "20241019京都", "202410190811RオータムリーフS.json")
+
+
+@pytest.fixture(autouse=True)
+def _repo_root(monkeypatch):
+    # モデルなどは model/ からの相対パスで読み込む
+    monkeypatch.chdir(REPO_ROOT)
+
+
+def _card():
+    with open(CARD_PATH, "r", encoding="utf-8") as f:
+        return pd.DataFrame(json.load(f))
+
+
+def _expected(card):
+    """ 最初から計算した場合の結果 """
+    return predict_race_cards(card.copy())
+
+
+def _rescores():
+    return sum(value for _, _, value in INCREMENTAL_RESCORES.samples())
+
+
+def test_changed_fields():
+    card = parse_race_cards(_card())
+    assert _changed_fields(card, card.copy()) == []
+
+    changed = card.copy()
+    changed.loc[0, "オッズ"] = 3.5
+    changed["馬場"] = "重"
+    assert _changed_fields(card, changed) == ["オッズ", "馬場"]
+
+    # UPDATABLE_FIELDS 以外の列や出走馬の並びが変わった場合は計算し直せない
+    changed = card.copy()
+    changed.loc[0, "斤量"] = 50.0
+    assert _changed_fields(card, changed) is None
+    assert _changed_fields(card, card.iloc[::-1]) is None
+    assert _changed_fields(card, card.iloc[1:]) is None
+
+
+def test_rescore_matches_full_prediction():
+    scorer = IncrementalScorer()
+    card = _card()
+    pd.testing.assert_frame_equal(scorer.score(card), _expected(card))
+
+    # 同じ出馬表は保持している結果を返す
+    assert scorer.score(card) is scorer.score(card)
+
+    # オッズ・人気・馬場が変わった出馬表
+    card = card.copy()
+    card.loc[0, "オッズ"], card.loc[1, "オッズ"] = "4.2", "35.0"
+    card.loc[0, "人気"], card.loc[1, "人気"] = card.loc[1, "人気"], card.loc[0, "人気"]
+    card["馬場"] = "重"
+    before = _rescores()
+    results = scorer.score(card)
+    assert _rescores() == before + 1
+    pd.testing.assert_frame_equal(results, _expected(card))
+
+
+def test_update_matches_full_prediction():
+    scorer = IncrementalScorer()
+    card = _card()
+    scorer.score(card)
+    race_id = card["race_id"].iloc[0]
+
+    results = scorer.update(race_id, pd.DataFrame({"馬番": ["3", "5"], "オッズ": [2.1, 88.0], "体重": [470.0, 502.0]}))
+    expected_card = card.copy()
+    rows = expected_card["馬番"].isin(["3", "5"])
+    expected_card.loc[rows, "オッズ"] = ["2.1", "88.0"]
+    expected_card.loc[rows, "体重"] = [470.0, 502.0]
+    pd.testing.assert_frame_equal(results, _expected(expected_card))
+
+    # 変化は積み重なる
+    results = scorer.update(race_id, pd.DataFrame({"馬番": [3], "天気": ["雨"]}))
+    expected_card.loc[expected_card["馬番"] == "3", "天気"] = "雨"
+    pd.testing.assert_frame_equal(results, _expected(expected_card))
+
+
+def test_update_rejects_unsupported_changes():
+    scorer = IncrementalScorer()
+    card = _card()
+    scorer.score(card)
+    race_id = card["race_id"].iloc[0]
+    with pytest.raises(KeyError):
+        scorer.update("209901010101", pd.DataFrame({"馬番": [1], "オッズ": [2.0]}))
+    with pytest.raises(ValueError):
+        scorer.update(race_id, pd.DataFrame({"馬番": [1], "斤量": [50.0]}))
+    with pytest.raises(ValueError):
+        scorer.update(race_id, pd.DataFrame({"馬番": [99], "オッズ": [2.0]}))
+
+
+def test_max_races_zero_keeps_no_state():
+    scorer = IncrementalScorer(max_races=0)
+    card = _card()
+    before = _rescores()
+    scorer.score(card)
+    card = card.copy()
+    card.loc[0, "オッズ"] = "4.2"
+    pd.testing.assert_frame_equal(scorer.score(card), _expected(card))
+    assert _rescores() == before
+    with pytest.raises(KeyError):
+        scorer.update(card["race_id"].iloc[0], pd.DataFrame({"馬番": [1], "オッズ": [2.0]}))
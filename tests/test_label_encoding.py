@@ -0,0 +1,64 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.preprocessing import LabelEncoder, OneHotEncoder
+
+from modules.predicting._label_encoding import onehot_with_unknown, transform_with_unknown
+
+TRAIN = pd.DataFrame({
+    "馬場": ["良", "稍", "重", "良", "不"],
+    "天気": ["晴", "曇", "小雨", "晴", "雨"],
+    "芝・ダート": ["芝", "ダ", "芝", "障", "ダ"],
+})
+
+
+def test_transform_with_unknown_matches_label_encoder():
+    encoder = LabelEncoder().fit(["ドウデュース", "イクイノックス", "リバティアイランド", "ソールオリエンス"])
+    known = ["リバティアイランド", "ドウデュース", "ドウデュース", "イクイノックス"]
+    assert transform_with_unknown(encoder, pd.Series(known)).tolist() == encoder.transform(known).tolist()
+
+    # 学習時に無かった馬と欠損値は unknown
+    values = pd.Series(["ドウデュース", "新馬", None, np.nan, "ソールオリエンス"])
+    expected = [encoder.transform(["ドウデュース"])[0], -1, -1, -1, encoder.transform(["ソールオリエンス"])[0]]
+    assert transform_with_unknown(encoder, values).tolist() == expected
+    assert transform_with_unknown(encoder, values, unknown=len(encoder.classes_)).tolist() == [
+        code if code != -1 else len(encoder.classes_) for code in expected]
+
+
+def _sklearn_onehot(encoder, df, columns):
+    with warnings.catch_warnings():
+        # handle_unknown="ignore" の未知の値に対する警告
+        warnings.simplefilter("ignore")
+        return pd.DataFrame(encoder.transform(df[columns]), columns=encoder.get_feature_names_out(columns))
+
+
+@pytest.mark.parametrize("categorical", [False, True])
+def test_onehot_with_unknown_matches_sklearn(categorical):
+    columns = list(TRAIN.columns)
+    encoder = OneHotEncoder(sparse_output=False, handle_unknown="ignore").fit(TRAIN)
+    # 学習時に無かった値（雪・ダート表記の違い）と欠損値を含む
+    df = pd.DataFrame({
+        "馬場": ["重", "良", None, "稍"],
+        "天気": ["雪", "晴", "曇", None],
+        "芝・ダート": ["ダート", "芝", "障", "ダ"],
+    })
+    if categorical:
+        # 読み込み時に category 型にした列（学習時に無いカテゴリを含む）
+        df = df.astype("category")
+        df["天気"] = df["天気"].cat.add_categories(["霧"])
+
+    result = onehot_with_unknown(encoder, df, columns)
+    expected = _sklearn_onehot(encoder, df.astype(object).where(df.notna(), None), columns)
+    pd.testing.assert_frame_equal(result, expected)
+    # 未知の値・欠損値の行はその列の全てのカテゴリが0
+    assert result.filter(like="天気_").iloc[[0, 3]].to_numpy().sum() == 0
+
+
+def test_onehot_with_unknown_falls_back_to_sklearn():
+    # 一括で求められない設定（drop あり）は OneHotEncoder.transform をそのまま使う
+    columns = list(TRAIN.columns)
+    encoder = OneHotEncoder(sparse_output=False, handle_unknown="ignore", drop="first").fit(TRAIN)
+    df = TRAIN.iloc[[4, 0, 2]].reset_index(drop=True)
+    pd.testing.assert_frame_equal(onehot_with_unknown(encoder, df, columns), _sklearn_onehot(encoder, df, columns))
@@ -0,0 +1,70 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import prefetch_race_cards
+from prefetch_race_cards import Checkpoint, discover_race_ids, race_card_path, to_card_records
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 小雨・稍重・ダートを含む実際の出馬表
+CARD_PATH = os.path.join(REPO_ROOT, "出馬表データ", "20241019京都", "202410190811RオータムリーフS.json")
+
+# スクレイピング結果での表記（出馬表JSONでは先頭の1文字）
+_SCRAPED_NAMES = {"芝・ダート": {"ダ": "ダート"}, "馬場": {"稍": "稍重", "不": "不良"}}
+
+
+def _scraped_frame(records):
+    """ 出馬表JSONのレコードを scrape_shutuba_table の結果と同じ型・表記に戻す """
+    df = pd.DataFrame(records)
+    for column, names in _SCRAPED_NAMES.items():
+        df[column] = df[column].map(lambda x: names.get(x, x))
+    for column in ["馬番", "距離"]:
+        df[column] = df[column].astype(int)
+    for column in ["オッズ", "人気"]:
+        df[column] = pd.to_numeric(df[column]).astype(object).where(df[column].notna(), None)
+    return df
+
+
+def test_to_card_records_round_trips_real_card():
+    with open(CARD_PATH, "r", encoding="utf-8") as f:
+        records = json.load(f)
+    scraped = _scraped_frame(records)
+    assert set(scraped["馬場"]) == {"稍重"} and set(scraped["天気"]) == {"小雨"}
+
+    result = to_card_records(scraped)
+    # 列ごとに値も型も既存のファイルと同じ（保存したときのJSONも同じ）
+    for column in records[0]:
+        assert [record[column] for record in result] == [record[column] for record in records], column
+        assert [type(record[column]) for record in result] == [type(record[column]) for record in records], column
+    assert json.dumps(result, ensure_ascii=False, indent=4) == json.dumps(records, ensure_ascii=False, indent=4)
+
+
+def test_discover_race_ids_does_not_checkpoint_empty_result(tmp_path, monkeypatch):
+    responses = iter([[], ["202408050811", "202408050812", "202409050811"]])
+    monkeypatch.setattr(prefetch_race_cards, "scrape_race_id_list", lambda dates: next(responses))
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.json"))
+
+    # 取得に失敗した（空の）結果は記録しない
+    assert discover_race_ids(["20241019"], {"08"}, checkpoint) == []
+    assert "20241019" not in Checkpoint(str(tmp_path / "checkpoint.json")).data["race_ids"]
+
+    # 再開時には取得し直す
+    targets = discover_race_ids(["20241019"], {"08"}, checkpoint)
+    assert targets == [("20241019", "202408050811"), ("20241019", "202408050812")]
+    assert Checkpoint(str(tmp_path / "checkpoint.json")).data["race_ids"]["20241019"] == sorted(
+        ["202408050811", "202408050812", "202409050811"])
+
+
+def test_race_card_path_replaces_path_separators():
+    path = race_card_path("出馬表データ", "20241019", "202408050811", "JRA/JBC:記念")
+    assert path == os.path.join("出馬表データ", "20241019京都", "202410190811RJRA_JBC_記念.json")
+
+
+def test_unknown_ground_is_rejected_by_argparse(monkeypatch, capsys):
+    monkeypatch.setattr("sys.argv", ["prefetch_race_cards.py", "--start", "20241019", "--grounds", "大井"])
+    with pytest.raises(SystemExit) as exit_info:
+        prefetch_race_cards.main()
+    assert exit_info.value.code == 2
+    assert "大井" in capsys.readouterr().err
@@ -0,0 +1,77 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from modules.storage._race_card_schema import (RACE_CARD_FIELDS, CATEGORY, DATE, NUMBER, TEXT, parse_race_cards,
+                                               parse_times)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CARD_PATH = os.path.join(REPO_ROOT, "出馬表データ", "20241019京都", "202410190811RオータムリーフS.json")
+
+
+def _card():
+    with open(CARD_PATH, "r", encoding="utf-8") as f:
+        return pd.DataFrame(json.load(f))
+
+
+def test_parse_race_cards_dtypes():
+    card = _card()
+    parsed = parse_race_cards(card)
+    assert list(parsed.columns) == list(card.columns)
+    for name, kind in RACE_CARD_FIELDS.items():
+        if name not in parsed.columns:
+            continue
+        dtype = parsed[name].dtype
+        if kind == TEXT:
+            assert dtype == object, name
+            assert parsed[name].tolist() == card[name].tolist(), name
+        elif kind == CATEGORY:
+            assert isinstance(dtype, pd.CategoricalDtype), name
+            # カテゴリは値の昇順（astype("category") と同じ）
+            assert list(dtype.categories) == sorted(card[name].unique()), name
+            assert parsed[name].astype(object).tolist() == card[name].tolist(), name
+        elif kind == DATE:
+            assert dtype == "datetime64[ns]", name
+        elif kind == NUMBER:
+            assert dtype.kind in "if", name
+    # 欠損値の無い整数の列は int64、文字列の数字も数値になる
+    assert parsed["馬番"].dtype == np.int64
+    assert parsed["オッズ"].dtype == np.float64
+    assert parsed["オッズ"].tolist() == [float(x) for x in card["オッズ"]]
+    assert (parsed["日付"] == pd.Timestamp("2024-10-19")).all()
+    # 入力は書き換えない
+    assert card["オッズ"].dtype == object
+
+
+def test_parse_race_cards_missing_and_dirty_values():
+    card = _card().iloc[:4].reset_index(drop=True)
+    card.loc[0, "人気"] = None  # 取消
+    card.loc[1, "馬番"] = None
+    card["体重変化"] = card["体重変化"].astype(object)
+    card.loc[2, "体重変化"] = "+4kg"
+    card.loc[3, "オッズ"] = "---"
+    card.loc[3, "日付"] = "不明"
+    parsed = parse_race_cards(card)
+    assert parsed["人気"].dtype == np.float64 and np.isnan(parsed.loc[0, "人気"])
+    # 欠損値がある整数の列は float のまま
+    assert parsed["馬番"].dtype == np.float64 and np.isnan(parsed.loc[1, "馬番"])
+    assert parsed.loc[2, "体重変化"] == 4.0
+    assert np.isnan(parsed.loc[3, "オッズ"])
+    assert pd.isna(parsed.loc[3, "日付"])
+
+
+def test_parse_race_cards_is_idempotent():
+    parsed = parse_race_cards(_card())
+    again = parse_race_cards(parsed)
+    pd.testing.assert_frame_equal(again, parsed)
+
+
+def test_parse_times():
+    values = pd.Series(["1:35.2", "2:01.0", "1415", "", None, "取消"])
+    result = parse_times(values)
+    assert result.iloc[:3].tolist() == [95.2, 121.0, 14 * 60 + 15]
+    assert result.iloc[3:].isna().all()
+    numeric = pd.Series([95.2, 121.0])
+    assert parse_times(numeric) is numeric
@@ -0,0 +1,124 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.storage._columnar_file import ColumnarReader, ColumnarWriter, STRING
+from modules.storage._race_card_schema import parse_race_cards
+from modules.storage._race_card_store import RaceCardStore, convert_race_cards
+from modules.storage._race_file_index import RaceFileIndex
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CARD_DIR = os.path.join(REPO_ROOT, "出馬表データ", "20241019京都")
+CARD_FILES = ["202410190811RオータムリーフS.json", "202410190812R3歳以上2勝クラス.json"]
+
+SCHEMA = [("馬", STRING), ("馬番", "int16"), ("オッズ", "float64"), ("天気", STRING)]
+
+
+def _frame(horses, numbers, odds, weather):
+    return pd.DataFrame({"馬": horses, "馬番": numbers, "オッズ": odds, "天気": weather})
+
+
+def test_columnar_round_trip(tmp_path):
+    path = str(tmp_path / "cards.kcol")
+    first = _frame(["馬A", "馬B", None], [1, 2, 3], [2.5, np.nan, 30.1], ["晴", "晴", "晴"])
+    second = _frame(["馬C", "馬A"], [1, 2], [1.8, 4.0], ["小雨", None])
+    with ColumnarWriter(path, SCHEMA) as writer:
+        writer.write(first, {"race_number": 1})
+        writer.write(second, {"race_number": 2})
+    assert not os.path.exists(path + ".tmp")
+
+    reader = ColumnarReader(path)
+    assert reader.columns == [("馬", STRING), ("馬番", "<i2"), ("オッズ", "<f8"), ("天気", STRING)]
+    assert [row_group["metadata"] for row_group in reader.row_groups] == [{"race_number": 1}, {"race_number": 2}]
+    for i, expected in enumerate([first, second]):
+        df = reader.read_row_group(i)
+        assert df["馬"].tolist() == expected["馬"].tolist()
+        assert df["天気"].tolist() == expected["天気"].tolist()
+        assert df["馬番"].dtype == np.int16 and df["馬番"].tolist() == expected["馬番"].tolist()
+        np.testing.assert_array_equal(df["オッズ"].to_numpy(), expected["オッズ"].to_numpy())
+        # category 型で読んでも値は同じ（欠損値は NaN）
+        categorical = reader.read_row_group(i, categorical={"馬", "天気"})
+        assert isinstance(categorical["天気"].dtype, pd.CategoricalDtype)
+        assert categorical["天気"].astype(object).where(categorical["天気"].notna(), None).tolist() == \
+            expected["天気"].tolist()
+    assert len(reader.read()) == 5
+    assert reader.read(columns=["馬番"]).columns.tolist() == ["馬番"]
+
+
+def test_columnar_writer_rejects_missing_integers_and_aborts(tmp_path):
+    path = str(tmp_path / "cards.kcol")
+    with pytest.raises(ValueError):
+        with ColumnarWriter(path, SCHEMA) as writer:
+            writer.write(_frame(["馬A"], [np.nan], [2.5], ["晴"]))
+    assert not os.path.exists(path) and not os.path.exists(path + ".tmp")
+
+
+def test_columnar_reader_rejects_other_files(tmp_path):
+    path = tmp_path / "cards.json"
+    path.write_text("[]", encoding="utf-8")
+    with pytest.raises(ValueError):
+        ColumnarReader(str(path))
+
+
+@pytest.fixture
+def race_cards(tmp_path):
+    src = tmp_path / "出馬表データ"
+    os.makedirs(src / "20241019京都")
+    for file_name in CARD_FILES:
+        shutil.copy2(os.path.join(CARD_DIR, file_name), src / "20241019京都" / file_name)
+    return str(src), str(tmp_path / "出馬表ストア")
+
+
+def _assert_same_card(card, race_file):
+    # 整数列はストアでは int16 で保存するので、値だけを比べる
+    pd.testing.assert_frame_equal(parse_race_cards(card), _json_card(race_file), check_dtype=False,
+                                  check_categorical=False)
+
+
+def _json_card(race_file):
+    with open(race_file.path, "r", encoding="utf-8") as f:
+        return parse_race_cards(pd.DataFrame(json.load(f)))
+
+
+def test_store_matches_json(race_cards):
+    src, dst = race_cards
+    assert convert_race_cards(src, dst) == (2, [])
+    store = RaceCardStore(dst)
+    for race_file in RaceFileIndex(src).races():
+        _assert_same_card(store.load(race_file), race_file)
+
+
+@pytest.mark.parametrize("change", ["mtime", "size"])
+def test_store_ignores_stale_cards_until_rebuilt(race_cards, change):
+    src, dst = race_cards
+    convert_race_cards(src, dst)
+    store = RaceCardStore(dst)
+    race_file = RaceFileIndex(src).get("20241019", "08", 11)
+    assert store.load(race_file) is not None
+
+    st = os.stat(race_file.path)
+    if change == "mtime":
+        os.utime(race_file.path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    else:
+        # オッズが変わって大きさだけが変わった（mtime は元に戻す）
+        with open(race_file.path, "r", encoding="utf-8") as f:
+            records = json.load(f)
+        records[0]["オッズ"] = "9.9"
+        with open(race_file.path, "w", encoding="utf-8") as f:
+            json.dump(records, f, ensure_ascii=False, indent=4)
+        os.utime(race_file.path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        assert os.stat(race_file.path).st_size != st.st_size
+    # 元のJSONが変換後に更新されていれば使わない（呼び出し側でJSONを読む）
+    assert store.load(race_file) is None
+    # もう1つのレースはそのまま使える
+    assert store.load(RaceFileIndex(src).get("20241019", "08", 12)) is not None
+
+    # 変換し直せば新しい内容を返す
+    convert_race_cards(src, dst)
+    card = store.load(race_file)
+    assert card is not None
+    _assert_same_card(card, race_file)
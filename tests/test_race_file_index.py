@@ -0,0 +1,85 @@
+import os
+import threading
+
+from modules.storage._race_file_index import RaceFileIndex, parse_race_file_name
+
+
+def _touch(root, dir_name, *file_names):
+    os.makedirs(root / dir_name, exist_ok=True)
+    for file_name in file_names:
+        (root / dir_name / file_name).write_text("[]", encoding="utf-8")
+
+
+def test_parse_single_and_double_digit_race_numbers():
+    # 場id の後のレース番号は1桁（081R）と2桁（0810R）がある
+    assert parse_race_file_name("20241019081R2歳未勝利.json", "08") == ("20241019", "08", 1, "2歳未勝利", True)
+    assert parse_race_file_name("202410190810R宝ケ池特別.json", "08") == ("20241019", "08", 10, "宝ケ池特別", True)
+    assert parse_race_file_name("2024102011R04新潟牝馬S.json", "04") == ("20241020", "04", 11, "新潟牝馬S", False)
+    assert parse_race_file_name("2024102011RブラジルC.json", "05") == ("20241020", "05", 11, "ブラジルC", False)
+    assert parse_race_file_name("メモ.txt", "08") is None
+
+
+def test_1r_is_not_confused_with_10r_to_12r(tmp_path):
+    _touch(tmp_path, "20241019京都", "20241019081R2歳未勝利.json", "202410190810R宝ケ池特別.json",
+           "202410190811RオータムリーフS.json", "202410190812R3歳以上2勝クラス.json")
+    index = RaceFileIndex(str(tmp_path))
+    for race_number, race_name in [(1, "2歳未勝利"), (10, "宝ケ池特別"), (11, "オータムリーフS"), (12, "3歳以上2勝クラス")]:
+        race_file = index.get("20241019", "08", race_number)
+        assert (race_file.race_number, race_file.race_name) == (race_number, race_name)
+    assert index.get("20241019", "08", 2) is None
+    assert [race_file.race_number for race_file in index.races("20241019")] == [1, 10, 11, 12]
+
+
+def test_canonical_file_name_wins(tmp_path):
+    # 標準形式（場idを含む）のファイルがあれば、ファイル名の並び順によらずそちらを使う
+    _touch(tmp_path, "20241020新潟", "2024102011R04新潟牝馬S.json", "202410200411R新潟牝馬S.json")
+    _touch(tmp_path, "20241020東京", "202410200511RブラジルC.json", "2024102011RブラジルC.json")
+    index = RaceFileIndex(str(tmp_path), refresh_interval=0)
+    niigata = index.get("20241020", "04", 11)
+    tokyo = index.get("20241020", "05", 11)
+    assert os.path.basename(niigata.path) == "202410200411R新潟牝馬S.json" and niigata.canonical
+    assert os.path.basename(tokyo.path) == "202410200511RブラジルC.json" and tokyo.canonical
+    # 同じレースの別名のファイルは一覧にも出てこない
+    assert len(index.races("20241020")) == 2
+    # 標準形式のファイルが無くなれば、もう一方のファイルを使う
+    os.remove(niigata.path)
+    assert os.path.basename(index.get("20241020", "04", 11).path) == "2024102011R04新潟牝馬S.json"
+
+
+def test_refresh_picks_up_added_and_removed_folders(tmp_path):
+    _touch(tmp_path, "20241019京都", "20241019081R2歳未勝利.json")
+    index = RaceFileIndex(str(tmp_path), refresh_interval=0)
+    assert len(index.races()) == 1
+    _touch(tmp_path, "20241020京都", "20241020081R2歳未勝利.json")
+    assert len(index.races()) == 2
+    os.remove(tmp_path / "20241019京都" / "20241019081R2歳未勝利.json")
+    os.rmdir(tmp_path / "20241019京都")
+    assert [race_file.date for race_file in index.races()] == ["20241020"]
+
+
+def test_readers_do_not_fail_while_refreshing(tmp_path):
+    for day in range(1, 6):
+        _touch(tmp_path, f"202410{day:02d}京都", *[f"202410{day:02d}08{n}R.json" for n in range(1, 13)])
+    index = RaceFileIndex(str(tmp_path), refresh_interval=0)
+    errors = []
+    stop = threading.Event()
+
+    def read():
+        try:
+            while not stop.is_set():
+                index.races()
+                index.get("20241001", "08", 1)
+        except Exception as e:
+            errors.append(e)
+
+    readers = [threading.Thread(target=read) for _ in range(2)]
+    for reader in readers:
+        reader.start()
+    for day in range(6, 16):
+        _touch(tmp_path, f"202410{day:02d}京都", *[f"202410{day:02d}08{n}R.json" for n in range(1, 13)])
+        index.refresh()
+    stop.set()
+    for reader in readers:
+        reader.join()
+    assert errors == []
+    assert len(index.races()) == 15 * 12
@@ -0,0 +1,68 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from modules.predicting._result_cache import ResultCache, race_card_key
+from modules.storage._race_card_schema import parse_race_cards
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CARD_PATH = os.path.join(REPO_ROOT, "出馬表データ", "20241019京都", "202410190811RオータムリーフS.json")
+
+
+def _card():
+    with open(CARD_PATH, "r", encoding="utf-8") as f:
+        return pd.DataFrame(json.load(f))
+
+
+@pytest.mark.parametrize("parse", [False, True])
+def test_race_card_key_changes_with_one_odds_value(parse):
+    card = parse_race_cards(_card()) if parse else _card()
+    key = race_card_key(card, "model-1")
+    assert race_card_key(card.copy(), "model-1") == key
+
+    changed = card.copy()
+    changed.loc[5, "オッズ"] = 7.3 if parse else "7.3"
+    assert race_card_key(changed, "model-1") != key
+    # モデルが変わった場合も別のキー
+    assert race_card_key(card, "model-2") != key
+
+
+def test_race_card_key_distinguishes_missing_values_and_separators():
+    base = pd.DataFrame({"人気": ["1", None]})
+    assert race_card_key(base) != race_card_key(pd.DataFrame({"人気": ["1", ""]}))
+    assert race_card_key(base) != race_card_key(pd.DataFrame({"人気": ["1", "None"]}))
+    # 値の区切りをまたいでも同じ文字列にならない
+    assert race_card_key(pd.DataFrame({"馬": ["ab", "c"]})) != race_card_key(pd.DataFrame({"馬": ["a", "bc"]}))
+    # 同じ値でも型が違えば別のキー
+    assert race_card_key(pd.DataFrame({"馬番": [1, 2]})) != race_card_key(pd.DataFrame({"馬番": [1.0, 2.0]}))
+
+
+def test_result_cache_evicts_least_recently_used():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.evictions == 1
+
+
+def test_result_cache_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("modules.predicting._result_cache.time.monotonic", lambda: now[0])
+    cache = ResultCache(ttl=10)
+    cache.put("a", 1)
+    now[0] += 9
+    assert cache.get("a") == 1
+    now[0] += 2
+    assert cache.get("a") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_result_cache_disabled_with_zero_entries():
+    cache = ResultCache(max_entries=0)
+    cache.put("a", 1)
+    assert cache.get("a") is None
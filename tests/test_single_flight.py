@@ -0,0 +1,68 @@
+import threading
+import time
+
+import pytest
+
+from modules.predicting._single_flight import SingleFlight, SingleFlightError
+
+
+def _run_with_follower(flights, fn):
+    """ 先頭が fn() を実行している間に、同じキーの呼び出しをもう1つ合流させる。戻り値: (先頭の例外, 後続の例外) """
+    started, release = threading.Event(), threading.Event()
+    errors = {}
+
+    def leader_fn():
+        started.set()
+        release.wait(5)
+        return fn()
+
+    def call(name, target):
+        try:
+            flights.do("key", target)
+        except BaseException as e:
+            errors[name] = e
+
+    leader = threading.Thread(target=call, args=("leader", leader_fn))
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=call, args=("follower", lambda: pytest.fail("後続が計算した")))
+    follower.start()
+    # 後続が合流して待ち始めるまで少し待つ
+    time.sleep(0.2)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    return errors.get("leader"), errors.get("follower")
+
+
+def test_follower_gets_fresh_exception_chained_from_leader():
+    flights = SingleFlight(timeout=5)
+
+    def fail():
+        raise ValueError("出馬表がありません")
+
+    leader_error, follower_error = _run_with_follower(flights, fail)
+    assert isinstance(leader_error, ValueError)
+    assert isinstance(follower_error, SingleFlightError)
+    assert follower_error is not leader_error
+    assert follower_error.__cause__ is leader_error
+    assert str(follower_error) == "出馬表がありません"
+    assert flights.stats()["errors"] == 1
+
+
+def test_leader_interrupt_propagates_and_wakes_follower():
+    flights = SingleFlight(timeout=5)
+
+    def interrupt():
+        raise KeyboardInterrupt
+
+    leader_error, follower_error = _run_with_follower(flights, interrupt)
+    assert isinstance(leader_error, KeyboardInterrupt)
+    assert isinstance(follower_error, SingleFlightError)
+    assert flights.stats()["in_flight"] == 0
+
+
+def test_shared_result():
+    flights = SingleFlight(timeout=5)
+    assert _run_with_follower(flights, lambda: 42) == (None, None)
+    assert flights.stats()["shared"] == 1
@@ -0,0 +1,64 @@
+import json
+
+import pandas as pd
+import pytest
+
+from preprocessing1 import RaceDataPreprocessor1
+from preprocessing2 import RaceDataPreprocessor2
+from modules.predicting._incremental_stats import IncrementalStats, stats_binary_path
+
+
+def _results(race_id, horses, jockeys, ranks):
+    return pd.DataFrame({
+        "race_id": race_id,
+        "馬": horses,
+        "騎手": jockeys,
+        "着順": ranks,
+        "走破時間": [95.0 + rank for rank in ranks],
+        "距離": 1.6,
+        "人気": ranks,
+    })
+
+
+@pytest.mark.parametrize("preprocessor_class", [RaceDataPreprocessor1, RaceDataPreprocessor2])
+def test_legacy_json_migration_counts_new_races(tmp_path, preprocessor_class):
+    # 従来のJSON（どのレースを集計したかは残っていない）
+    stats_file = tmp_path / "horse_stats.json"
+    jockey_stats_file = tmp_path / "jockey_stats.json"
+    stats_file.write_text(json.dumps({
+        "馬A": {"平均着順": 2.0, "勝率": 1.0, "出走回数": 2, "平均速度": 60.0},
+        "馬B": {"平均着順": 5.0, "勝率": 0.0, "出走回数": 4, "平均速度": 61.0},
+    }, ensure_ascii=False), encoding="utf-8")
+    jockey_stats_file.write_text(json.dumps({
+        "騎手X": {"平均着順": 3.0, "勝率": 0.5, "出走回数": 10},
+    }, ensure_ascii=False), encoding="utf-8")
+
+    preprocessor = preprocessor_class(is_train=True, stats_file=str(stats_file),
+                                      jockey_stats_file=str(jockey_stats_file),
+                                      scaler_file=str(tmp_path / "scaler.pkl"),
+                                      horse_encoder_file=str(tmp_path / "horse_encoder.pkl"),
+                                      jockey_encoder_file=str(tmp_path / "jockey_encoder.pkl"),
+                                      onehot_encoder_file=str(tmp_path / "onehot_encoder.pkl"))
+    # JSONを作った後のレース（馬A・騎手X は既知、馬C は新しい馬）
+    df = _results("202501010101", ["馬A", "馬C"], ["騎手X", "騎手Y"], [1, 4])
+    preprocessor._compute_horse_stats(df)
+    preprocessor._compute_jockey_stats(df)
+
+    # JSONの成績に新しいレースが加算される
+    horses = IncrementalStats.load(stats_binary_path(str(stats_file)))
+    horse_stats = horses.to_stats_dict(["平均着順", "勝率", "出走回数"])
+    assert horses.race_ids == {"202501010101"}
+    assert horse_stats["馬A"] == pytest.approx({"平均着順": (2.0 * 2 + 1) / 3, "勝率": 1.0, "出走回数": 3})
+    assert horse_stats["馬C"] == {"平均着順": 4.0, "勝率": 0.0, "出走回数": 1}
+    # df に出てこない馬はJSONの値のまま
+    assert horse_stats["馬B"] == {"平均着順": 5.0, "勝率": 0.0, "出走回数": 4}
+
+    jockeys = IncrementalStats.load(stats_binary_path(str(jockey_stats_file)))
+    jockey_stats = jockeys.to_stats_dict(["平均着順", "勝率", "出走回数"])
+    assert jockey_stats["騎手X"] == pytest.approx({"平均着順": (3.0 * 10 + 1) / 11, "勝率": (0.5 * 10 + 1) / 11,
+                                                 "出走回数": 11})
+    assert jockey_stats["騎手Y"] == {"平均着順": 4.0, "勝率": 0.0, "出走回数": 1}
+
+    # 同じレースをもう一度取り込んでも二重に数えない
+    preprocessor._compute_horse_stats(df)
+    assert IncrementalStats.load(stats_binary_path(str(stats_file))).to_stats_dict(["出走回数"])["馬A"] == {"出走回数": 3}
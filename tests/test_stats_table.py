@@ -0,0 +1,74 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from modules.predicting._incremental_stats import IncrementalStats
+from modules.predicting._stats_table import StatsTable, add_stats_features, get_stats_table
+from preprocessing1 import HORSE_STAT_FIELDS, JOCKEY_STAT_FIELDS
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+JOCKEY_STATS_PATH = os.path.join(REPO_ROOT, "model", "jockey_stats.json")
+CARD_PATH = os.path.join(REPO_ROOT, "出馬表データ", "20241019京都", "202410190811RオータムリーフS.json")
+
+HORSE_STATS = {
+    "馬A": {"平均着順": 2.5, "勝率": 0.5, "出走回数": 4, "平均速度": 60.1},
+    # 項目が欠けている・値が無い馬
+    "馬B": {"平均着順": 8.0, "出走回数": 1},
+    "馬C": {"平均着順": None, "勝率": 0.0, "出走回数": 2, "平均速度": 61.0},
+}
+
+
+def _old_lookup(df, key_column, stats, fields, columns):
+    """ 以前の実装（行ごとに辞書を引く） """
+    df = df.copy()
+    for (field, default), column in zip(fields, columns):
+        df[column] = df[key_column].map(lambda x: stats.get(x, {}).get(field, default))
+    return df
+
+
+def _assert_same(new, old, columns):
+    for column in columns:
+        np.testing.assert_array_equal(new[column].to_numpy(dtype=float), old[column].to_numpy(dtype=float), column)
+
+
+def test_add_stats_features_matches_per_row_lookup():
+    columns = ["馬の平均着順", "馬の勝率", "馬の出走回数", "馬の平均速度"]
+    # 成績の無い馬・欠損値・同じ馬の繰り返しを含む
+    df = pd.DataFrame({"馬": ["馬A", "馬D", "馬B", None, "馬C", "馬A"]})
+    table = get_stats_table(HORSE_STATS, HORSE_STAT_FIELDS, cache=False)
+    new = add_stats_features(df.copy(), "馬", table, columns)
+    _assert_same(new, _old_lookup(df, "馬", HORSE_STATS, HORSE_STAT_FIELDS, columns), columns)
+    assert new.loc[1, columns].tolist() == [10, 0, 0, 0]
+
+
+def test_add_stats_features_matches_per_row_lookup_on_real_stats():
+    with open(JOCKEY_STATS_PATH, "r", encoding="utf-8") as f:
+        stats = json.load(f)
+    with open(CARD_PATH, "r", encoding="utf-8") as f:
+        df = pd.DataFrame(json.load(f))
+    df.loc[0, "騎手"] = "新人騎手"
+    columns = ["騎手の平均着順", "騎手の勝率", "騎手の出走回数"]
+    new = add_stats_features(df.copy(), "騎手", get_stats_table(stats, JOCKEY_STAT_FIELDS), columns)
+    _assert_same(new, _old_lookup(df, "騎手", stats, JOCKEY_STAT_FIELDS, columns), columns)
+
+
+def test_incremental_stats_table_matches_dict_table():
+    stats = IncrementalStats()
+    stats.ingest(pd.DataFrame({"race_id": "1", "馬": ["馬A", "馬B"], "着順": [1, 5],
+                               "走破時間": [96.0, 97.5], "距離": [1.6, 1.6]}), "馬")
+    stats.ingest(pd.DataFrame({"race_id": "2", "馬": ["馬A"], "着順": [4], "走破時間": [120.0], "距離": [2.0]}), "馬")
+    keys = pd.Series(["馬B", "馬X", "馬A"])
+    from_dict = StatsTable.from_stats(stats.to_stats_dict([field for field, _ in HORSE_STAT_FIELDS]),
+                                      HORSE_STAT_FIELDS)
+    np.testing.assert_allclose(stats.to_stats_table(HORSE_STAT_FIELDS).lookup(keys), from_dict.lookup(keys))
+
+
+def test_get_stats_table_caches_per_stats_object():
+    stats = dict(HORSE_STATS)
+    table = get_stats_table(stats, HORSE_STAT_FIELDS)
+    assert get_stats_table(stats, HORSE_STAT_FIELDS) is table
+    # 読み直された成績（別の辞書）には新しい表を作る
+    assert get_stats_table(dict(HORSE_STATS), HORSE_STAT_FIELDS) is not table
+    assert get_stats_table(stats, HORSE_STAT_FIELDS, cache=False) is not table
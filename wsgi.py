@@ -0,0 +1,6 @@
+# 本番用のエントリーポイント（gunicorn -c gunicorn.conf.py wsgi:app）
+# gunicorn.conf.py の preload_app により、ワーカーを起動する前に親プロセスで読み込まれる。
+# モデルなどの成果物は app の読み込み時に model/ から一括で読み込まれ、ワーカー間でコピーオンライトで共有される。
+from app import app
+
+__all__ = ["app"]